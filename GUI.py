@@ -1,10 +1,124 @@
 import sys
+from time import perf_counter
 
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
-from main import validate_html
+from cache import ResultCache
+from incremental import IncrementalValidator, ValidationCancelled, merge_edits
+from lsp import utf16_to_index
+from reports import create_report, error_rows
 from ui_layout import UiMainWindow
 
+# Milliseconds without typing before the document is validated again
+DEBOUNCE_MS = 150
+
+# Formats of the error report, by filter of the save dialog
+REPORT_FILTERS = {
+    "Text Files (*.txt)": "text",
+    "JSON Lines (*.jsonl)": "jsonl",
+    "SARIF (*.sarif)": "sarif",
+    "JUnit XML (*.xml)": "junit",
+}
+
+
+class ValidationSignals(QtCore.QObject):
+    # Emitted from the worker thread, delivered on the main thread: job ID, ValidationResult, seconds taken
+    finished = QtCore.pyqtSignal(int, object, float)
+
+
+class ValidationJob(QtCore.QRunnable):
+    """Validation of one snapshot of the document, run on the worker thread.
+
+    ``edits`` are the ``(position, removed, added)`` changes made since the previous job, or None to validate
+    the whole text. A job only checks ``cancelled`` between tokens, so a stale run stops cooperatively and
+    leaves the validator as it was; its edits are kept for the next job.
+    """
+
+    def __init__(self, worker, job_id, html, edits):
+        super().__init__()
+        self.worker = worker
+        self.job_id = job_id
+        self.html = html
+        self.edits = edits
+        self.cancelled = False
+        self.setAutoDelete(False)  # Owned by the worker, see ValidationWorker.jobs
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+        try:
+            self.validate()
+        finally:
+            self.worker.jobs.discard(self)
+
+    def validate(self):
+        worker = self.worker
+        if self.edits is None:
+            worker.full = True
+        else:
+            worker.unapplied = merge_edits(self.edits, worker.unapplied)
+        if self.cancelled:
+            return
+
+        validator = worker.validator
+        start = perf_counter()
+        if worker.full:
+            # A text validated before is answered from the cache. The validator only catches up with it when it
+            # holds another text, on the next job.
+            key = worker.cache.key(self.html.encode("utf-8", "surrogatepass"))
+            result = worker.cache.get(key)
+            if result is not None:
+                worker.full = validator.html != self.html
+                worker.unapplied = None
+                worker.signals.finished.emit(self.job_id, result, perf_counter() - start)
+                return
+        try:
+            if worker.full:
+                validator.set_text(self.html, profile=True, cancelled=self.is_cancelled)
+            elif worker.unapplied is not None:
+                validator.update(self.html, *worker.unapplied, cancelled=self.is_cancelled)
+        except ValidationCancelled:
+            return
+        result = validator.result()
+        if worker.full:
+            worker.cache.put(key, result)
+        worker.full = False
+        worker.unapplied = None
+        worker.signals.finished.emit(self.job_id, result, perf_counter() - start)
+
+
+class ValidationWorker:
+    # Owns the IncrementalValidator, which is only ever used by the single thread of its pool
+    def __init__(self):
+        self.validator = IncrementalValidator()
+        self.cache = ResultCache(max_entries=64)  # Results of full validations, by text
+        self.signals = ValidationSignals()
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(1)  # Jobs run one after the other, in submission order
+        self.unapplied = None  # Edits of cancelled jobs, merged, relative to validator.html
+        self.full = False  # Whether a cancelled job asked for a full validation
+        # Jobs submitted whose run has not returned yet. The pool does not own them, so this is what keeps
+        # a queued job alive until the pool runs it.
+        self.jobs = set()
+        self.job_count = 0
+
+    def submit(self, html, edits=None):
+        self.cancel()
+        self.job_count += 1
+        job = ValidationJob(self, self.job_count, html, edits)
+        self.jobs.add(job)
+        self.pool.start(job)
+        return self.job_count
+
+    def cancel(self):
+        for job in list(self.jobs):
+            job.cancelled = True
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.waitForDone()
+
 
 class HTMLValidatorApp(QtWidgets.QMainWindow):
     def __init__(self):
@@ -15,22 +129,73 @@ class HTMLValidatorApp(QtWidgets.QMainWindow):
         self.ui.htmlContent.setCustomCursor()  # Set the custom cursor
 
         self.original_html = ""
+        self.file_name = None  # File the document was opened from, named in error reports
         self.content_changed_after_upload = False
+        self.worker = ValidationWorker()
+        self.worker.signals.finished.connect(self.on_validation_finished)
+        self.pending_edits = []  # Edits made since the last job was submitted
+        self.html_text = ""  # Text as of the last contentsChange, to convert the positions of the next one
+        self.current_job = 0
+        self.result = None  # Last ValidationResult shown
 
-        self.ui.htmlContent.textChanged.connect(self.on_html_content_changed)
+        # Validation starts once typing pauses, on a snapshot of the text taken at that moment
+        self.debounce_timer = QtCore.QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.on_typing_paused)
+
+        self.ui.htmlContent.document().contentsChange.connect(self.on_html_contents_change)
         self.ui.uploadButton.clicked.connect(self.upload_file)
         self.ui.validateButton.clicked.connect(self.validate_html_ui)
         self.ui.downloadHTMLButton.clicked.connect(self.download_html)
         self.ui.downloadButton.clicked.connect(self.download_errors)
+        self.ui.errorContent.clicked.connect(self.go_to_error)
 
-    def on_html_content_changed(self):
+    def on_html_content_changed(self, html_content):
         # Enable the download HTML button if content has changed after a new file upload
-        if self.ui.htmlContent.toPlainText() != self.original_html:
+        if html_content != self.original_html:
             self.content_changed_after_upload = True
             self.ui.downloadHTMLButton.setEnabled(True)
         else:
             self.ui.downloadHTMLButton.setEnabled(False)
 
+    def on_html_contents_change(self, position, chars_removed, chars_added):
+        # Keystrokes only record the edit: the running job is stale and validation waits for a pause.
+        # Qt counts UTF-16 code units, the validator code points.
+        old_text = self.html_text
+        self.html_text = text = self.ui.htmlContent.toPlainText()
+        start = utf16_to_index(old_text, position)
+        removed = utf16_to_index(old_text[start:], chars_removed)
+        added = utf16_to_index(text[start:], chars_added)
+        self.pending_edits.append((start, removed, added))
+        self.worker.cancel()
+        self.debounce_timer.start()
+
+    def on_typing_paused(self):
+        # Only the edited region is validated again
+        html_content = self.ui.htmlContent.toPlainText()
+        self.on_html_content_changed(html_content)
+        edits, self.pending_edits = self.pending_edits, []
+        self.current_job = self.worker.submit(html_content, edits)
+
+    def on_validation_finished(self, job_id, result, seconds):
+        # Results of jobs overtaken by later edits are dropped
+        if job_id != self.current_job:
+            return
+        self.result = result
+        self.ui.errorModel.setResult(result)
+        self.ui.htmlContent.setErrorLines(self.ui.errorModel.error_lines)
+        if result.profile is not None:
+            self.statusBar().showMessage(result.profile.summary())
+        else:
+            self.statusBar().showMessage(f"Revalidated in {seconds * 1000:.1f} ms")
+
+    def go_to_error(self, index):
+        # Document-level errors have no line to jump to
+        line = index.data(self.ui.errorModel.LineRole)
+        if line is not None:
+            self.ui.htmlContent.goToLine(line)
+
     def upload_file(self):
         options = QtWidgets.QFileDialog.Options()
         file_name, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open HTML file", "",
@@ -41,16 +206,17 @@ class HTMLValidatorApp(QtWidgets.QMainWindow):
                 html = file.read()
             self.ui.htmlContent.setPlainText(html)
             self.original_html = html
+            self.file_name = file_name
             self.content_changed_after_upload = False  # Reset the flag after uploading a new file
             self.validate_html_ui()
 
     def validate_html_ui(self):
+        # A full run, profiled for the status bar, supersedes the edits waiting for validation
         html_content = self.ui.htmlContent.toPlainText()
-        errors = validate_html(html_content)
-        if isinstance(errors, list):
-            self.ui.errorContent.setPlainText("\n".join(errors))
-        else:
-            self.ui.errorContent.setPlainText(errors)
+        self.debounce_timer.stop()
+        self.pending_edits = []
+        self.current_job = self.worker.submit(html_content)
+        self.statusBar().showMessage("Validating...")
         self.original_html = html_content  # Update original_html after validation
         self.ui.downloadHTMLButton.setEnabled(True)  # Enable button after validation
 
@@ -66,13 +232,21 @@ class HTMLValidatorApp(QtWidgets.QMainWindow):
                     file.write(html_content)
 
     def download_errors(self):
-        errors = self.ui.errorContent.toPlainText()
-        if errors:
-            file_name, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save Error Report", "",
-                                                                 "Text Files (*.txt);;All Files (*)")
-            if file_name:
-                with open(file_name, 'w') as file:
-                    file.write(errors)
+        if self.result is None:
+            return
+        file_name, selected = QtWidgets.QFileDialog.getSaveFileName(self, "Save Error Report", "",
+                                                                    ";;".join(REPORT_FILTERS) + ";;All Files (*)")
+        if file_name:
+            with open(file_name, 'w', encoding="utf-8") as file:
+                report = create_report(REPORT_FILTERS.get(selected, "text"), file)
+                report.start()
+                report.add(self.file_name or "document.html", error_rows(self.result.errors))
+                report.finish()
+
+    def closeEvent(self, event):
+        # Let a running job notice its cancellation before the validator goes away
+        self.worker.shutdown()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+import re
+
+from schema import get_schema
+
+# Attribute values of start tags: double-quoted, single-quoted, unquoted or absent
+ATTRIBUTE_RE = re.compile(r'''([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+
+INTEGER_RE = re.compile(r'\s*[-+]?\d+\s*$')
+FLOAT_RE = re.compile(r'\s*[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?\s*$')
+
+
+# Validators take the attribute value and return None when it is valid, or what was expected otherwise
+def boolean(name):
+    def validate(value):
+        if value and value.lower() != name:
+            return f"expected no value or '{name}'"
+    return validate
+
+
+def enumerated(*values):
+    allowed = frozenset(values)
+    expected = "expected one of " + ", ".join(f"'{value}'" for value in values)
+
+    def validate(value):
+        if value.lower() not in allowed:
+            return expected
+    return validate
+
+
+def integer(minimum=None):
+    expected = "expected an integer" if minimum is None else f"expected an integer of at least {minimum}"
+
+    def validate(value):
+        if not INTEGER_RE.match(value) or minimum is not None and int(value) < minimum:
+            return expected
+    return validate
+
+
+def number(value):
+    if not FLOAT_RE.match(value):
+        return "expected a number"
+
+
+def url(value):
+    # Surrounding spaces are allowed, spaces inside must be percent-encoded
+    if any(char.isspace() for char in value.strip()):
+        return "expected a URL without spaces"
+
+
+def non_empty_url(value):
+    if not value.strip():
+        return "expected a non-empty URL"
+    return url(value)
+
+
+def identifier(value):
+    if not value or any(char.isspace() for char in value):
+        return "expected a non-empty value without spaces"
+
+
+BOOLEAN_ATTRIBUTES = {
+    "*": ["autofocus", "inert", "itemscope"],
+    "audio": ["autoplay", "controls", "loop", "muted"],
+    "button": ["disabled", "formnovalidate"],
+    "details": ["open"],
+    "dialog": ["open"],
+    "fieldset": ["disabled"],
+    "form": ["novalidate"],
+    "iframe": ["allowfullscreen"],
+    "img": ["ismap"],
+    "input": ["checked", "disabled", "formnovalidate", "multiple", "readonly", "required"],
+    "ol": ["reversed"],
+    "optgroup": ["disabled"],
+    "option": ["disabled", "selected"],
+    "script": ["async", "defer", "nomodule"],
+    "select": ["disabled", "multiple", "required"],
+    "textarea": ["disabled", "readonly", "required"],
+    "track": ["default"],
+    "video": ["autoplay", "controls", "loop", "muted", "playsinline"],
+}
+
+# Validators of each attribute, for every tag ("*") or for one tag
+VALIDATORS = {
+    "*": {
+        "id": identifier,
+        "dir": enumerated("ltr", "rtl", "auto"),
+        "draggable": enumerated("true", "false"),
+        "contenteditable": enumerated("", "true", "false", "plaintext-only"),
+        "spellcheck": enumerated("", "true", "false"),
+        "translate": enumerated("", "yes", "no"),
+        "hidden": enumerated("", "hidden", "until-found"),
+        "tabindex": integer(),
+    },
+    "a": {"href": url},
+    "area": {"href": url, "shape": enumerated("circle", "default", "poly", "rect")},
+    "audio": {"src": non_empty_url, "preload": enumerated("", "none", "metadata", "auto"),
+              "crossorigin": enumerated("", "anonymous", "use-credentials")},
+    "base": {"href": url},
+    "blockquote": {"cite": url},
+    "button": {"type": enumerated("submit", "reset", "button"), "formaction": url,
+               "formmethod": enumerated("get", "post", "dialog")},
+    "canvas": {"width": integer(0), "height": integer(0)},
+    "col": {"span": integer(1)},
+    "colgroup": {"span": integer(1)},
+    "del": {"cite": url},
+    "embed": {"src": non_empty_url, "width": integer(0), "height": integer(0)},
+    "form": {"action": url, "method": enumerated("get", "post", "dialog"), "autocomplete": enumerated("on", "off"),
+             "enctype": enumerated("application/x-www-form-urlencoded", "multipart/form-data", "text/plain")},
+    "iframe": {"src": url, "width": integer(0), "height": integer(0),
+               "loading": enumerated("lazy", "eager")},
+    "img": {"src": non_empty_url, "width": integer(0), "height": integer(0),
+            "loading": enumerated("lazy", "eager"), "decoding": enumerated("sync", "async", "auto"),
+            "crossorigin": enumerated("", "anonymous", "use-credentials")},
+    "input": {"type": enumerated("button", "checkbox", "color", "date", "datetime-local", "email", "file", "hidden",
+                                 "image", "month", "number", "password", "radio", "range", "reset", "search",
+                                 "submit", "tel", "text", "time", "url", "week"),
+              "src": non_empty_url, "formaction": url, "formmethod": enumerated("get", "post", "dialog"),
+              "maxlength": integer(0), "minlength": integer(0), "size": integer(1),
+              "width": integer(0), "height": integer(0)},
+    "ins": {"cite": url},
+    "link": {"href": non_empty_url, "crossorigin": enumerated("", "anonymous", "use-credentials")},
+    "meter": {"value": number, "min": number, "max": number, "low": number, "high": number, "optimum": number},
+    "object": {"data": url, "width": integer(0), "height": integer(0)},
+    "ol": {"start": integer(), "type": enumerated("1", "a", "i")},
+    "progress": {"value": number, "max": number},
+    "q": {"cite": url},
+    "script": {"src": non_empty_url, "crossorigin": enumerated("", "anonymous", "use-credentials")},
+    "select": {"size": integer(1)},
+    "source": {"src": non_empty_url, "width": integer(0), "height": integer(0)},
+    "td": {"colspan": integer(1), "rowspan": integer(0)},
+    "textarea": {"cols": integer(1), "rows": integer(1), "maxlength": integer(0), "minlength": integer(0),
+                 "wrap": enumerated("soft", "hard")},
+    "th": {"colspan": integer(1), "rowspan": integer(0), "scope": enumerated("row", "col", "rowgroup", "colgroup")},
+    "track": {"src": non_empty_url, "kind": enumerated("subtitles", "captions", "descriptions", "chapters",
+                                                       "metadata")},
+    "video": {"src": non_empty_url, "poster": url, "width": integer(0), "height": integer(0),
+              "preload": enumerated("", "none", "metadata", "auto"),
+              "crossorigin": enumerated("", "anonymous", "use-credentials")},
+}
+
+
+class AttributeRules:
+    """Value validators of a schema, looked up by tag ID then attribute name.
+
+    ``validators[tag_id]`` maps the attribute names of a tag to their validator. Tags without validators of
+    their own share the dictionary of the global ones.
+    """
+
+    def __init__(self, schema):
+        global_validators = dict(VALIDATORS["*"])
+        for name in BOOLEAN_ATTRIBUTES["*"]:
+            global_validators[name] = boolean(name)
+
+        self.validators = []
+        for name in schema.tag_names:
+            specific = dict(VALIDATORS.get(name, {}))
+            for attribute in BOOLEAN_ATTRIBUTES.get(name, ()):
+                specific[attribute] = boolean(attribute)
+            self.validators.append({**global_validators, **specific} if specific else global_validators)
+
+
+_attribute_rules = None
+
+
+def get_attribute_rules():
+    # Built on first use for the default schema
+    global _attribute_rules
+    if _attribute_rules is None:
+        _attribute_rules = AttributeRules(get_schema())
+    return _attribute_rules
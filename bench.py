@@ -0,0 +1,211 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from itertools import count
+
+from main import validate_html
+from tokenizer import tokenize, START_TAG, END_TAG
+
+BLOCK_TAGS = ["div", "section", "article", "form"]
+INLINE_TAGS = ["a", "b", "i", "em", "strong", "span", "code", "small", "label"]
+VOID_TAGS = ["br", "img", "input"]
+ATTRIBUTES = {
+    "a": ["href", "target", "rel"],
+    "img": ["src", "alt", "width", "height"],
+    "input": ["type", "name", "value", "placeholder"],
+    "td": ["colspan", "rowspan"],
+    "form": ["action", "method"],
+    "label": ["for"],
+}
+GLOBAL_ATTRIBUTES = ["class", "id", "title", "lang", "data-index", "aria-label"]
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt".split()
+# Values valid for the type of each attribute, words for the others. Ids are made unique in the document.
+ATTRIBUTE_VALUES = {
+    "href": ["/", "/index.html", "#top", "https://example.com/docs"],
+    "target": ["_blank", "_self"],
+    "rel": ["nofollow", "noopener"],
+    "src": ["image.png", "/img/photo.jpg"],
+    "width": ["16", "120", "640"],
+    "height": ["16", "90", "480"],
+    "type": ["text", "email", "number", "checkbox"],
+    "colspan": ["1", "2", "3"],
+    "rowspan": ["1", "2"],
+    "action": ["/submit", "/search"],
+    "method": ["get", "post"],
+    "lang": ["en", "fr", "de"],
+    "data-index": ["0", "1", "42"],
+}
+
+# Errors the generator can inject, each as a replacement for one piece of markup
+ERROR_KINDS = ["unknown_tag", "invalid_attribute", "missing_close", "stray_gt", "malformed_comment"]
+
+DEFAULT_SIZES = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+
+def generate_document(size, depth=8, attribute_density=1.0, error_rate=0.0, seed=0):
+    """Return a deterministic HTML document of about ``size`` characters.
+
+    ``depth`` bounds the element nesting, ``attribute_density`` is the mean number of attributes per element and
+    ``error_rate`` the probability that an element carries one of ERROR_KINDS.
+    """
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<title>Benchmark</title>\n</head>\n<body>\n"]
+    length = len(parts[0])
+    closing = "</body>\n</html>\n"
+    ids = count()
+
+    def value(name):
+        if name == "id":
+            return f"{rng.choice(WORDS)}-{next(ids)}"
+        return rng.choice(ATTRIBUTE_VALUES.get(name, WORDS))
+
+    def attributes(tag):
+        names = ATTRIBUTES.get(tag, []) + GLOBAL_ATTRIBUTES
+        number = min(int(attribute_density) + (rng.random() < attribute_density % 1), len(names))
+        return "".join(f' {name}="{value(name)}"' for name in rng.sample(names, number))
+
+    def text():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+
+    def element(level, in_form=False):
+        if rng.random() < error_rate:
+            kind = rng.choice(ERROR_KINDS)
+            if kind == "unknown_tag":
+                return f"<blink>{text()}</blink>"
+            if kind == "invalid_attribute":
+                return f'<p bogus="{rng.choice(WORDS)}">{text()}</p>'
+            if kind == "missing_close":
+                return f"<div><span>{text()}</div>\n"
+            if kind == "stray_gt":
+                return f"<p>{text()} > {text()}</p>\n"
+            return f"<!- {text()} ->"
+
+        if rng.random() < 0.15:
+            tag = rng.choice(VOID_TAGS)
+            return f"<{tag}{attributes(tag)}>"
+        if level >= depth or rng.random() < 0.3:
+            return phrasing()
+
+        # Elements with a fixed structure keep generated documents valid unless errors are injected
+        choice = rng.random()
+        if choice < 0.15:
+            items = "".join(f"<li{attributes('li')}>{phrasing()}</li>\n" for _ in range(rng.randint(1, 5)))
+            return f"<ul{attributes('ul')}>\n{items}</ul>\n"
+        if choice < 0.25:
+            rows = "".join("<tr>" + "".join(f"<td{attributes('td')}>{phrasing()}</td>" for _ in range(3)) + "</tr>\n"
+                           for _ in range(rng.randint(1, 4)))
+            return f"<table{attributes('table')}>\n<tbody>\n{rows}</tbody>\n</table>\n"
+        if choice < 0.5:
+            return f"<p{attributes('p')}>{text()}{phrasing()}</p>\n"
+
+        tag = rng.choice(BLOCK_TAGS)
+        if tag == "form" and in_form:
+            tag = "div"  # Forms cannot be nested
+        children = "".join(element(level + 1, in_form or tag == "form") for _ in range(rng.randint(1, 4)))
+        return f"<{tag}{attributes(tag)}>\n{text()}{children}\n</{tag}>\n"
+
+    def phrasing():
+        tag = rng.choice(INLINE_TAGS)
+        return f"<{tag}{attributes(tag)}>{text()}</{tag}>"
+
+    while length < size - len(closing):
+        part = element(1)
+        parts.append(part)
+        length += len(part)
+    parts.append(closing)
+    return "".join(parts)
+
+
+def count_tags(html):
+    return sum(1 for token in tokenize(html) if token.kind == START_TAG or token.kind == END_TAG)
+
+
+def measure(html, repeat=3):
+    # Best wall time over ``repeat`` runs, then peak memory from one traced run (tracing slows it down)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = validate_html(html)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    validate_html(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    size = len(html.encode("utf-8"))
+    megabytes = size / 1e6
+    tags = count_tags(html)
+    return {
+        "bytes": size,
+        "tags": tags,
+        "errors": len(result),
+        "seconds": best,
+        "mb_per_second": megabytes / best if best else 0.0,
+        "tags_per_second": tags / best if best else 0.0,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, depth=8, attribute_density=1.0, error_rate=0.01, seed=0, repeat=3):
+    runs = []
+    for size in sizes:
+        html = generate_document(size, depth, attribute_density, error_rate, seed)
+        runs.append(dict(size=size, **measure(html, repeat)))
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"depth": depth, "attribute_density": attribute_density, "error_rate": error_rate,
+                       "seed": seed, "repeat": repeat},
+        "runs": runs,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    # Returns the sizes whose throughput dropped by more than ``tolerance`` compared to ``baseline``
+    previous = {entry["size"]: entry for entry in baseline["runs"]}
+    regressions = []
+    for entry in report["runs"]:
+        before = previous.get(entry["size"])
+        if before and entry["mb_per_second"] < before["mb_per_second"] * (1 - tolerance):
+            regressions.append((entry["size"], before["mb_per_second"], entry["mb_per_second"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark validate_html on generated documents.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="document sizes in characters")
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--attribute-density", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="JSON report to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed throughput drop (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.depth, args.attribute_density, args.error_rate, args.seed, args.repeat)
+    for entry in report["runs"]:
+        print(f"{entry['bytes'] / 1e6:8.2f} MB  {entry['seconds']:8.3f} s  {entry['mb_per_second']:7.2f} MB/s  "
+              f"{entry['tags_per_second']:10.0f} tags/s  peak {entry['peak_memory_bytes'] / 1e6:7.2f} MB")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for size, before, after in regressions:
+            print(f"Regression at {size} characters: {before:.2f} -> {after:.2f} MB/s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import hashlib
+import mmap
+import os
+import pickle
+import sqlite3
+import sys
+from collections import OrderedDict
+
+from main import mapped_file, validate_html, validate_path, validate_stream
+from results import ValidationResult
+from rules import default_rules
+from schema import get_schema
+
+# Modules whose source decides the validation result: editing any of them invalidates cached results
+VALIDATOR_MODULES = ("attributes", "contentmodel", "main", "results", "rules", "schema", "tokenizer", "tututu")
+
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.blake2b(digest_size=16)
+        for name in VALIDATOR_MODULES:
+            with open(sys.modules[name].__file__, "rb") as source:
+                digest.update(source.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def results_version(rules=None):
+    # What results depend on besides the document: the schema, the validator and the rules checked
+    rules_key = (default_rules() if rules is None else rules).key
+    return f"{get_schema().version}:{code_version()}:{rules_key}"
+
+
+class ResultCache:
+    """Validation results keyed by a hash of the document, of the schema and validator versions and of the rules.
+
+    Results are kept in an in-process LRU of ``max_entries`` and, when ``directory`` is given, pickled to
+    disk, where the least recently used files are evicted once they take more than ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_entries=1024, directory=None, max_disk_bytes=256 * 1024 * 1024, rules=None):
+        self.rules = rules
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_bytes = None  # measured on the first write
+
+        self.salt = results_version(rules).encode()
+
+    def key(self, data):
+        digest = hashlib.blake2b(self.salt, digest_size=16)
+        digest.update(data)
+        return digest.hexdigest()
+
+    def path_key(self, path):
+        digest = hashlib.blake2b(self.salt, digest_size=16)
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 16), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ValidationResult(result.errors)
+
+        if self.directory:
+            result = self._read(key)
+            if result is not None:
+                self.disk_hits += 1
+                self._remember(key, result)
+                return ValidationResult(result.errors)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        self._remember(key, result)
+        if self.directory:
+            self._write(key, result)
+
+    def validate(self, html):
+        key = self.key(html.encode("utf-8", "surrogatepass"))
+        result = self.get(key)
+        if result is None:
+            result = validate_html(html, rules=self.rules)
+            self.put(key, result)
+        return result
+
+    def validate_path(self, path):
+        key = self.path_key(path)
+        result = self.get(key)
+        if result is None:
+            result = validate_path(path, rules=self.rules)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def clear(self):
+        self.entries.clear()
+
+    def _remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _file(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pickle")
+
+    def _read(self, key):
+        path = self._file(key)
+        try:
+            with open(path, "rb") as file:
+                result = pickle.load(file)
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return result
+
+    def _write(self, key, result):
+        path = self._file(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary_path, "wb") as file:
+                pickle.dump(result, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        if self.disk_bytes is None:
+            self.disk_bytes = sum(stat.st_size for _, stat in self._disk_files())
+        else:
+            self.disk_bytes += size
+        if self.disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".pickle"):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except OSError:
+                        pass
+
+    def _evict(self):
+        # Remove the least recently used files until the store is back under 90% of its limit
+        files = sorted((stat.st_mtime, path, stat.st_size) for path, stat in self._disk_files())
+        total = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.disk_bytes = total
+
+
+def validate_changed_path(path, known_hash=None, rules=None):
+    """Validate the file at ``path`` unless its content hash is ``known_hash``.
+
+    Returns the content hash and the ValidationResult, None when the content is the one hashed before. The file
+    is memory-mapped and read once for both.
+    """
+    with mapped_file(path) as source:
+        # Empty files are not mapped: their content is no bytes
+        content_hash = hashlib.blake2b(source if isinstance(source, mmap.mmap) else b"", digest_size=16).hexdigest()
+        return content_hash, None if content_hash == known_hash else validate_stream(source, rules=rules)
+
+
+class Manifest:
+    """Results of the files of a tree, with the size, modification time and content hash of each file.
+
+    Kept in a SQLite database in ``directory``. A file whose size and modification time are those of its entry
+    is reported from the manifest without being read; one whose content hash did not change is not validated
+    again. Files have an entry per set of rules checked, so runs with different rules share the manifest, and
+    entries of another results_version count as missing. Results are stored as report rows, see
+    reports.error_rows.
+
+    The manifest belongs to one process: the workers of a run send their results to it. Updates are written in
+    batches of ``batch_size``, and committed by close.
+    """
+
+    FILE_NAME = "manifest.sqlite"
+
+    def __init__(self, directory, rules=None, batch_size=1000):
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, self.FILE_NAME))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        # Manifests written before entries were kept per set of rules had a single entry per path
+        self.connection.execute("DROP TABLE IF EXISTS files")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (path TEXT, rules TEXT, size INTEGER, "
+                                "mtime_ns INTEGER, hash TEXT, version TEXT, errors INTEGER, rows BLOB, "
+                                "PRIMARY KEY (path, rules))")
+        self.rules_key = (default_rules() if rules is None else rules).key
+        self.version = results_version(rules)
+        self.batch_size = batch_size
+        self.updates = []
+        self.hits = 0
+        # path -> (size, mtime_ns, hash, errors) of the entries of this version, so unchanged files without
+        # errors cost no query
+        self.entries = {path: entry for path, *entry in self.connection.execute(
+            "SELECT path, size, mtime_ns, hash, errors FROM entries WHERE rules = ? AND version = ?",
+            (self.rules_key, self.version))}
+
+    def lookup(self, path, stat):
+        # Returns the stored rows of ``path`` if its ``stat`` did not change, or None and the content hash of its
+        # entry (None without one) for the file to be validated
+        entry = self.entries.get(path)
+        if entry is None:
+            return None, None
+        size, mtime_ns, content_hash, errors = entry
+        if size != stat.st_size:
+            return None, None
+        if mtime_ns != stat.st_mtime_ns:
+            return None, content_hash
+        self.hits += 1
+        return self.rows(path) if errors else [], content_hash
+
+    def rows(self, path):
+        row = self.connection.execute("SELECT rows FROM entries WHERE path = ? AND rules = ?",
+                                      (path, self.rules_key)).fetchone()
+        return pickle.loads(row[0]) if row and row[0] else []
+
+    def record(self, path, stat, content_hash, rows):
+        self.entries[path] = (stat.st_size, stat.st_mtime_ns, content_hash, len(rows))
+        self.updates.append((path, self.rules_key, stat.st_size, stat.st_mtime_ns, content_hash, self.version,
+                             len(rows), pickle.dumps(rows, pickle.HIGHEST_PROTOCOL) if rows else None))
+        if len(self.updates) >= self.batch_size:
+            self.flush()
+
+    def touch(self, path, stat):
+        # The content of ``path`` is the one recorded, its results are still valid: returns them
+        rows = self.rows(path)
+        self.record(path, stat, self.entries[path][2], rows)
+        return rows
+
+    def flush(self):
+        if self.updates:
+            self.connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self.updates)
+            self.updates = []
+
+    def close(self):
+        self.flush()
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
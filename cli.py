@@ -0,0 +1,234 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+
+from cache import Manifest, validate_changed_path
+from main import validate_path
+from profiling import Profile
+from reports import FORMATS, create_report, error_rows
+from results import ValidationError, UNREADABLE_FILE
+from rules import RULES, PRESETS, DEFAULT_PRESET, select_rules
+from schema import preload_schema
+
+HTML_EXTENSIONS = (".html", ".htm")
+
+
+def find_files(targets, extensions=HTML_EXTENSIONS):
+    # Expand directories (recursively) and glob patterns into files, in a stable order
+    for target in targets:
+        if os.path.isdir(target):
+            for root, dirs, files in os.walk(target):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(extensions):
+                        yield os.path.join(root, name)
+        elif any(char in target for char in "*?["):
+            for path in sorted(glob.iglob(target, recursive=True)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield target
+
+
+# Whether to profile and the rules to check in the current process, see init_worker
+_profile = False
+_rules = None
+
+# Directory of the manifest when --cache-dir is given without one
+DEFAULT_CACHE_DIR = ".validator-cache"
+
+
+def init_worker(profile=False, rules=None):
+    global _profile, _rules
+    _profile = profile
+    _rules = rules
+
+
+def unreadable(e):
+    return error_rows([ValidationError(UNREADABLE_FILE, args=(e.strerror,))])
+
+
+def validate_file(path):
+    # Runs in the worker processes: returns the path, its errors as report rows and its Profile if profiling
+    try:
+        result = validate_path(path, profile=_profile, rules=_rules)
+    except OSError as e:
+        return path, unreadable(e), None
+    return path, error_rows(result.errors), result.profile
+
+
+def validate_changed_file(task):
+    # Runs in the worker processes for runs with a manifest: returns the path, its rows (None when its content
+    # hash is still the known one) and its content hash (None when it cannot be read)
+    path, known_hash = task
+    try:
+        content_hash, result = validate_changed_path(path, known_hash, _rules)
+    except OSError as e:
+        return path, unreadable(e), None
+    return path, None if result is None else error_rows(result.errors), content_hash
+
+
+def map_in_workers(function, tasks, jobs=None, ordered=True, chunksize=16, profile=False, rules=None):
+    if jobs == 1:
+        init_worker(profile, rules)
+        yield from map(function, tasks)
+        return
+
+    preload_schema()
+    with multiprocessing.Pool(jobs, init_worker, (profile, rules)) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(function, tasks, chunksize)
+
+
+def iter_results(paths, jobs=None, ordered=True, chunksize=16, cache_dir=None, profile=False, rules=None):
+    # Yields the path, rows and Profile (None unless profiling) of each file. Profiled runs always validate.
+    if cache_dir and not profile:
+        with Manifest(cache_dir, rules) as manifest:
+            for path, rows in iter_manifest_results(manifest, paths, jobs, ordered, chunksize, rules):
+                yield path, rows, None
+        return
+    yield from map_in_workers(validate_file, paths, jobs, ordered, chunksize, profile, rules)
+
+
+def iter_manifest_results(manifest, paths, jobs=None, ordered=True, chunksize=16, rules=None):
+    # Files whose size and modification time did not change are only stat-ed: their rows come from the
+    # manifest. The others are validated by the workers and recorded.
+    plan = []  # (path, rows), rows being None for the files sent to the workers
+    tasks = []
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # The worker reports why it cannot be read
+            plan.append((path, None))
+            tasks.append((path, None))
+            continue
+        rows, known_hash = manifest.lookup(path, stat)
+        plan.append((path, rows))
+        if rows is None:
+            tasks.append((path, known_hash))
+            stats[path] = stat
+
+    def record(path, rows, content_hash):
+        if content_hash is None:
+            return rows
+        if rows is None:
+            return manifest.touch(path, stats[path])
+        manifest.record(path, stats[path], content_hash, rows)
+        return rows
+
+    validated = map_in_workers(validate_changed_file, tasks, jobs, ordered, chunksize, rules=rules) if tasks else ()
+    if not ordered:
+        for path, rows in plan:
+            if rows is not None:
+                yield path, rows
+        for path, rows, content_hash in validated:
+            yield path, record(path, rows, content_hash)
+        return
+
+    validated = iter(validated)
+    for path, rows in plan:
+        if rows is None:
+            path, rows, content_hash = next(validated)
+            rows = record(path, rows, content_hash)
+        yield path, rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="validator", description="Validate HTML files.",
+                                     epilog="Run 'validator serve --help' for the HTTP service, 'validator lsp' for "
+                                            "the editor language server on stdio, 'validator fix --help' to write a "
+                                            "repaired copy of a file.")
+    parser.add_argument("paths", nargs="*", help="files, directories or glob patterns to validate")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="print results as soon as they are ready instead of in input order")
+    parser.add_argument("--chunksize", type=int, default=16, help="files sent to a worker at a time")
+    parser.add_argument("--cache-dir", help="only validate the files changed since the last run with this "
+                                             "directory, and reuse the results kept in it for the others")
+    parser.add_argument("--cache", action="store_const", const=DEFAULT_CACHE_DIR, dest="cache_dir",
+                        help=f"same as --cache-dir {DEFAULT_CACHE_DIR}")
+    parser.add_argument("--stats", action="store_true",
+                        help="print the time spent in each validation phase, token and error counts (disables the "
+                             "cache)")
+    parser.add_argument("--preset", choices=list(PRESETS),
+                        help=f"set of rules to check (default: {DEFAULT_PRESET}, or the preset of --config)")
+    parser.add_argument("--enable", action="append", default=[], metavar="RULE", help="also check this rule")
+    parser.add_argument("--disable", action="append", default=[], metavar="RULE", help="do not check this rule")
+    parser.add_argument("--config", help="JSON or TOML file with the preset and the rules to enable or disable")
+    parser.add_argument("--list-rules", action="store_true", help="list the rules and presets, then exit")
+    parser.add_argument("-f", "--format", choices=list(FORMATS), default="text",
+                        help="report format: text, JSON Lines, SARIF or JUnit XML (default: text)")
+    parser.add_argument("-o", "--output", help="file to write the report to (default: standard output)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the final summary")
+    return parser
+
+
+def list_rules():
+    width = max(map(len, RULES))
+    for rule in RULES.values():
+        print(f"{rule.name:<{width}}  {rule.description}")
+    print()
+    for name, names in PRESETS.items():
+        print(f"preset {name}: " + ("every rule" if names is None else ", ".join(names)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        import server
+        return server.main(argv[1:])
+    if argv[:1] == ["lsp"]:
+        import lsp
+        return lsp.main(argv[1:])
+    if argv[:1] == ["fix"]:
+        import repair
+        return repair.main(argv[1:])
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.list_rules:
+        list_rules()
+        return 0
+    if not args.paths:
+        parser.error("the following arguments are required: paths")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    try:
+        rules = select_rules(args.preset, args.enable, args.disable, args.config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    try:
+        # Reports are written as results come in: a large buffer keeps writes few
+        output = open(args.output, "w", encoding="utf-8", buffering=1 << 20) if args.output else sys.stdout
+    except OSError as e:
+        parser.error(f"cannot write {e.filename}: {e.strerror}")
+    profile = Profile()
+    report = create_report(args.format, output)
+    try:
+        report.start()
+        results = iter_results(find_files(args.paths), args.jobs, not args.unordered, args.chunksize,
+                               args.cache_dir, args.stats, rules)
+        for path, rows, file_profile in results:
+            report.add(path, rows)
+            if file_profile is not None:
+                profile.merge(file_profile)
+        report.finish()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.stats:
+        print(profile.render(), file=sys.stderr)
+    if not args.quiet:
+        print(report.summary.render(), file=sys.stderr)
+    return 1 if report.summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+from schema import get_schema
+
+# What a start tag does to the element it would be a child of
+ALLOWED = 0
+IMPLIED_END = 1  # The parent ends there: it is popped, then the next open element is checked
+DISALLOWED = 2
+
+# Content categories of the HTML standard, limited to what the rules below need
+METADATA = {"base", "link", "meta", "noscript", "script", "style", "template", "title"}
+HEAD_ONLY = {"base", "title"}
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6", "hgroup"}
+# Flow content that is not phrasing content: the start tags that end an open <p>
+BLOCK = {"address", "article", "aside", "blockquote", "center", "details", "dialog", "dir", "div", "dl",
+         "fieldset", "figcaption", "figure", "footer", "form", "header", "hr", "main", "menu", "nav", "ol", "p",
+         "pre", "search", "section", "table", "ul"} | HEADINGS
+PHRASING = {"a", "abbr", "area", "audio", "b", "bdi", "bdo", "br", "button", "canvas", "cite", "code", "data",
+            "datalist", "del", "dfn", "em", "embed", "i", "iframe", "img", "input", "ins", "kbd", "label", "link",
+            "map", "mark", "meta", "meter", "noscript", "object", "output", "picture", "progress", "q", "ruby", "s",
+            "samp", "script", "select", "small", "span", "strong", "sub", "sup", "svg", "template", "textarea",
+            "time", "u", "var", "video", "wbr", "big", "font", "tt", "strike", "acronym"}
+
+# Elements whose content is phrasing content only
+PHRASING_PARENTS = {"abbr", "b", "bdi", "bdo", "button", "cite", "code", "data", "dfn", "em", "i", "kbd", "label",
+                    "legend", "mark", "output", "p", "pre", "progress", "q", "s", "samp", "small", "span", "strong",
+                    "sub", "summary", "sup", "time", "u", "var", "big", "font", "tt", "strike", "acronym"} | (
+                       HEADINGS - {"hgroup"})
+
+# Foreign elements: the HTML content model does not apply to what they contain
+FOREIGN = {"svg", "math"}
+
+# Elements whose children are restricted to a list
+SCRIPT_SUPPORTING = {"script", "template"}
+CHILDREN = {
+    "head": METADATA,
+    "ul": {"li"} | SCRIPT_SUPPORTING,
+    "ol": {"li"} | SCRIPT_SUPPORTING,
+    "menu": {"li"} | SCRIPT_SUPPORTING,
+    "dir": {"li"} | SCRIPT_SUPPORTING,
+    "dl": {"dt", "dd", "div"} | SCRIPT_SUPPORTING,
+    "table": {"caption", "colgroup", "thead", "tbody", "tfoot", "tr"} | SCRIPT_SUPPORTING,
+    "thead": {"tr"} | SCRIPT_SUPPORTING,
+    "tbody": {"tr"} | SCRIPT_SUPPORTING,
+    "tfoot": {"tr"} | SCRIPT_SUPPORTING,
+    "tr": {"td", "th"} | SCRIPT_SUPPORTING,
+    "colgroup": {"col", "template"},
+    "select": {"option", "optgroup", "hr"} | SCRIPT_SUPPORTING,
+    "optgroup": {"option"} | SCRIPT_SUPPORTING,
+    "datalist": {"option"} | PHRASING,
+    "picture": {"source", "img"} | SCRIPT_SUPPORTING,
+    "ruby": {"rt", "rp"} | PHRASING,
+    "hgroup": {"p"} | HEADINGS | SCRIPT_SUPPORTING,
+    "frameset": {"frame", "frameset", "noframes"},
+}
+
+# Elements that can only be children of the given elements
+PARENTS = {
+    "li": {"ul", "ol", "menu", "dir"},
+    "dt": {"dl", "div"},
+    "dd": {"dl", "div"},
+    "tr": {"table", "thead", "tbody", "tfoot"},
+    "td": {"tr"},
+    "th": {"tr"},
+    "thead": {"table"},
+    "tbody": {"table"},
+    "tfoot": {"table"},
+    "caption": {"table"},
+    "colgroup": {"table"},
+    "col": {"colgroup", "table"},
+    "option": {"select", "datalist", "optgroup"},
+    "optgroup": {"select"},
+    "legend": {"fieldset"},
+    "figcaption": {"figure"},
+    "summary": {"details"},
+    "source": {"audio", "video", "picture", "object"},
+    "track": {"audio", "video"},
+    "param": {"object", "applet"},
+    "rt": {"ruby"},
+    "rp": {"ruby"},
+    "head": {"html"},
+    "body": {"html"},
+    "frame": {"frameset"},
+}
+
+# Elements that cannot contain the given elements, even through a single level
+NESTING = {
+    "a": {"a"},
+    "button": {"a", "button"},
+    "form": {"form"},
+    "label": {"label"},
+    "dfn": {"dfn"},
+}
+
+# Open elements whose end tag may be omitted, and the start tags that end them
+ENDED_BY = {
+    "head": {"body"},
+    "p": BLOCK,
+    "li": {"li"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "option": {"option", "optgroup"},
+    "optgroup": {"optgroup"},
+    "tr": {"tr", "thead", "tbody", "tfoot"},
+    "td": {"td", "th", "tr", "thead", "tbody", "tfoot"},
+    "th": {"td", "th", "tr", "thead", "tbody", "tfoot"},
+    "thead": {"thead", "tbody", "tfoot"},
+    "tbody": {"thead", "tbody", "tfoot"},
+    "tfoot": {"thead", "tbody", "tfoot"},
+    "colgroup": {"caption", "colgroup", "thead", "tbody", "tfoot", "tr"},
+    "rt": {"rt", "rp"},
+    "rp": {"rt", "rp"},
+}
+
+# Elements in which text other than whitespace is not allowed
+NO_TEXT = {"head", "ul", "ol", "menu", "dir", "dl", "table", "thead", "tbody", "tfoot", "tr", "colgroup", "select",
+           "optgroup", "picture", "frameset"}
+
+
+class ContentModel:
+    """Nesting rules compiled for the tag IDs of a schema.
+
+    ``transitions[parent * stride + child]`` is ALLOWED, IMPLIED_END or DISALLOWED for a start tag ``child``
+    inside an open ``parent``, ``root`` being the parent at the top level. ``optional_end[tag]`` tells whether
+    an element is implicitly closed by the end tag of an ancestor, ``text_allowed[tag]`` whether it can contain
+    text. Elements the rules do not mention can contain anything and appear anywhere, as can the content of
+    <template>. ``foreign`` holds the tag IDs of FOREIGN, inside which children are not checked.
+    """
+
+    def __init__(self, schema):
+        names = schema.tag_names
+        count = len(names)
+        self.stride = count + 1
+        self.root = count
+        transitions = bytearray(self.stride * self.stride)
+        for parent, parent_name in enumerate(names):
+            row = parent * self.stride
+            for child, child_name in enumerate(names):
+                transitions[row + child] = self.transition(parent_name, child_name)
+        self.transitions = bytes(transitions)
+        self.optional_end = bytes(name in ENDED_BY for name in names)
+        self.text_allowed = bytes(name not in NO_TEXT for name in names) + b"\x01"
+        self.foreign = tuple(tag_id for tag_id, name in enumerate(names) if name in FOREIGN)
+
+    @staticmethod
+    def transition(parent, child):
+        if parent == "template":
+            return ALLOWED
+        if child in ENDED_BY.get(parent, ()):
+            return IMPLIED_END
+        if parent in CHILDREN and child not in CHILDREN[parent]:
+            return DISALLOWED
+        if parent in PHRASING_PARENTS and child in BLOCK:
+            return DISALLOWED
+        if child in PARENTS and parent not in PARENTS[child]:
+            return DISALLOWED
+        if child in HEAD_ONLY and parent != "head":
+            return DISALLOWED
+        if child in NESTING.get(parent, ()):
+            return DISALLOWED
+        return ALLOWED
+
+
+_content_model = None
+
+
+def get_content_model():
+    # Compiled on first use for the default schema
+    global _content_model
+    if _content_model is None:
+        _content_model = ContentModel(get_schema())
+    return _content_model
@@ -0,0 +1,221 @@
+from bisect import bisect_left
+
+from main import HTMLValidator, ProfilingValidator
+from results import ValidationError
+from tokenizer import tokenize, RAW_TEXT_END, TEXT, END_TAG, MALFORMED_COMMENT, UNCLOSED_LT
+
+# A checkpoint is kept at the first markup token of every CHECKPOINT_LINES lines
+CHECKPOINT_LINES = 64
+# Tokens between two checks of the cancellation callback
+CANCEL_CHECK_TOKENS = 1024
+
+
+class ValidationCancelled(Exception):
+    # Raised when a run is cancelled, the validator is then left as it was before the call
+    pass
+
+
+def merge_edits(edits, span=None):
+    """Combine successive ``(position, removed, added)`` edits into a single one.
+
+    Each edit is relative to the text left by the previous one, ``span`` is an already merged edit to start
+    from. Returns None when there are no edits.
+    """
+    for position, removed, added in edits:
+        if span is None:
+            span = (position, removed, added)
+            continue
+        start, old_length, new_length = span
+        new_end = start + new_length
+        # Text after the merged span is unchanged, so an edit reaching past it extends the span on both sides
+        edit_end = max(new_end, position + removed)
+        old_length += edit_end - new_end
+        new_start = min(start, position)
+        span = (new_start, old_length + start - new_start, edit_end + added - removed - new_start)
+    return span
+
+
+class IncrementalValidator:
+    """Keeps the validation of one document up to date while it is being edited.
+
+    The validator state is saved at checkpoints while validating. After an edit, tokenizing resumes from the
+    last checkpoint before the change and stops as soon as it reaches a checkpoint of the previous run with
+    the same state, so only the edited region is validated again. ``rules`` is the rules.RuleSet to check.
+    """
+
+    def __init__(self, html="", rules=None):
+        self.html = ""
+        self.rules = rules
+        self.checkpoints = []  # [offset, line, error count, id count, validator snapshot]
+        self.errors = []
+        self.ids = []  # id attributes of the whole document, see HTMLValidator.ids
+        self.final_state = HTMLValidator(rules).snapshot()
+        self.profile = None  # Profile of the last set_text, while the text is unchanged
+        self.set_text(html)
+
+    def set_text(self, html, profile=False, cancelled=None):
+        # Validate the whole document from scratch, recording a Profile if ``profile``
+        validator = ProfilingValidator(rules=self.rules) if profile else HTMLValidator(self.rules)
+        self.checkpoints, self.errors, self.ids, self.final_state = self._run(validator, html, 0, 1, 0, 0,
+                                                                              cancelled=cancelled)[:4]
+        self.html = html
+        self.profile = validator.result().profile if profile else None
+
+    def replace(self, position, removed, text):
+        # Replace ``removed`` characters at ``position`` by ``text``
+        html = self.html[:position] + text + self.html[position + removed:]
+        self.update(html, position, removed, len(text))
+
+    def update(self, html, position, removed, added, cancelled=None):
+        # ``html`` is the whole new document, in which ``added`` characters replaced ``removed`` at ``position``.
+        # ``cancelled`` is polled while validating, ValidationCancelled is raised once it returns True.
+        old = self.html
+        if position < 0 or position + removed > len(old) or position + added > len(html):
+            self.set_text(html, cancelled=cancelled)
+            return
+
+        old_edit_end = position + removed
+        char_delta = added - removed
+        line_delta = html.count("\n", position, position + added) - old.count("\n", position, old_edit_end)
+
+        # Resume from the last checkpoint strictly before the edit, everything before it is unaffected
+        checkpoints = self.checkpoints
+        index = bisect_left([checkpoint[0] for checkpoint in checkpoints], position) - 1
+        # Unless the edit turned the tag there into bogus markup, which belongs to the text run before it
+        while index >= 0 and next(tokenize(html, checkpoints[index][0], checkpoints[index][1])).kind == TEXT:
+            index -= 1
+        if index < 0:
+            self.set_text(html, cancelled=cancelled)
+            return
+        offset, line, error_count, id_count, snapshot = checkpoints[index]
+
+        # Columns only move on the rest of the line where the edit ends
+        column_delta = (position + added - html.rfind("\n", 0, position + added)) - (
+            old_edit_end - old.rfind("\n", 0, old_edit_end))
+        line_end = old.find("\n", old_edit_end)
+        if line_end == -1:
+            line_end = len(old)
+
+        def shift(old_line, old_column, old_offset):
+            # Position in the new document of something at ``old_offset``, None inside the replaced text
+            if old_offset < position:
+                return old_line, old_column, old_offset
+            if old_offset >= old_edit_end:
+                if old_offset <= line_end:
+                    old_column += column_delta
+                return old_line + line_delta, old_column, old_offset + char_delta
+            return None
+
+        # Checkpoints of the previous run that lie after the edit, keyed by their offset in the new document
+        resync = {}
+        for later in range(index + 1, len(checkpoints)):
+            if checkpoints[later][0] >= old_edit_end:
+                resync[checkpoints[later][0] + char_delta] = later
+
+        def matches(later, validator):
+            stack, doctype_found, found, closed = checkpoints[later][4]
+            if (doctype_found != validator.doctype_found or len(stack) != len(validator.tags_stack)
+                    or found != tuple(validator.essential_tags_found.values())
+                    or closed != tuple(validator.essential_tags_closed.values())):
+                return False
+            for (old_line, old_column, tag, old_offset), current in zip(stack, validator.tags_stack):
+                moved = shift(old_line, old_column, old_offset)
+                if moved is None or (moved[0], moved[1], tag, moved[2]) != current:
+                    return False
+            return True
+
+        validator = HTMLValidator(self.rules)
+        validator.restore(snapshot)
+        new_checkpoints, new_errors, new_ids, final_state, stop = self._run(
+            validator, html, offset, line, error_count, id_count, position + added, resync, matches, cancelled)
+        self.html = html
+        self.profile = None
+
+        if stop is None:
+            checkpoints[index:] = new_checkpoints
+            self.errors[error_count:] = new_errors
+            self.ids[id_count:] = new_ids
+            self.final_state = final_state
+            return
+
+        # Patch the new errors and ids in and move everything after the resynchronisation point
+        old_count = checkpoints[stop][2]
+        old_id_count = checkpoints[stop][3]
+        self.errors[error_count:old_count] = new_errors
+        self.ids[id_count:old_id_count] = new_ids
+        ids = self.ids
+        for i in range(id_count + len(new_ids), len(ids)):
+            value, id_line, id_column, id_offset = ids[i]
+            ids[i] = (value,) + shift(id_line, id_column, id_offset)
+        errors = self.errors
+        for i in range(error_count + len(new_errors), len(errors)):
+            error = errors[i]
+            if error.offset is not None and error.offset >= old_edit_end:
+                # Errors are shared with results already handed out, so moved ones are copied
+                line_number, column, offset = shift(error.line, error.column, error.offset)
+                errors[i] = ValidationError(error.code, line_number, column, error.tag, error.args, offset)
+
+        count_delta = len(new_errors) - (old_count - error_count)
+        id_delta = len(new_ids) - (old_id_count - id_count)
+        moved = []
+        for old_offset, old_line, old_error_count, old_id_count, old_snapshot in checkpoints[stop:]:
+            moved.append([old_offset + char_delta, old_line + line_delta, old_error_count + count_delta,
+                          old_id_count + id_delta, self._shift_snapshot(old_snapshot, shift)])
+        checkpoints[index:] = new_checkpoints + moved
+        self.final_state = self._shift_snapshot(self.final_state, shift)
+
+    @staticmethod
+    def _shift_snapshot(snapshot, shift):
+        stack, doctype_found, found, closed = snapshot
+        shifted = []
+        for old_line, old_column, tag, old_offset in stack:
+            new_line, new_column, new_offset = shift(old_line, old_column, old_offset)
+            shifted.append((new_line, new_column, tag, new_offset))
+        return tuple(shifted), doctype_found, found, closed
+
+    @staticmethod
+    def _run(validator, html, offset, line, error_count, id_count, edit_end=None, resync=None, matches=None,
+             cancelled=None):
+        # Feed tokens from ``offset`` on, recording checkpoints. Stops at the first checkpoint of the previous
+        # run found past ``edit_end`` whose state matches, and returns its index.
+        checkpoints = []
+        next_checkpoint = line
+        tainted = False
+        tokens = tokenize(html, offset, line)
+        if isinstance(validator, ProfilingValidator):
+            tokens = validator.profile.timed_tokens(tokens)
+        if cancelled is not None:
+            tokens = IncrementalValidator._cancellable(tokens, cancelled)
+        for token in tokens:
+            start = token.start
+            # Only markup tokens are safe resume points: no earlier token looked past them. Bogus markup is not
+            # either, being part of the text run around it, nor the end tag the content of a raw text element
+            # was searched up to.
+            if (not tainted and html.startswith("<", start) and token.kind != TEXT
+                    and not (token.kind == END_TAG and token.name.lower() in RAW_TEXT_END)):
+                if resync and start >= edit_end and start in resync and matches(resync[start], validator):
+                    return checkpoints, validator.errors, validator.ids, None, resync[start]
+                if token.line >= next_checkpoint:
+                    checkpoints.append([start, token.line, error_count + len(validator.errors),
+                                        id_count + len(validator.ids), validator.snapshot()])
+                    next_checkpoint = token.line + CHECKPOINT_LINES
+            validator.feed(token)
+            # An unterminated "<!--" was scanned up to the end of the document for its "-->"
+            if (token.kind == MALFORMED_COMMENT or token.kind == UNCLOSED_LT) and html.startswith("<!--", start):
+                tainted = True
+        return checkpoints, validator.errors, validator.ids, validator.snapshot(), None
+
+    @staticmethod
+    def _cancellable(tokens, cancelled):
+        for count, token in enumerate(tokens):
+            if not count % CANCEL_CHECK_TOKENS and cancelled():
+                raise ValidationCancelled()
+            yield token
+
+    def result(self):
+        # Same result as validate_html for the current text
+        validator = HTMLValidator(self.rules)
+        validator.restore(self.final_state)
+        result = validator.result(self.errors, self.ids)
+        result.profile = self.profile
+        return result
@@ -0,0 +1,242 @@
+import json
+import sys
+
+from incremental import IncrementalValidator
+from prescan import LineIndex, LSP_LINE_BREAK_RE
+from schema import get_schema
+
+SERVER_NAME = "html-validator"
+
+# textDocument/didChange sends only the changed ranges
+SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+
+def utf16_length(text):
+    # Length of ``text`` in UTF-16 code units, the default unit of LSP positions
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def utf16_to_index(text, units):
+    # Index in ``text`` of the character ``units`` UTF-16 code units from its start
+    if text.isascii():
+        return min(units, len(text))
+    index = 0
+    for char in text:
+        if units <= 0:
+            break
+        units -= 2 if ord(char) > 0xFFFF else 1
+        index += 1
+    return index
+
+
+class Document:
+    """An open document: its text, its lines and its incremental validation state.
+
+    ``lines`` is the prescan.LineIndex of the lines as LSP counts them, "\r\n", "\n" and a lone "\r" ending a
+    line. Positions are converted from and to offsets with it, whatever lines the validator counts.
+    """
+
+    def __init__(self, text, version=None):
+        self.version = version
+        self.validator = IncrementalValidator(text)
+        self.lines = LineIndex(text, LSP_LINE_BREAK_RE)
+
+    @property
+    def text(self):
+        return self.validator.html
+
+    def line_text(self, line):
+        # Text of the 0-based ``line``, without its line break
+        text = self.text
+        starts = self.lines.starts
+        start = starts[line]
+        if line + 1 == len(starts):
+            return text[start:]
+        end = starts[line + 1]
+        return text[start:end - 2 if text.startswith("\r\n", end - 2) else end - 1]
+
+    def offset(self, position, utf16=True):
+        starts = self.lines.starts
+        line = position["line"]
+        if line >= len(starts):
+            return len(self.text)
+        line_text = self.line_text(line)
+        character = position["character"]
+        if utf16:
+            character = utf16_to_index(line_text, character)
+        # Past the end of the line is the end of the line
+        return starts[line] + min(character, len(line_text))
+
+    def position(self, offset, utf16=True):
+        # LSP position of the character at ``offset``
+        line, column = self.lines.position(offset)
+        start = self.lines.starts[line - 1]
+        character = utf16_length(self.text[start:offset]) if utf16 else column - 1
+        return {"line": line - 1, "character": character}
+
+    def apply(self, change, utf16=True):
+        text = self.text
+        if "range" not in change:
+            self.validator.set_text(change["text"])
+            self.lines = LineIndex(change["text"], LSP_LINE_BREAK_RE)
+            return
+
+        start = self.offset(change["range"]["start"], utf16)
+        end = max(start, self.offset(change["range"]["end"], utf16))
+        inserted = change["text"]
+        self.validator.update(text[:start] + inserted + text[end:], start, end - start, len(inserted))
+        self.lines.replace(self.text, start, end, len(inserted))
+
+    def diagnostics(self, utf16=True):
+        diagnostics = []
+        for error in self.validator.result():
+            if error.offset is not None:
+                start = self.position(error.offset, utf16)
+            elif error.line is not None:
+                start = {"line": error.line - 1, "character": error.column - 1}
+            else:
+                start = {"line": 0, "character": 0}
+            end = {"line": start["line"], "character": start["character"] + 1}
+            diagnostics.append({"range": {"start": start, "end": end}, "severity": SEVERITY_ERROR,
+                                "code": error.code, "source": SERVER_NAME, "message": error.message})
+        return diagnostics
+
+
+class LanguageServer:
+    """Language Server Protocol subset over stdio: document sync and diagnostics.
+
+    Documents are validated incrementally as they change, and their diagnostics are published after every
+    didOpen and didChange. The schema is loaded once for the lifetime of the process.
+    """
+
+    def __init__(self, reader=None, writer=None):
+        self.reader = reader or sys.stdin.buffer
+        self.writer = writer or sys.stdout.buffer
+        self.documents = {}
+        self.utf16 = True
+        self.shutdown_requested = False
+
+    def read_message(self):
+        # Returns the decoded message, or None at the end of the input
+        length = None
+        while True:
+            line = self.reader.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                if length is not None:
+                    break
+                continue
+            name, _, value = line.decode("ascii").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return json.loads(self.reader.read(length))
+
+    def send(self, message):
+        message["jsonrpc"] = "2.0"
+        data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self.writer.write(b"Content-Length: %d\r\n\r\n" % len(data) + data)
+        self.writer.flush()
+
+    def publish(self, uri):
+        document = self.documents.get(uri)
+        params = {"uri": uri, "diagnostics": document.diagnostics(self.utf16) if document else []}
+        if document is not None and document.version is not None:
+            params["version"] = document.version
+        self.send({"method": "textDocument/publishDiagnostics", "params": params})
+
+    def initialize(self, params):
+        get_schema()
+        # UTF-32 positions are Python string indexes, so use them whenever the client allows it
+        encodings = params.get("capabilities", {}).get("general", {}).get("positionEncodings", [])
+        self.utf16 = "utf-32" not in encodings
+        capabilities = {"textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL}}
+        if not self.utf16:
+            capabilities["positionEncoding"] = "utf-32"
+        return {"capabilities": capabilities, "serverInfo": {"name": SERVER_NAME}}
+
+    def did_open(self, params):
+        document = params["textDocument"]
+        self.documents[document["uri"]] = Document(document["text"], document.get("version"))
+        self.publish(document["uri"])
+
+    def did_change(self, params):
+        uri = params["textDocument"]["uri"]
+        document = self.documents.get(uri)
+        if document is None:
+            return
+        for change in params["contentChanges"]:
+            document.apply(change, self.utf16)
+        document.version = params["textDocument"].get("version")
+        self.publish(uri)
+
+    def did_close(self, params):
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self.publish(uri)
+
+    def shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+    def handle(self, message):
+        method = message.get("method")
+        params = message.get("params") or {}
+        is_request = "id" in message
+        handlers = {
+            "initialize": self.initialize,
+            "shutdown": self.shutdown,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close,
+        }
+
+        handler = handlers.get(method)
+        if handler is None:
+            # Unknown notifications, "initialized" and "$/..." included, are ignored
+            if is_request:
+                self.send({"id": message["id"], "error": {"code": METHOD_NOT_FOUND,
+                                                          "message": f"Unknown method: {method}"}})
+            return
+        try:
+            result = handler(params)
+        except Exception as e:
+            if is_request:
+                self.send({"id": message["id"], "error": {"code": INTERNAL_ERROR,
+                                                          "message": f"{type(e).__name__}: {e}"}})
+            return
+        if is_request:
+            self.send({"id": message["id"], "result": result})
+
+    def run(self):
+        # Returns the exit code: 0 only if the client asked for a shutdown before exiting
+        while True:
+            try:
+                message = self.read_message()
+            except (ValueError, UnicodeDecodeError):
+                self.send({"id": None, "error": {"code": PARSE_ERROR, "message": "Malformed message."}})
+                continue
+            if message is None:
+                return 1
+            if not isinstance(message, dict):
+                self.send({"id": None, "error": {"code": INVALID_REQUEST, "message": "Expected an object."}})
+                continue
+            if message.get("method") == "exit":
+                return 0 if self.shutdown_requested else 1
+            self.handle(message)
+
+
+def main(argv=None):
+    return LanguageServer().run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,137 +1,596 @@
-import json
+import mmap
 import re
+from contextlib import contextmanager
+from time import perf_counter
+from types import MethodType
 
-from tututu import empiler, depiler
+import results
+from attributes import ATTRIBUTE_RE, get_attribute_rules
+from contentmodel import get_content_model, IMPLIED_END, DISALLOWED
+from results import ValidationError, ValidationResult
+from rules import default_rules
+from prescan import LineIndex
+from profiling import Profile, BALANCE, DECLARATIONS, COMMENTS, TAGS, ATTRIBUTES, FINALIZE
+from schema import get_schema
+from tokenizer import (tokenize, tokenize_stream, scan_end, holds_back, raw_text_end, ChunkReader, CHUNK_SIZE,
+                       TOKEN_RE, UNTERMINATED_RE, RAW_TEXT_END, DOCTYPE_RE, CONDITIONAL_RE, TOKEN_KINDS, TEXT,
+                       START_TAG, END_TAG, DOCTYPE, COMMENT, MALFORMED_COMMENT, STRAY_GT, UNCLOSED_LT)
+from tututu import empiler, ElementStack
 
-# Load tags and attributes information
-with open("html_unified_info.json", "r") as info_file:
-    unified_info = json.load(info_file)
+# Text that is not only whitespace, searched in place in the token source
+NON_SPACE_RE = re.compile(r'\S')
 
+# Track essential tags
+essential_tags_order = ["html", "head", "body"]
 
-def tag_details(tag_name):
-    return unified_info.get(tag_name.lower())
+# Rules that HTMLValidator.scan checks without going through their handlers
+SCANNED_RULES = frozenset({"balance", "doctype", "comments", "essential-tags", "unknown-tags", "nesting",
+                           "content-model", "attributes", "attribute-values", "duplicate-ids"})
 
 
-def validate_html(html: str) -> list | str:
-    html_lines = html.splitlines()
+class HTMLValidator:
+    # Validation state fed one token at a time, so that a run can be checkpointed and resumed, or given whole
+    # texts to scan when only built-in rules are checked. ``rules`` is the rules.RuleSet to check, every
+    # registered rule by default.
+    def __init__(self, rules=None):
+        self.schema = get_schema()
+        self.content_model = get_content_model()
+        self.attribute_validators = get_attribute_rules().validators
+        self.rules = rules = default_rules() if rules is None else rules
+        self.tags_stack = ElementStack(len(self.schema.tag_names))
+        self.errors = []
+        self.ids = []  # (value, line, column, offset) of every id attribute, checked for duplicates at the end
+        self.doctype_found = False
+        self.essential_tags_found = {tag: False for tag in essential_tags_order}
+        self.essential_tags_closed = {tag: False for tag in essential_tags_order}
+        self.essential_ids = {self.schema.tag_ids[tag]: tag for tag in essential_tags_order
+                              if tag in self.schema.tag_ids}
+        # Names of the raw text elements by tag ID, and the one whose content the last scan stopped in
+        tag_ids = self.schema.tag_ids
+        self.raw_text_names = {tag_ids[name]: name for name in RAW_TEXT_END if name in tag_ids}
+        self.raw_text = None
+        # Errors and ids before these indexes have a line, see resolve_lines
+        self.resolved_errors = 0
+        self.resolved_ids = 0
+        # Last text run: end offset, (line, column, offset) of its start, and whether it was reported
+        self.text_end = None
+        self.text_run = None
+        self.text_reported = False
 
-    tags_stack = []
-    errors = []
-    essential_errors = []
-    doctype_found = False
+        # Handlers of the enabled rules for each token kind, a handler shared by several rules being called once
+        self.handlers = {kind: [] for kind in TOKEN_KINDS}
+        for rule in rules:
+            if rule.handler is None:
+                continue
+            handler = getattr(self, rule.handler) if isinstance(rule.handler, str) else MethodType(rule.handler,
+                                                                                                  self)
+            for kind in rule.kinds:
+                if handler not in self.handlers[kind]:
+                    empiler(self.handlers[kind], handler)
+        self.report_unknown_tags = "unknown-tags" in rules
+        self.report_nesting = "nesting" in rules
+        self.report_disallowed_children = "content-model" in rules
+        self.check_attribute_names = "attributes" in rules
+        self.check_attribute_values = "attribute-values" in rules
+        self.collect_ids = "duplicate-ids" in rules
+        # Whether scan can validate the whole text at once, rather than feeding its tokens to the handlers
+        self.scans = all(rule.name in SCANNED_RULES for rule in rules)
 
-    # Track essential tags
-    essential_tags_order = ["html", "head", "body"]
-    essential_tags_found = {tag: False for tag in essential_tags_order}
-    essential_tags_closed = {tag: False for tag in essential_tags_order}
-    essential_tags_lines = {tag: None for tag in essential_tags_order}
+    def snapshot(self):
+        return (tuple(self.tags_stack.entries), self.doctype_found,
+                tuple(self.essential_tags_found.values()), tuple(self.essential_tags_closed.values()))
 
-    def handle_essential_tag(tag, is_closing, line_number):
-        if tag in essential_tags_order:
-            if is_closing:
-                essential_tags_closed[tag] = True
-            else:
-                essential_tags_found[tag] = True
-                if essential_tags_lines[tag] is None:
-                    essential_tags_lines[tag] = line_number
+    def restore(self, snapshot):
+        tags_stack, self.doctype_found, found, closed = snapshot
+        self.tags_stack = ElementStack(len(self.schema.tag_names), tags_stack)
+        self.essential_tags_found = dict(zip(essential_tags_order, found))
+        self.essential_tags_closed = dict(zip(essential_tags_order, closed))
 
-    def validate_essential_tags():
-        # Check for missing essential tags in the correct order
-        if not doctype_found:
-            empiler(essential_errors, "Missing DOCTYPE declaration.")
-        if not essential_tags_found["html"]:
-            empiler(essential_errors, "Missing <html> tag.")
-        elif not essential_tags_closed["html"]:
-            empiler(essential_errors, "Missing closing </html> tag.")
-        if essential_tags_found["html"]:
-            if not essential_tags_found["head"]:
-                empiler(essential_errors, "Missing <head> tag.")
-            elif not essential_tags_closed["head"]:
-                empiler(essential_errors, "Missing closing </head> tag.")
-            if not essential_tags_found["body"]:
-                empiler(essential_errors, "Missing <body> tag.")
-            elif not essential_tags_closed["body"]:
-                empiler(essential_errors, "Missing closing </body> tag.")
-
-    def validate_attributes(tag, attributes_str, line_number):
-        if attributes_str:
-            attributes = re.findall(r'(\w+)(?:\s*=\s*"[^"]*")?', attributes_str)
-            for attr in attributes:
-                if attr not in tag_details(tag)["attributes"]:
-                    empiler(errors, f"Line {line_number}: Invalid attribute '{attr}' for tag <{tag}>.")
-
-    for line_number, line_content in enumerate(html_lines, start=1):
-        line_content = line_content.strip()
-
-        # Check the arrows < >
-        an = []
-        for i in line_content:
-            if i == "<":
-                empiler(an, (line_number, i))
-            elif i == ">":
-                depiler(an) if an else empiler(errors, f"Line {line_number}: Unexpected closing tag {i}")
-        if an:
-            for line_number, _ in an:
-                empiler(errors, (f"Line {line_number}: Missing closing >."))
-
-        # Check for DOCTYPE declaration
-        if not doctype_found and re.match(r'<!DOCTYPE html>', line_content, re.IGNORECASE):
-            doctype_found = True
-
-        html_tags = re.findall(r'<(/?)(\w+)(?:\s+([^>]*?))?>', line_content)
-        comments = re.findall(r'(?P<full_comment><!-{0,2}\s*(?P<conditional>\[)?[^>]*>)', line_content)
-
-        # Check for valid comments
-        for match in comments:
-            full_comment, conditional = match
-            if full_comment.startswith('<!DOCTYPE') or conditional or re.match(r'<!--.*-->', full_comment):
+    def check_balance(self, token, tag_id):
+        code = results.UNEXPECTED_GT if token.kind == STRAY_GT else results.MISSING_GT
+        empiler(self.errors, ValidationError(code, token.line, token.column, offset=token.start))
+
+    def check_doctype(self, token, tag_id):
+        if not self.doctype_found and token.name_end - token.name_start == 4 and token.name.lower() == "html":
+            self.doctype_found = True
+
+    def check_comment(self, token, tag_id):
+        empiler(self.errors, ValidationError(results.MALFORMED_COMMENT, token.line, token.column, None,
+                                             (token.text,), token.start))
+
+    def check_text(self, token, tag_id):
+        # Only elements such as <ul> or <table> restrict text, whitespace is always allowed
+        entries = self.tags_stack.entries
+        if entries and not self.content_model.text_allowed[entries[-1][2]]:
+            self.disallowed_text(token.start, token.end, token.line, token.column, token.source, token.base)
+
+    def disallowed_text(self, start, end, line, column, source, base):
+        # Text inside an element that does not allow it. Text that streams split into several tokens is
+        # reported once, at the start of the run.
+        if start != self.text_end:
+            self.text_run = (line, column, start)
+            self.text_reported = False
+        self.text_end = end
+        if not self.text_reported and NON_SPACE_RE.search(source, start - base, end - base):
+            parent = self.tags_stack.entries[-1][2]
+            line, column, offset = self.text_run
+            self.text_reported = True
+            empiler(self.errors, ValidationError(results.DISALLOWED_TEXT, line, column, parent,
+                                                 (self.schema.tag_names[parent],), offset))
+
+    def handle_essential_tag(self, token, tag_id):
+        tag = self.essential_ids.get(tag_id)
+        if tag is not None:
+            self.essential_tag(tag, token.kind == END_TAG)
+
+    def essential_tag(self, tag, closing):
+        if closing:
+            self.essential_tags_closed[tag] = True
+            return
+        self.essential_tags_found[tag] = True
+        # The end tag of the head may be omitted: <body> closes it
+        if tag == "body" and self.essential_tags_found["head"]:
+            self.essential_tags_closed["head"] = True
+
+    def in_foreign_content(self):
+        # Inside <svg> or <math>, whose children the content model does not check
+        counts = self.tags_stack.counts
+        return any(counts[tag_id] for tag_id in self.content_model.foreign)
+
+    def validate_attributes(self, token, tag_id):
+        self.check_attributes(token.source, token.name_end, token.end - token.base, tag_id, token.line,
+                              token.column, token.start)
+
+    def check_attributes(self, source, name_end, end, tag_id, line, column, offset):
+        # Attributes are matched in place in ``source``, between the tag name and the closing ">" at ``end``.
+        # The attributes, attribute-values and duplicate-ids rules share this scan.
+        if end - name_end > 1:
+            schema = self.schema
+            allows_attribute = schema.allows_attribute
+            check_names = self.check_attribute_names
+            validators = self.attribute_validators[tag_id] if self.check_attribute_values else {}
+            collect_ids = self.collect_ids
+            errors = self.errors
+            seen = set()
+            for match in ATTRIBUTE_RE.finditer(source, name_end, end):
+                attr = match.group(1).lower()
+                if attr in seen:
+                    if check_names:
+                        empiler(errors, ValidationError(results.DUPLICATE_ATTRIBUTE, line, column, tag_id,
+                                                        (schema.tag_names[tag_id], attr), offset))
+                    continue
+                seen.add(attr)
+                if not allows_attribute(tag_id, attr):
+                    if check_names:
+                        empiler(errors, ValidationError(results.INVALID_ATTRIBUTE, line, column, tag_id,
+                                                        (schema.tag_names[tag_id], attr), offset))
+                    continue
+
+                validator = validators.get(attr)
+                if validator is not None or collect_ids and attr == "id":
+                    value = match.group(2)
+                    if value is None:
+                        value = match.group(3)
+                        if value is None:
+                            value = match.group(4) or ""
+                    expected = validator(value) if validator is not None else None
+                    if expected is not None:
+                        empiler(errors, ValidationError(results.INVALID_ATTRIBUTE_VALUE, line, column, tag_id,
+                                                        (schema.tag_names[tag_id], attr, value, expected), offset))
+                    elif collect_ids and attr == "id":
+                        empiler(self.ids, (value, line, column, offset))
+
+    def feed(self, token):
+        kind = token.kind
+        if kind != START_TAG and kind != END_TAG:
+            for handler in self.handlers[kind]:
+                handler(token, None)
+            return
+
+        tag_name = token.source[token.name_start:token.name_end]
+        tag_id = self.schema.tag_id(tag_name)
+        if tag_id is None:
+            if self.report_unknown_tags:
+                empiler(self.errors, ValidationError(results.UNKNOWN_TAG, token.line, token.column, None,
+                                                     (tag_name,), token.start))
+            return
+
+        for handler in self.handlers[kind]:
+            handler(token, tag_id)
+        if kind == END_TAG:
+            self.close_element(tag_id, token.line, token.column, token.start, tag_name)
+        else:
+            self.open_element(tag_id, token.line, token.column, token.start, tag_name)
+
+    # The open elements stack is kept whatever the rules, the nesting and content-model rules only decide which
+    # of the errors found on the way are reported. Every element is pushed and popped once, and scans of the
+    # stack only go over elements they pop, so the work stays linear in the document size.
+
+    def open_element(self, tag_id, line, column, offset, tag_name):
+        # One lookup in the transition table per open element the start tag implicitly ends
+        tags_stack = self.tags_stack
+        entries = tags_stack.entries
+        counts = tags_stack.counts
+        content_model = self.content_model
+        transitions = content_model.transitions
+        stride = content_model.stride
+        while entries:
+            parent = entries[-1][2]
+            transition = transitions[parent * stride + tag_id]
+            if transition == IMPLIED_END:
+                entries.pop()
+                counts[parent] -= 1
                 continue
+            if transition == DISALLOWED and self.report_disallowed_children and not self.in_foreign_content():
+                empiler(self.errors, ValidationError(results.DISALLOWED_CHILD, line, column, tag_id,
+                                                     (tag_name, self.schema.tag_names[parent]), offset))
+            break
+        if not self.schema.void[tag_id]:
+            entries.append((line, column, tag_id, offset))
+            counts[tag_id] += 1
+
+    def close_element(self, tag_id, line, column, offset, tag_name):
+        errors = self.errors
+        schema = self.schema
+        tags_stack = self.tags_stack
+        entries = tags_stack.entries
+        counts = tags_stack.counts
+        if entries and entries[-1][2] == tag_id:
+            entries.pop()
+            counts[tag_id] -= 1
+            return
+        if not counts[tag_id]:
+            if self.report_nesting:
+                expected_tag = schema.tag_names[entries[-1][2]] if entries else 'None'
+                empiler(errors, ValidationError(results.UNEXPECTED_CLOSING_TAG, line, column, tag_id,
+                                                (tag_name, expected_tag), offset))
+            return
+
+        # Open elements whose end tag may be omitted, such as <li>, end with their parent
+        optional_end = self.content_model.optional_end
+        index = len(entries) - 1
+        while entries[index][2] != tag_id and optional_end[entries[index][2]]:
+            index -= 1
+        if entries[index][2] == tag_id:
+            tags_stack.truncate(index)
+            return
+
+        report = self.report_nesting
+        if report:
+            empiler(errors, ValidationError(results.MISNESTED_CLOSING_TAG, line, column, tag_id, (tag_name,),
+                                            offset))
+        while entries[-1][2] != tag_id:
+            line_num, unclosed_column, unclosed_tag, unclosed_offset = entries.pop()
+            counts[unclosed_tag] -= 1
+            if report and not optional_end[unclosed_tag]:
+                empiler(errors, ValidationError(results.MISSING_CLOSING_TAG, line_num, unclosed_column,
+                                                unclosed_tag, (schema.tag_names[unclosed_tag],), unclosed_offset))
+        entries.pop()
+        counts[tag_id] -= 1
+
+    def scan(self, text, pos=0, base=0, final=True):
+        """Validate ``text`` from ``pos`` on, ``text`` starting at offset ``base`` of the document.
+
+        Same checks as feeding the tokens of ``text``, in one loop over the TOKEN_RE matches that builds no
+        Token: only the built-in rules are checked, see ``scans``. Line numbers are not counted on the way, the
+        errors, ids and open elements found are given an offset and no line until resolve_lines. Unless
+        ``final``, stops where tokenizer.scan would and returns the offset in ``text`` to resume from, with
+        ``raw_text`` set to the raw text element it stopped in.
+        """
+        errors = self.errors
+        append = errors.append
+        rules = self.rules
+        report_balance = "balance" in rules
+        check_doctype = "doctype" in rules
+        check_comments = "comments" in rules
+        essential_ids = self.essential_ids if "essential-tags" in rules else {}
+        raw_text_names = self.raw_text_names
+        raw = self.raw_text
+        report_unknown_tags = self.report_unknown_tags
+        check_text = self.report_disallowed_children
+        check_attributes = self.check_attribute_names or self.check_attribute_values or self.collect_ids
+        tag_ids = self.schema.tag_ids
+        void = self.schema.void
+        content_model = self.content_model
+        transitions = content_model.transitions
+        stride = content_model.stride
+        text_allowed = content_model.text_allowed
+        entries = self.tags_stack.entries
+        counts = self.tags_stack.counts
+        # Tag ID of the innermost open element, the root of the content model when none is
+        root = content_model.root
+        top = entries[-1][2] if entries else root
+
+        stop = scan_end(text, final)
+        last_lt = text.rfind("<", 0, stop)
+        regex = TOKEN_RE
+        while True:
+            if raw is not None:
+                # The content of <script>, <style>... is text, see tokenizer.scan
+                content = raw_text_end(text, pos, raw, final)
+                if content is None:
+                    self.raw_text = raw
+                    return pos
+                end, ended = content
+                if end > pos and check_text and not text_allowed[top]:
+                    self.disallowed_text(base + pos, base + end, None, None, text, base)
+                pos = end
+                if not ended:
+                    self.raw_text = raw
+                    return pos
+                raw = None
+
+            for match in regex.finditer(text, pos, stop):
+                group = match.lastindex
+                if group == 1:
+                    if check_text and not text_allowed[top]:
+                        start, end = match.span()
+                        self.disallowed_text(base + start, base + end, None, None, text, base)
+                    continue
+
+                start = match.start()
+                if group == 4:
+                    name_start, name_end = match.span(6)
+                    name = text[name_start:name_end]
+                    tag_id = tag_ids.get(name)
+                    if tag_id is None:
+                        tag_id = tag_ids.get(name.lower())
+                        if tag_id is None:
+                            if report_unknown_tags:
+                                append(ValidationError(results.UNKNOWN_TAG, None, None, None, (name,),
+                                                       base + start))
+                            continue
+                    closing = name_start - start == 2
+                    if tag_id in essential_ids:
+                        self.essential_tag(essential_ids[tag_id], closing)
+                    if check_attributes and text[name_end] != ">":
+                        self.check_attributes(text, name_end, match.end(), tag_id, None, None, base + start)
+                    if closing:
+                        if top == tag_id:
+                            entries.pop()
+                            counts[tag_id] -= 1
+                        else:
+                            self.close_element(tag_id, None, None, base + start, name)
+                        top = entries[-1][2] if entries else root
+                    elif transitions[top * stride + tag_id]:
+                        self.open_element(tag_id, None, None, base + start, name)
+                        top = entries[-1][2] if entries else root
+                    elif not void[tag_id]:
+                        entries.append((None, None, tag_id, base + start))
+                        counts[tag_id] += 1
+                        top = tag_id
+                    if not closing and tag_id in raw_text_names:
+                        raw = raw_text_names[tag_id]
+                        pos = match.end()
+                        break
+                    continue
+                if group == 2:
+                    continue
+
+                if not final and group != 10 and holds_back(text, start, group, last_lt):
+                    self.raw_text = None
+                    return start
+                end = match.end()
+                if group == 8:
+                    if check_text and not text_allowed[top]:
+                        self.disallowed_text(base + start, base + end, None, None, text, base)
+                elif group == 3:
+                    doctype = DOCTYPE_RE.match(text, start, end)
+                    if doctype:
+                        if check_doctype and doctype.group(1) and doctype.group(1).lower() == "html":
+                            self.doctype_found = True
+                    elif check_comments and not CONDITIONAL_RE.match(text, start, end):
+                        append(ValidationError(results.MALFORMED_COMMENT, None, None, None, (text[start:end],),
+                                               base + start))
+                elif report_balance:
+                    code = results.MISSING_GT if group == 9 else results.UNEXPECTED_GT
+                    append(ValidationError(code, None, None, offset=base + start))
+
+                # An unterminated "<!--", see tokenizer.scan
+                if (group == 3 or group == 9) and regex is TOKEN_RE and text.startswith("<!--", start):
+                    regex = UNTERMINATED_RE
+                    pos = end
+                    break
             else:
-                empiler(errors, f"Line {line_number}: Malformed comment {full_comment}")
+                self.raw_text = None
+                return stop
 
-        for is_closing, tag_name, attributes_str in html_tags:
-            tag_name_lower = tag_name.lower()
-            tag_info = tag_details(tag_name_lower)
+    def resolve_lines(self, text, base=0, line=1, line_start=0):
+        """Give a line and a column to what scan left without one, from the text it went over.
 
-            if not tag_info:
-                empiler(errors, f"Line {line_number}: Unknown or unsupported tag <{tag_name}>.")
-                continue
+        ``text`` starts at offset ``base`` of the document, on line ``line`` whose start is at ``line_start`` in
+        ``text``. Lines are indexed up to the last offset that needs one, see prescan.LineIndex.
+        """
+        errors = self.errors
+        ids = self.ids
+        entries = self.tags_stack.entries
+        # Open elements without a line were pushed by the last scan, so they are all at the top of the stack
+        first_entry = len(entries)
+        while first_entry and entries[first_entry - 1][0] is None:
+            first_entry -= 1
+        new_errors = [error for error in errors[self.resolved_errors:] if error.line is None and error.offset
+                      is not None]
+        offsets = {error.offset for error in new_errors}
+        offsets.update(entry[3] for entry in ids[self.resolved_ids:])
+        offsets.update(entry[3] for entry in entries[first_entry:])
+        run = self.text_run
+        if run is not None and run[0] is None:
+            offsets.add(run[2])
+
+        positions = {}
+        if offsets:
+            lines = LineIndex(text, end=max(offsets) - base)
+            starts = lines.starts
+            for offset in offsets:
+                at = offset - base
+                index = lines.line(at)
+                positions[offset] = (line + index - 1, at - (starts[index - 1] if index > 1 else line_start) + 1)
+
+        for error in new_errors:
+            error.line, error.column = positions[error.offset]
+        for index in range(self.resolved_ids, len(ids)):
+            value, _, _, offset = ids[index]
+            ids[index] = (value,) + positions[offset] + (offset,)
+        for index in range(first_entry, len(entries)):
+            _, _, tag_id, offset = entries[index]
+            entries[index] = positions[offset] + (tag_id, offset)
+        if run is not None and run[0] is None:
+            self.text_run = positions[run[2]] + (run[2],)
+        self.resolved_errors = len(errors)
+        self.resolved_ids = len(ids)
 
-            handle_essential_tag(tag_name_lower, is_closing == '/', line_number)
-            validate_attributes(tag_name_lower, attributes_str, line_number)
-
-            if is_closing == '/':
-                if tags_stack and tags_stack[-1][1] == tag_name_lower:
-                    depiler(tags_stack)
-                else:
-                    if any(t[1] == tag_name_lower for t in tags_stack):
-                        empiler(errors, (
-                            f"Line {line_number}: Unexpected closing tag </{tag_name}>. "
-                            f"Other tags were expected to close first."))
-                        while tags_stack and tags_stack[-1][1] != tag_name_lower:
-                            line_num, unclosed_tag = tags_stack.pop()
-                            empiler(errors, f"Line {line_num}: Missing closing </{unclosed_tag}>.")
-                        depiler(tags_stack)
-                    else:
-                        expected_tag = tags_stack[-1][1] if tags_stack else 'None'
-                        empiler(errors,
-                                f"Line {line_number}: Unexpected closing tag </{tag_name}>. Expected </{expected_tag}>.")
+    def essential_errors(self):
+        # Check for missing essential tags in the correct order
+        essential_errors = []
+        found = self.essential_tags_found
+        closed = self.essential_tags_closed
+        tag_ids = self.schema.tag_ids
+        if not self.doctype_found and "doctype" in self.rules:
+            empiler(essential_errors, ValidationError(results.MISSING_DOCTYPE))
+        if "essential-tags" not in self.rules:
+            return essential_errors
+        if not found["html"]:
+            empiler(essential_errors, ValidationError(results.MISSING_TAG, tag=tag_ids.get("html"), args=("html",)))
+        elif not closed["html"]:
+            empiler(essential_errors, ValidationError(results.MISSING_END_TAG, tag=tag_ids.get("html"),
+                                                      args=("html",)))
+        if found["html"]:
+            for tag in ("head", "body"):
+                if not found[tag]:
+                    empiler(essential_errors, ValidationError(results.MISSING_TAG, tag=tag_ids.get(tag), args=(tag,)))
+                elif not closed[tag]:
+                    empiler(essential_errors, ValidationError(results.MISSING_END_TAG, tag=tag_ids.get(tag),
+                                                              args=(tag,)))
+        return essential_errors
+
+    def unclosed_errors(self):
+        # Elements whose end tag may be omitted are closed by the end of the document
+        if not self.report_nesting:
+            return []
+        tag_names = self.schema.tag_names
+        optional_end = self.content_model.optional_end
+        return [ValidationError(results.MISSING_CLOSING_TAG, line_number, column, tag_id, (tag_names[tag_id],),
+                                offset)
+                for line_number, column, tag_id, offset in self.tags_stack if not optional_end[tag_id]]
+
+    def duplicate_id_errors(self, ids=None):
+        # Ids are only known to be duplicates once the whole document is read
+        first_lines = {}
+        duplicates = []
+        for value, line_number, column, offset in self.ids if ids is None else ids:
+            first_line = first_lines.get(value)
+            if first_line is None:
+                first_lines[value] = line_number
             else:
-                if not tag_info["void"]:
-                    empiler(tags_stack, (line_number, tag_name_lower))
+                empiler(duplicates, ValidationError(results.DUPLICATE_ID, line_number, column, None,
+                                                    (value, first_line), offset))
+        return duplicates
+
+    def result(self, errors=None, ids=None):
+        # Essential tags come first, then errors in document order, duplicate ids, unclosed tags and the
+        # end of document errors of rules registered outside this module last
+        body = self.errors if errors is None else errors
+        finished = [error for rule in self.rules if rule.finish is not None for error in rule.finish(self)]
+        return ValidationResult(self.essential_errors() + body + self.duplicate_id_errors(ids) +
+                                self.unclosed_errors() + finished)
+
+
+# Phase charged with the time spent feeding each kind of token
+TOKEN_PHASES = {TEXT: TAGS, STRAY_GT: BALANCE, UNCLOSED_LT: BALANCE, DOCTYPE: DECLARATIONS, COMMENT: COMMENTS,
+                MALFORMED_COMMENT: COMMENTS, START_TAG: TAGS, END_TAG: TAGS}
+
+
+class ProfilingValidator(HTMLValidator):
+    # HTMLValidator that records a Profile, kept apart so that unprofiled runs pay nothing for it
+    def __init__(self, profile=None, rules=None):
+        super().__init__(rules)
+        self.profile = Profile() if profile is None else profile
+
+    def validate_attributes(self, token, tag_id):
+        start = perf_counter()
+        super().validate_attributes(token, tag_id)
+        self.attribute_time += perf_counter() - start
+
+    def feed(self, token):
+        profile = self.profile
+        kind = token.kind
+        self.attribute_time = 0.0
+        start = perf_counter()
+        super().feed(token)
+        elapsed = perf_counter() - start
+        phase = TOKEN_PHASES.get(kind)
+        if phase is not None:
+            profile.times[phase] += elapsed - self.attribute_time
+            profile.times[ATTRIBUTES] += self.attribute_time
+        profile.tokens[kind] += 1
+        if len(self.tags_stack) > profile.max_stack_depth:
+            profile.max_stack_depth = len(self.tags_stack)
+
+    def result(self, errors=None, ids=None):
+        start = perf_counter()
+        result = super().result(errors, ids)
+        profile = self.profile
+        profile.times[FINALIZE] += perf_counter() - start
+        profile.errors.update(error.code for error in result)
+        profile.documents += 1
+        result.profile = profile
+        return result
+
+
+def validate_tokens(tokens, profile=False, rules=None) -> ValidationResult:
+    # ``profile`` is True, or a Profile to add this run to, to attach a Profile to the result.
+    # ``rules`` is the rules.RuleSet to check, every registered rule by default.
+    if not profile:
+        validator = HTMLValidator(rules)
+        for token in tokens:
+            validator.feed(token)
+        return validator.result()
+
+    validator = ProfilingValidator(None if profile is True else profile, rules)
+    for token in validator.profile.timed_tokens(tokens):
+        validator.feed(token)
+    return validator.result()
+
+
+def validate_html(html: str, profile=False, rules=None) -> ValidationResult:
+    validator = None if profile else HTMLValidator(rules)
+    if validator is None or not validator.scans:
+        return validate_tokens(tokenize(html), profile, rules)
+    validator.scan(html)
+    validator.resolve_lines(html)
+    return validator.result()
+
+
+def validate_stream(stream, chunk_size=CHUNK_SIZE, profile=False, rules=None) -> ValidationResult:
+    # ``stream`` is a binary file-like object, read and decoded one chunk at a time
+    validator = None if profile else HTMLValidator(rules)
+    if validator is None or not validator.scans:
+        return validate_tokens(tokenize_stream(stream, chunk_size), profile, rules)
+    reader = ChunkReader(stream, chunk_size)
+    while reader.read():
+        pos = validator.scan(reader.text, 0, reader.base, reader.final)
+        validator.resolve_lines(reader.text, reader.base, reader.line, reader.line_start)
+        reader.consume(pos, validator.raw_text)
+    return validator.result()
 
-    # Final checks for essential tags
-    validate_essential_tags()
 
-    if essential_errors:
-        for error in essential_errors[::-1]:
-            errors.insert(0, error)
+@contextmanager
+def mapped_file(path):
+    # The file at ``path`` memory-mapped, so it is never loaded in memory as a whole, or the open file itself when
+    # it is empty: empty files cannot be mapped
+    with open(path, "rb") as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield file
+            return
+        with mapped:
+            yield mapped
 
-    if tags_stack:
-        for line_number, tag_name in tags_stack:
-            empiler(errors, f"Line {line_number}: Missing closing </{tag_name}>.")
 
-    return errors if errors else "HTML validation passed."
+def validate_path(path, chunk_size=CHUNK_SIZE, profile=False, rules=None) -> ValidationResult:
+    with mapped_file(path) as source:
+        return validate_stream(source, chunk_size, profile, rules)
 
 # Example
 # validate_html("test_index.html")
@@ -0,0 +1,78 @@
+"""Bulk scan of a text for its angle brackets and line starts.
+
+Offsets are found with precompiled regexes, so the search runs in C and the text is never walked, split or
+copied in Python. Lines and columns of offsets are then found by binary search over the line starts.
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+# Nesting depth change of each bracket
+STEPS = {"<": 1, ">": -1}
+
+BRACKET_RE = re.compile("[<>]")
+# Line breaks as the validator counts them, only "\n", and as LSP does, "\r\n" and a lone "\r" too
+NEWLINE_RE = re.compile("\n")
+LSP_LINE_BREAK_RE = re.compile("\r\n?|\n")
+
+
+def line_ends(text, breaks=NEWLINE_RE, base=0, end=None):
+    # Offsets, shifted by ``base``, of the characters following each line break of ``text`` before ``end``
+    return [match.end() + base for match in breaks.finditer(text, 0, len(text) if end is None else end)]
+
+
+class LineIndex:
+    """The offsets the lines of a text start at, the first one being 0, in ``starts``.
+
+    ``breaks`` matches the line breaks. Only the lines starting up to ``end`` are indexed when it is given.
+    """
+
+    def __init__(self, text, breaks=NEWLINE_RE, end=None):
+        self.breaks = breaks
+        self.starts = [0] + line_ends(text, breaks, end=end)
+
+    def line(self, offset):
+        # 1-based line of ``offset``
+        return bisect_right(self.starts, offset)
+
+    def position(self, offset):
+        # 1-based line and column of ``offset``, as in tokens
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def replace(self, text, start, end, added):
+        """Update the index after ``text[start:start + added]`` replaced ``end - start`` characters at ``start``.
+
+        Line starts before ``start`` stay, and those after the first one past ``end`` move. The lines in between
+        are found in ``text`` again: a break may be ended by the character that follows it ("\r" then "\n").
+        """
+        starts = self.starts
+        first = max(bisect_right(starts, start - 1) - 1, 0)
+        last = bisect_right(starts, end + 1)
+        delta = added - (end - start)
+        moved = [offset + delta for offset in starts[last:]]
+        region_end = moved[0] - 1 if moved else len(text)
+        found = [match.end() + starts[first] for match in self.breaks.finditer(text[starts[first]:region_end + 1])]
+        if moved:
+            found = [offset for offset in found if offset < moved[0]]
+        starts[first + 1:] = found + moved
+
+
+class TextIndex(LineIndex):
+    """The angle brackets and line starts of a text.
+
+    ``brackets`` holds the offsets of every "<" and ">" in order, found in one pass over the text, and the line
+    starts in another.
+    """
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.text = text
+        self.brackets = [match.start() for match in BRACKET_RE.finditer(text)]
+
+    def balanced(self):
+        # Whether every ">" closes an earlier "<" and every "<" is closed, brackets nesting
+        if not self.brackets:
+            return True
+        depths = list(accumulate(map(STEPS.__getitem__, map(self.text.__getitem__, self.brackets))))
+        return min(depths) >= 0 and depths[-1] == 0
@@ -0,0 +1,85 @@
+from collections import Counter
+from time import perf_counter
+
+# Phases of a validation run, in reporting order
+TOKENIZE = "tokenize"
+BALANCE = "balance"  # stray ">" and unclosed "<"
+DECLARATIONS = "declarations"  # doctype
+COMMENTS = "comments"
+TAGS = "tags"  # tag lookup and the open element stack
+ATTRIBUTES = "attributes"
+FINALIZE = "finalize"  # essential tags and unclosed elements at the end of the document
+
+PHASES = (TOKENIZE, BALANCE, DECLARATIONS, COMMENTS, TAGS, ATTRIBUTES, FINALIZE)
+
+
+class Profile:
+    """Counters collected by a profiled validation run.
+
+    ``times`` holds the wall time spent in each of PHASES, ``tokens`` the number of tokens of each kind and
+    ``errors`` the number of errors of each code. Profiles of several runs can be added together with merge.
+    """
+
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.tokens = Counter()
+        self.errors = Counter()
+        self.max_stack_depth = 0
+        self.documents = 0
+
+    @property
+    def total_time(self):
+        return sum(self.times.values())
+
+    def merge(self, other):
+        for phase, seconds in other.times.items():
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+        self.tokens.update(other.tokens)
+        self.errors.update(other.errors)
+        self.max_stack_depth = max(self.max_stack_depth, other.max_stack_depth)
+        self.documents += other.documents
+        return self
+
+    def timed_tokens(self, tokens):
+        # Wrap a token iterator, charging the time spent producing each token to the tokenize phase
+        times = self.times
+        tokens = iter(tokens)
+        while True:
+            start = perf_counter()
+            token = next(tokens, None)
+            times[TOKENIZE] += perf_counter() - start
+            if token is None:
+                return
+            yield token
+
+    def to_dict(self):
+        return {
+            "documents": self.documents,
+            "times": dict(self.times),
+            "total_time": self.total_time,
+            "tokens": dict(self.tokens),
+            "max_stack_depth": self.max_stack_depth,
+            "errors": dict(self.errors),
+        }
+
+    def render(self):
+        total = self.total_time
+        lines = [f"{self.documents} document(s), {sum(self.tokens.values())} tokens, "
+                 f"maximum stack depth {self.max_stack_depth}, {sum(self.errors.values())} error(s)"]
+        for phase in PHASES:
+            seconds = self.times[phase]
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"  {phase:<14}{seconds * 1000:10.2f} ms {share:6.1f}%")
+        lines.append(f"  {'total':<14}{total * 1000:10.2f} ms")
+        if self.tokens:
+            lines.append("  tokens: " + ", ".join(f"{kind} {count}" for kind, count in self.tokens.most_common()))
+        if self.errors:
+            lines.append("  errors: " + ", ".join(f"{code} {count}" for code, count in self.errors.most_common()))
+        return "\n".join(lines)
+
+    def summary(self):
+        # One line version of render, for status bars
+        return (f"{self.total_time * 1000:.1f} ms (tokenize {self.times[TOKENIZE] * 1000:.1f}, "
+                f"tags {self.times[TAGS] * 1000:.1f}, attributes {self.times[ATTRIBUTES] * 1000:.1f} ms), "
+                f"{sum(self.tokens.values())} tokens, depth {self.max_stack_depth}, "
+                f"{sum(self.errors.values())} error(s)")
@@ -1,5 +1,7 @@
 import re
 
+from prescan import TextIndex
+
 
 def validate_html(file_path):
     with open(file_path, "r") as html:
@@ -17,15 +19,8 @@ def validate_html(file_path):
 #  VP Function
 
 def vp(s):
-    bn = 0
-    for i in s:
-        if i == "<":
-            bn += 1
-        elif i == ">":
-            bn -= 1
-        if bn < 0:
-            return False
-    return bn == 0
+    # The brackets are found in bulk, then only they are counted
+    return TextIndex(s).balanced()
 
 
 # with open("index.html", "r") as index:
@@ -0,0 +1,319 @@
+import argparse
+import io
+import re
+import sys
+from collections import Counter
+
+import results
+from contentmodel import METADATA
+from main import HTMLValidator, NON_SPACE_RE
+from rules import RuleSet
+from tokenizer import (tokenize, tokenize_stream, CHUNK_SIZE, TEXT, START_TAG, END_TAG, COMMENT, DOCTYPE,
+                       MALFORMED_COMMENT, UNCLOSED_LT)
+
+# What follows a "<" that no ">" closes, when it reads as a tag cut before its ">": a name, then attributes on
+# the same line
+UNCLOSED_TAG_RE = re.compile(r'''/?\w+(?:[ \t]+[^\s"'<>/=]+(?:[ \t]*=[ \t]*(?:"[^"<]*"|'[^'<]*'|[^\s"'=<>`]+))?)*''')
+
+# Where the repairer is in the html/head/body skeleton
+BEFORE_HTML = 0
+BEFORE_HEAD = 1
+IN_HEAD = 2
+AFTER_HEAD = 3
+IN_BODY = 4
+
+# Elements whose missing end tag is reported as MISSING_END_TAG rather than MISSING_CLOSING_TAG
+SKELETON_TAGS = ("html", "head", "body")
+
+
+class Repairer(HTMLValidator):
+    """Writes a corrected copy of a document while its tokens go through the validator's element stack.
+
+    Unchanged runs of the source are passed to ``write`` in a single call, with the fixes written between
+    them, so a document is repaired in one pass and in constant memory:
+
+    - closing tags are inserted for the elements that a closing tag of one of their ancestors ends;
+    - closing tags that match no open element are dropped;
+    - a "<" that no ">" closes gets its ">" when a tag follows it and is escaped otherwise, like a ">" outside
+      of markup;
+    - malformed comments are rewritten as comments, and a comment that no "-->" ends is ended before the next
+      markup;
+    - a missing DOCTYPE, <html>, <head> or <body> is inserted where it should start, and the elements still
+      open at the end of the document are closed.
+
+    Unknown tags are copied as they are, and so is the content of raw text elements such as <script> and
+    <style>. ``fixes`` counts the fixes by the code of the error they correct.
+    """
+
+    def __init__(self, write):
+        # No rule is checked: only the element stack is needed
+        super().__init__(RuleSet(()))
+        self.write = write
+        self.fixes = Counter()
+        self.phase = BEFORE_HTML
+        self.doctype_written = False
+        self.unclosed_lt = None  # UNCLOSED_LT token waiting for the text that follows it
+        self.after_lt = []  # Text read after it
+        self.in_comment = False  # Inside a comment that no "-->" ends
+        # Source copied but not written yet: source[start:end]
+        self.source = None
+        self.start = self.end = 0
+
+    def copy(self, token):
+        start = token.start - token.base
+        if token.source is self.source and start == self.end:
+            self.end = token.end - token.base
+            return
+        self.flush()
+        self.source = token.source
+        self.start = start
+        self.end = token.end - token.base
+
+    def flush(self):
+        if self.start != self.end:
+            self.write(self.source[self.start:self.end])
+        self.source = None
+        self.start = self.end = 0
+
+    def insert(self, text, code):
+        self.flush()
+        self.write(text)
+        self.fixes[code] += 1
+
+    def close(self, name):
+        # Write the missing closing tag of an element the stack pops
+        self.insert(f"</{name}>", results.MISSING_END_TAG if name in SKELETON_TAGS else results.MISSING_CLOSING_TAG)
+
+    def feed(self, token):
+        kind = token.kind
+        if self.unclosed_lt is not None:
+            if kind == TEXT:
+                self.read_after_lt(token)
+                return
+            self.close_lt()
+        if self.in_comment:
+            if kind == TEXT:
+                self.copy(token)
+                return
+            self.in_comment = False
+            self.insert("-->", results.MALFORMED_COMMENT)
+
+        if kind == START_TAG or kind == END_TAG:
+            self.repair_tag(token)
+        elif kind == TEXT:
+            entries = self.tags_stack.entries
+            if entries and entries[-1][2] in self.raw_text_names:
+                # The content of <script>, <style>, <textarea> and <title> is never changed
+                self.copy(token)
+                return
+            if self.phase != IN_BODY:
+                # Whitespace can go anywhere, text is content of the body
+                source = token.source
+                first = NON_SPACE_RE.search(source, token.start - token.base, token.end - token.base)
+                if first is None:
+                    self.copy(token)
+                    return
+                if first.start() > token.start - token.base:
+                    self.copy(token._replace(end=token.base + first.start()))
+                    token = token._replace(start=token.base + first.start())
+                self.open_skeleton(token, None)
+            self.copy(token)
+        elif kind == COMMENT:
+            self.copy(token)
+        elif kind == MALFORMED_COMMENT:
+            # Rewritten as a comment: a "<!--" ended by ">" would take in everything up to the next "-->" once
+            # a fix writes one, and "<!" markup that is neither a DOCTYPE nor a comment is not valid
+            text = token.text
+            self.insert("<!--" + text[4 if text.startswith("<!--") else 2:-1] + "-->", results.MALFORMED_COMMENT)
+        elif kind == DOCTYPE:
+            # Only a DOCTYPE before anything else is kept
+            if not self.doctype_written and self.phase == BEFORE_HTML:
+                self.doctype_written = True
+                self.copy(token)
+        elif kind == UNCLOSED_LT:
+            self.unclosed_lt = token
+        else:
+            if self.phase != IN_BODY:
+                self.open_skeleton(token, None)
+            self.insert("&gt;", results.UNEXPECTED_GT)
+
+    def repair_tag(self, token, markup=None, code=None, skeleton=True):
+        # ``markup`` is the text of a tag written by the repairer, counted as a fix of ``code``.
+        # ``skeleton`` is False for the tags of the skeleton itself.
+        tag_id = self.schema.tag_id(token.source[token.name_start:token.name_end])
+        if skeleton and self.phase != IN_BODY:
+            self.open_skeleton(token, None if tag_id is None else self.schema.tag_names[tag_id])
+        if tag_id is None:
+            # Unknown tags are not on the stack, so nothing tells whether they are right
+            self.copy(token)
+            return
+
+        if token.kind == END_TAG:
+            tags_stack = self.tags_stack
+            if not tags_stack.is_open(tag_id):
+                self.fixes[results.UNEXPECTED_CLOSING_TAG] += 1
+                return
+            # Feeding the closing tag pops the elements above the one it closes: those whose end tag cannot be
+            # omitted get theirs first
+            entries = tags_stack.entries
+            optional_end = self.content_model.optional_end
+            tag_names = self.schema.tag_names
+            index = len(entries) - 1
+            while entries[index][2] != tag_id:
+                if not optional_end[entries[index][2]]:
+                    self.close(tag_names[entries[index][2]])
+                index -= 1
+
+        if markup is None:
+            self.copy(token)
+        else:
+            self.insert(markup, code)
+        super().feed(token)
+
+    def insert_tag(self, markup, at, code, skeleton=False):
+        # Write a tag missing from the source and feed it as if it were there, at the position of token ``at``
+        tag = next(tokenize(markup))
+        if at is not None:
+            tag = tag._replace(line=at.line, column=at.column)
+        self.repair_tag(tag, markup, code, skeleton)
+
+    def open_skeleton(self, token, tag):
+        # Write what is missing of the skeleton before ``token``, of tag name ``tag`` (None for anything else).
+        # ``token`` is None at the end of the document.
+        kind = token.kind if token is not None else None
+        if self.phase == BEFORE_HTML:
+            self.phase = BEFORE_HEAD
+            if not self.doctype_written:
+                self.doctype_written = True
+                self.insert("<!DOCTYPE html>\n", results.MISSING_DOCTYPE)
+            if tag == "html" and kind == START_TAG:
+                return
+            self.insert_tag("<html>", token, results.MISSING_TAG)
+        if self.phase == BEFORE_HEAD:
+            self.phase = IN_HEAD
+            if tag == "head" and kind == START_TAG:
+                return
+            self.insert_tag("<head>", token, results.MISSING_TAG)
+        if self.phase == IN_HEAD:
+            # The head ends with content other than metadata, or the end tag of one of its ancestors. Closing
+            # tags of elements inside it and text inside <title>, <style>... keep it open.
+            if kind == START_TAG and tag in METADATA or kind == END_TAG and tag not in SKELETON_TAGS:
+                return
+            entries = self.tags_stack.entries
+            if tag is None and kind is not None and entries and self.schema.tag_names[entries[-1][2]] in METADATA:
+                return
+            self.phase = AFTER_HEAD
+            if tag == "head" and kind == END_TAG:
+                return
+            if self.tags_stack.is_open(self.schema.tag_ids["head"]):
+                self.insert_tag("</head>", token, results.MISSING_END_TAG)
+        if self.phase == AFTER_HEAD:
+            self.phase = IN_BODY
+            if tag == "body" and kind == START_TAG:
+                return
+            self.insert_tag("<body>", token, results.MISSING_TAG)
+
+    def read_after_lt(self, text):
+        # Take in the TEXT token ``text`` that follows a "<" no ">" closes
+        if not self.after_lt and text.source.startswith("!--", text.start - text.base, text.end - text.base):
+            # An unterminated comment is closed before the next markup
+            self.unclosed_lt = None
+            self.in_comment = True
+            self.flush()
+            self.write("<")
+            self.copy(text)
+            return
+        self.after_lt.append(text.text)
+        # A tag cut before its ">" ends with its line, so at most a line is kept
+        if "\n" in self.after_lt[-1]:
+            self.close_lt()
+
+    def close_lt(self):
+        # Decide what the "<" no ">" closes starts, from the text that followed it on its line
+        lt = self.unclosed_lt
+        text = "".join(self.after_lt)
+        self.unclosed_lt = None
+        self.after_lt = []
+        match = UNCLOSED_TAG_RE.match(text)
+        if match:
+            markup = "<" + match.group() + ">"
+            tag = next(tokenize(markup))
+            if self.schema.tag_id(tag.name) is None:
+                match = None
+            else:
+                self.repair_tag(tag._replace(line=lt.line, column=lt.column), markup, results.MISSING_GT)
+                text = text[match.end():]
+        if not match:
+            if self.phase != IN_BODY:
+                self.open_skeleton(lt, None)
+            self.insert("&lt;", results.MISSING_GT)
+        for token in tokenize(text):
+            self.feed(token)
+
+    def finish(self):
+        # Complete the skeleton, close the elements still open and write what is left. Returns the fixes.
+        if self.unclosed_lt is not None:
+            self.close_lt()
+        if self.in_comment:
+            self.insert("-->", results.MALFORMED_COMMENT)
+        if self.phase != IN_BODY:
+            self.open_skeleton(None, None)
+        tag_names = self.schema.tag_names
+        optional_end = self.content_model.optional_end
+        for _, _, tag_id, _ in reversed(self.tags_stack.entries):
+            if not optional_end[tag_id]:
+                self.close(tag_names[tag_id])
+        self.tags_stack.truncate(0)
+        self.flush()
+        return self.fixes
+
+
+def repair_tokens(tokens, write):
+    # Returns the Counter of fixes by error code
+    repairer = Repairer(write)
+    for token in tokens:
+        repairer.feed(token)
+    return repairer.finish()
+
+
+def repair_html(html):
+    # Returns the repaired document and the Counter of fixes
+    output = io.StringIO()
+    fixes = repair_tokens(tokenize(html), output.write)
+    return output.getvalue(), fixes
+
+
+def repair_stream(stream, output, chunk_size=CHUNK_SIZE):
+    # ``stream`` is a binary file-like object read one chunk at a time, ``output`` a text file-like object
+    return repair_tokens(tokenize_stream(stream, chunk_size), output.write)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="validator fix", description="Write a repaired copy of an HTML file.")
+    parser.add_argument("path", help="HTML file to repair")
+    parser.add_argument("-o", "--output", help="file to write (default: standard output)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the fixes made")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.path, "rb") as stream:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8", newline="") as output:
+                    fixes = repair_stream(stream, output)
+            else:
+                output = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=False)
+                fixes = repair_stream(stream, output)
+                output.flush()
+                output.detach()
+    except OSError as e:
+        print(f"{e.filename}: {e.strerror}.", file=sys.stderr)
+        return 2
+
+    if not args.quiet:
+        summary = ", ".join(f"{count} {code}" for code, count in sorted(fixes.items()) if count)
+        print(f"{sum(fixes.values())} fix(es){': ' + summary if summary else ''}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""Report writers for batch runs, in plain text, JSON Lines, SARIF and JUnit XML.
+
+Writers take the errors of each file as ``(code, line, column, message)`` rows, see error_rows, and write them
+as soon as they are added, so that a report never holds more than one file. The totals of the run are kept in
+a Summary updated on the way, and written at the end of the report.
+"""
+import heapq
+import json
+import os
+import re
+from collections import Counter
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+import results
+from rules import RULES
+
+# Files listed in the summary, by decreasing number of errors
+TOP_FILES = 10
+
+# Descriptions of the codes that no rule reports
+DESCRIPTIONS = {results.UNREADABLE_FILE: "the file can be read"}
+
+# Characters that XML 1.0 does not allow, even escaped
+XML_INVALID_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def error_rows(errors):
+    # Compact form of ValidationError objects: cheap to send from the worker processes and to write
+    return [(error.code, error.line, error.column, error.message) for error in errors]
+
+
+def row_text(row):
+    # Same text as str(ValidationError)
+    return row[3] if row[1] is None else f"Line {row[1]}: {row[3]}"
+
+
+class Summary:
+    """Totals of a run, updated as each file is added.
+
+    ``by_code`` counts the errors by code. Only the ``top`` files with the most errors are kept, in a heap of
+    ``(errors, -order, path)``, so the summary of a run takes the same memory whatever the number of files.
+    """
+
+    def __init__(self, top=TOP_FILES):
+        self.files = 0
+        self.failed = 0
+        self.errors = 0
+        self.by_code = Counter()
+        self.top = top
+        self.worst = []
+
+    def add(self, path, rows):
+        self.files += 1
+        if not rows:
+            return
+        self.failed += 1
+        self.errors += len(rows)
+        by_code = self.by_code
+        for row in rows:
+            by_code[row[0]] += 1
+        # Among files with as many errors, the first ones added are kept
+        entry = (len(rows), -self.files, path)
+        if len(self.worst) < self.top:
+            heapq.heappush(self.worst, entry)
+        elif entry > self.worst[0]:
+            heapq.heapreplace(self.worst, entry)
+
+    def worst_files(self):
+        # [(path, errors)] of the files with the most errors, most first
+        return [(path, count) for count, _, path in sorted(self.worst, reverse=True)]
+
+    def to_dict(self):
+        return {"files": self.files, "failed": self.failed, "errors": self.errors,
+                "by_code": dict(self.by_code.most_common()),
+                "worst_files": [{"path": path, "errors": count} for path, count in self.worst_files()]}
+
+    def render(self):
+        lines = [f"{self.files} file(s) checked, {self.failed} with errors."]
+        if self.errors:
+            lines.append(f"{self.errors} error(s): " + ", ".join(
+                f"{count} {code}" for code, count in self.by_code.most_common()) + ".")
+        return "\n".join(lines)
+
+
+class Report:
+    """Base of the writers: ``start`` once, ``add`` each file, then ``finish`` once.
+
+    ``output`` is a text file-like object. Subclasses write a file in write_file, the header and the footer
+    of the report in start and finish.
+    """
+
+    def __init__(self, output, top=TOP_FILES):
+        self.output = output
+        self.summary = Summary(top)
+
+    def start(self):
+        pass
+
+    def add(self, path, rows):
+        self.summary.add(path, rows)
+        self.write_file(path, rows)
+
+    def write_file(self, path, rows):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class TextReport(Report):
+    # "path: Line N: message" for every error, files without errors are not listed. A report without errors
+    # says that validation passed.
+    def write_file(self, path, rows):
+        if rows:
+            self.output.write("".join(f"{path}: {row_text(row)}\n" for row in rows))
+
+    def finish(self):
+        if self.summary.files and not self.summary.failed:
+            self.output.write(results.PASSED_MESSAGE + "\n")
+
+
+class JsonLinesReport(Report):
+    """One JSON object per line: a "file" record for every file, then a "summary" record."""
+
+    def __init__(self, output, top=TOP_FILES):
+        super().__init__(output, top)
+        self.encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+    def write_file(self, path, rows):
+        errors = [{"code": code, "message": message, "line": line, "column": column}
+                  for code, line, column, message in rows]
+        self.output.write(self.encode({"type": "file", "path": path, "passed": not rows, "errors": errors}) + "\n")
+
+    def finish(self):
+        self.output.write(self.encode(dict(type="summary", **self.summary.to_dict())) + "\n")
+
+
+class SarifReport(Report):
+    """A SARIF 2.1.0 log with a single run, written result by result.
+
+    The results come first in the run object, the tool and its rules after them: a rule is described once its
+    code was seen, and ``ruleIndex`` refers to the order in which codes were first seen.
+    """
+
+    VERSION = "2.1.0"
+    SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+    def __init__(self, output, top=TOP_FILES):
+        super().__init__(output, top)
+        self.encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+        self.rule_index = {}  # Code -> index in the rules of the driver
+        self.separator = ""
+
+    def start(self):
+        self.output.write(f'{{"version":"{self.VERSION}","$schema":"{self.SCHEMA}","runs":[{{"results":[\n')
+
+    def write_file(self, path, rows):
+        if not rows:
+            return
+        uri = quote(path.replace(os.sep, "/"))
+        rule_index = self.rule_index
+        parts = []
+        for code, line, column, message in rows:
+            index = rule_index.setdefault(code, len(rule_index))
+            location = {"artifactLocation": {"uri": uri}}
+            if line is not None:
+                location["region"] = {"startLine": line, "startColumn": column}
+            parts.append({"ruleId": code, "ruleIndex": index, "level": "error", "message": {"text": message},
+                          "locations": [{"physicalLocation": location}]})
+        # The results of a file are encoded at once, without the brackets of their list
+        self.output.write(self.separator + self.encode(parts)[1:-1])
+        self.separator = ",\n"
+
+    def finish(self):
+        descriptions = dict(DESCRIPTIONS, **{code: rule.description for rule in RULES.values() for code in rule.codes})
+        rules = [{"id": code, "shortDescription": {"text": descriptions[code]}} for code in self.rule_index]
+        tool = {"driver": {"name": "validator", "rules": rules}}
+        self.output.write(f'\n],"tool":{self.encode(tool)},"properties":{self.encode(self.summary.to_dict())}}}]}}\n')
+
+
+def xml_text(text):
+    return escape(XML_INVALID_RE.sub("\ufffd", text))
+
+
+def xml_attribute(text):
+    return quoteattr(XML_INVALID_RE.sub("\ufffd", text))
+
+
+class JUnitReport(Report):
+    """JUnit XML with a test case per file, failed when the file has errors.
+
+    The totals are only known at the end, so the test suite has no ``tests`` or ``failures`` attributes:
+    consumers count the test cases. The summary is written as the output of the suite.
+    """
+
+    def start(self):
+        self.output.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="validator">\n'
+                          '<testsuite name="validator">\n')
+
+    def write_file(self, path, rows):
+        name = xml_attribute(path)
+        if not rows:
+            self.output.write(f'<testcase classname="validator" name={name} file={name}/>\n')
+            return
+        details = xml_text("".join(row_text(row) + "\n" for row in rows))
+        self.output.write(f'<testcase classname="validator" name={name} file={name}>'
+                          f'<failure type="html-validation" message="{len(rows)} error(s)">{details}</failure>'
+                          f'</testcase>\n')
+
+    def finish(self):
+        self.output.write(f"<system-out>{xml_text(self.summary.render())}</system-out>\n</testsuite>\n"
+                          f"</testsuites>\n")
+
+
+# Writers by format name, with the file extension they are usually saved with
+FORMATS = {
+    "text": (TextReport, ".txt"),
+    "jsonl": (JsonLinesReport, ".jsonl"),
+    "sarif": (SarifReport, ".sarif"),
+    "junit": (JUnitReport, ".xml"),
+}
+
+
+def create_report(format, output, top=TOP_FILES):
+    return FORMATS[format][0](output, top)
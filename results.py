@@ -0,0 +1,125 @@
+from collections import Counter
+
+# Error codes
+UNEXPECTED_GT = "unexpected-gt"
+MISSING_GT = "missing-gt"
+MALFORMED_COMMENT = "malformed-comment"
+UNKNOWN_TAG = "unknown-tag"
+INVALID_ATTRIBUTE = "invalid-attribute"
+MISNESTED_CLOSING_TAG = "misnested-closing-tag"
+UNEXPECTED_CLOSING_TAG = "unexpected-closing-tag"
+MISSING_CLOSING_TAG = "missing-closing-tag"
+MISSING_DOCTYPE = "missing-doctype"
+MISSING_TAG = "missing-tag"
+MISSING_END_TAG = "missing-end-tag"
+DISALLOWED_CHILD = "disallowed-child"
+DISALLOWED_TEXT = "disallowed-text"
+DUPLICATE_ATTRIBUTE = "duplicate-attribute"
+INVALID_ATTRIBUTE_VALUE = "invalid-attribute-value"
+DUPLICATE_ID = "duplicate-id"
+UNREADABLE_FILE = "unreadable-file"  # Batch runs only
+
+# Message templates, formatted with the error arguments only when displayed
+MESSAGES = {
+    UNEXPECTED_GT: "Unexpected closing tag >",
+    MISSING_GT: "Missing closing >.",
+    MALFORMED_COMMENT: "Malformed comment {0}",
+    UNKNOWN_TAG: "Unknown or unsupported tag <{0}>.",
+    INVALID_ATTRIBUTE: "Invalid attribute '{1}' for tag <{0}>.",
+    MISNESTED_CLOSING_TAG: "Unexpected closing tag </{0}>. Other tags were expected to close first.",
+    UNEXPECTED_CLOSING_TAG: "Unexpected closing tag </{0}>. Expected </{1}>.",
+    MISSING_CLOSING_TAG: "Missing closing </{0}>.",
+    MISSING_DOCTYPE: "Missing DOCTYPE declaration.",
+    MISSING_TAG: "Missing <{0}> tag.",
+    MISSING_END_TAG: "Missing closing </{0}> tag.",
+    DISALLOWED_CHILD: "Tag <{0}> is not allowed inside <{1}>.",
+    DISALLOWED_TEXT: "Text is not allowed directly inside <{0}>.",
+    DUPLICATE_ATTRIBUTE: "Duplicate attribute '{1}' for tag <{0}>.",
+    INVALID_ATTRIBUTE_VALUE: "Invalid value '{2}' for attribute '{1}' of tag <{0}>: {3}.",
+    DUPLICATE_ID: "Duplicate id '{0}', already used on line {1}.",
+    UNREADABLE_FILE: "Cannot read file: {0}.",
+}
+
+PASSED_MESSAGE = "HTML validation passed."
+
+
+class ValidationError:
+    """One error: a code, its position and the arguments of its message.
+
+    ``line``, ``column`` and ``offset`` are None for document-level errors, ``tag`` is the schema tag ID
+    the error is about, if any. ``offset`` is the position in the source that ``line`` refers to.
+    """
+
+    __slots__ = ("code", "line", "column", "tag", "args", "offset")
+
+    def __init__(self, code, line=None, column=None, tag=None, args=(), offset=None):
+        self.code = code
+        self.line = line
+        self.column = column
+        self.tag = tag
+        self.args = args
+        self.offset = offset
+
+    @property
+    def message(self):
+        return MESSAGES[self.code].format(*self.args)
+
+    def __str__(self):
+        return self.message if self.line is None else f"Line {self.line}: {self.message}"
+
+    def to_dict(self):
+        # JSON-ready form, used by the service and the report writers
+        return {"code": self.code, "message": self.message, "line": self.line, "column": self.column,
+                "offset": self.offset, "args": list(self.args)}
+
+    def __repr__(self):
+        return f"ValidationError({self.code!r}, line={self.line}, column={self.column}, args={self.args!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, ValidationError):
+            return NotImplemented
+        return (self.code, self.line, self.column, self.tag, self.args, self.offset) == (
+            other.code, other.line, other.column, other.tag, other.args, other.offset)
+
+
+class ValidationResult:
+    """The errors found in one document, in reporting order.
+
+    ``profile`` is the profiling.Profile of the run when it was profiled, None otherwise.
+    """
+
+    __slots__ = ("errors", "profile")
+
+    def __init__(self, errors=(), profile=None):
+        self.errors = list(errors)
+        self.profile = profile
+
+    @property
+    def passed(self):
+        return not self.errors
+
+    def __len__(self):
+        return len(self.errors)
+
+    def __iter__(self):
+        return iter(self.errors)
+
+    def __eq__(self, other):
+        if not isinstance(other, ValidationResult):
+            return NotImplemented
+        return self.errors == other.errors
+
+    def messages(self):
+        return [str(error) for error in self.errors]
+
+    def render(self):
+        return "\n".join(self.messages()) if self.errors else PASSED_MESSAGE
+
+    def with_codes(self, *codes):
+        return [error for error in self.errors if error.code in codes]
+
+    def count_by_code(self):
+        return Counter(error.code for error in self.errors)
+
+    def to_dict(self):
+        return {"passed": self.passed, "errors": [error.to_dict() for error in self.errors]}
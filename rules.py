@@ -0,0 +1,184 @@
+"""Registry of the validation rules, and selection of the rules a run checks.
+
+Every rule subscribes to token kinds with a handler, called with ``(token, tag_id)`` for each token of those
+kinds, ``tag_id`` being None for tokens other than tags. The validator only calls the handlers of the enabled
+rules, so disabled rules cost nothing. Rules without a handler share the open elements stack the validator
+always keeps: they only decide which of its errors are reported.
+
+Rules are selected with a preset, then rules enabled and disabled by name, from the arguments of a run or
+from a configuration file (JSON, or TOML with a [tool.validator] table such as pyproject.toml)::
+
+    {"preset": "markup", "enable": ["duplicate-ids"], "disable": ["comments"]}
+"""
+import json
+import os
+
+import results
+from tokenizer import TEXT, START_TAG, END_TAG, DOCTYPE, MALFORMED_COMMENT, STRAY_GT, UNCLOSED_LT
+
+TAGS = (START_TAG, END_TAG)
+
+
+class Rule:
+    """A named check: the error codes it reports and the token kinds its handler subscribes to.
+
+    ``handler`` is the name of an HTMLValidator method, or a function called as ``handler(validator, token,
+    tag_id)`` that appends ValidationError objects to ``validator.errors``. ``finish`` is an optional function
+    called as ``finish(validator)`` at the end of the document, returning more errors. ``messages`` gives the
+    templates of the codes the rule adds to results.MESSAGES.
+    """
+
+    __slots__ = ("name", "codes", "kinds", "handler", "finish", "description", "messages")
+
+    def __init__(self, name, codes, kinds=(), handler=None, finish=None, description="", messages=None):
+        self.name = name
+        self.codes = tuple(codes)
+        self.kinds = tuple(kinds)
+        self.handler = handler
+        self.finish = finish
+        self.description = description
+        self.messages = messages or {}
+
+    def __repr__(self):
+        return f"Rule({self.name!r})"
+
+
+# Registered rules by name, their handlers being called in this order
+RULES = {}
+
+
+def register_rule(rule):
+    if rule.name in RULES:
+        raise ValueError(f"A rule named {rule.name!r} is already registered.")
+    results.MESSAGES.update(rule.messages)
+    RULES[rule.name] = rule
+    return rule
+
+
+def unregister_rule(name):
+    # Removes a rule registered with register_rule, and the message templates it added
+    rule = RULES.pop(name)
+    for code in rule.messages:
+        results.MESSAGES.pop(code, None)
+    return rule
+
+
+for _rule in (
+    Rule("balance", (results.UNEXPECTED_GT, results.MISSING_GT), (STRAY_GT, UNCLOSED_LT), "check_balance",
+         description="'<' and '>' that do not delimit markup"),
+    Rule("doctype", (results.MISSING_DOCTYPE,), (DOCTYPE,), "check_doctype",
+         description="the document declares <!DOCTYPE html>"),
+    Rule("comments", (results.MALFORMED_COMMENT,), (MALFORMED_COMMENT,), "check_comment",
+         description="comments are well formed"),
+    Rule("essential-tags", (results.MISSING_TAG, results.MISSING_END_TAG), TAGS, "handle_essential_tag",
+         description="<html>, <head> and <body> are present and closed"),
+    Rule("unknown-tags", (results.UNKNOWN_TAG,), description="tags are known to the schema"),
+    Rule("nesting", (results.MISNESTED_CLOSING_TAG, results.UNEXPECTED_CLOSING_TAG, results.MISSING_CLOSING_TAG),
+         description="elements are closed, in the order they were opened"),
+    Rule("content-model", (results.DISALLOWED_CHILD, results.DISALLOWED_TEXT), (TEXT,), "check_text",
+         description="elements and text only appear where the HTML content model allows them"),
+    # The three attribute rules share a single scan of the attributes of each tag
+    Rule("attributes", (results.INVALID_ATTRIBUTE, results.DUPLICATE_ATTRIBUTE), TAGS, "validate_attributes",
+         description="attributes are allowed on their tag and not repeated"),
+    Rule("attribute-values", (results.INVALID_ATTRIBUTE_VALUE,), TAGS, "validate_attributes",
+         description="values of known attributes have the expected type"),
+    Rule("duplicate-ids", (results.DUPLICATE_ID,), TAGS, "validate_attributes",
+         description="id values are unique in the document"),
+):
+    register_rule(_rule)
+
+# Named selections of rules, None standing for every registered rule
+PRESETS = {
+    "full": None,
+    "markup": ("balance", "doctype", "comments", "essential-tags", "unknown-tags", "nesting", "content-model"),
+    "structure": ("balance", "comments", "unknown-tags", "nesting"),
+}
+DEFAULT_PRESET = "full"
+
+
+class RuleSet:
+    """The rules enabled for a run, in registry order. ``key`` identifies the selection, for result caches."""
+
+    __slots__ = ("rules", "names", "key")
+
+    def __init__(self, names):
+        self.rules = [rule for name, rule in RULES.items() if name in names]
+        self.names = frozenset(rule.name for rule in self.rules)
+        self.key = ",".join(sorted(self.names))
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __eq__(self, other):
+        return isinstance(other, RuleSet) and self.names == other.names
+
+    def __hash__(self):
+        return hash(self.names)
+
+    def __reduce__(self):
+        # Worker processes rebuild the set from their own registry
+        return RuleSet, (self.names,)
+
+
+def check_names(names):
+    unknown = [name for name in names if name not in RULES]
+    if unknown:
+        raise ValueError(f"Unknown rule(s): {', '.join(unknown)}. Known rules: {', '.join(RULES)}.")
+
+
+def select_rules(preset=None, enable=(), disable=(), config=None):
+    """Return the RuleSet of ``preset``, with the rules of ``enable`` added and those of ``disable`` removed.
+
+    ``config`` is a configuration mapping or file path. Its lists apply before the arguments, so that
+    ``enable`` and ``disable`` override it, and ``preset`` replaces its preset.
+    """
+    layers = []
+    if config is not None:
+        if not isinstance(config, dict):
+            config = load_config(config)
+        preset = preset or config.get("preset")
+        layers.append((config.get("enable", ()), config.get("disable", ())))
+    layers.append((enable, disable))
+
+    preset = preset or DEFAULT_PRESET
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset: {preset}. Known presets: {', '.join(PRESETS)}.")
+    names = set(RULES if PRESETS[preset] is None else PRESETS[preset])
+    for enabled, disabled in layers:
+        check_names(enabled)
+        check_names(disabled)
+        names.update(enabled)
+        names.difference_update(disabled)
+    return RuleSet(names)
+
+
+def load_config(path):
+    # JSON, or TOML whose [tool.validator] table (if any) holds the settings
+    with open(path, "rb") as file:
+        content = file.read()
+    if os.path.splitext(path)[1].lower() != ".toml":
+        data = json.loads(content)
+    else:
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("TOML configuration files need Python 3.11 or later, use JSON instead.")
+        data = tomllib.loads(content.decode("utf-8"))
+        data = data.get("tool", {}).get("validator", data)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: the configuration must be an object of settings.")
+    return data
+
+
+_default_rules = None
+
+
+def default_rules():
+    global _default_rules
+    if _default_rules is None or len(_default_rules.rules) != len(RULES):
+        # Rebuilt when rules were registered since the last call
+        _default_rules = select_rules()
+    return _default_rules
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import marshal
+import os
+import re
+import sys
+
+NAME_RE = re.compile(r'\w[\w-]*')
+TAG_NAME_RE = re.compile(r'\w+')
+
+# Attributes matched by prefix on every tag, on top of patterns such as "data-*" found in the tags information
+GLOBAL_ATTRIBUTE_PREFIXES = ("aria-",)
+
+# The tags schema lives next to this module, whatever the current directory, or in the data files of an
+# installed copy. It is written by schema_builder.
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html_schema.json")
+if not os.path.exists(SCHEMA_PATH):
+    SCHEMA_PATH = os.path.join(sys.prefix, "share", "validator", "html_schema.json")
+CACHE_PATH = os.path.splitext(SCHEMA_PATH)[0] + ".cache"
+# Layout of the schema files written by schema_builder
+SCHEMA_FORMAT = 1
+
+# Bump CACHE_VERSION whenever the compiled layout changes
+CACHE_MAGIC = b"HVSC"
+CACHE_VERSION = 1
+
+
+def normalize_name(name):
+    # Scraped names may carry notes such as "align \nDeprecated" or stray brackets
+    match = NAME_RE.search(name.lower())
+    return sys.intern(match.group()) if match else None
+
+
+class Schema:
+    """Tags information compiled once into integer tag IDs and shared attribute sets."""
+
+    def __init__(self, tag_names, descriptions, void, attributes, global_attributes, attribute_prefixes,
+                 version=""):
+        self.tag_names = [sys.intern(name) for name in tag_names]  # tag ID -> interned tag name
+        self.tag_ids = {name: tag_id for tag_id, name in enumerate(self.tag_names)}  # tag name -> tag ID
+        self.descriptions = descriptions
+        self.void = bytearray(void)
+        self.attributes = attributes  # tag ID -> frozenset of the attributes specific to the tag
+        self.global_attributes = global_attributes
+        self.attribute_prefixes = attribute_prefixes
+        self.version = version  # hash of the tags information the schema was compiled from
+
+    @classmethod
+    def from_tags_info(cls, tags_info, version=""):
+        tags_attributes = {}
+        for name, info in tags_info.items():
+            # Skip entries that cannot be a tag name, such as "!--...--"
+            if not TAG_NAME_RE.fullmatch(name):
+                continue
+            attrs = {normalize_name(attr) for attr in info["attributes"]} - {None}
+            tags_attributes[normalize_name(name)] = info, attrs
+
+        # Attributes listed for every tag are global, "*" patterns are matched by prefix
+        all_attributes = [attrs for _, attrs in tags_attributes.values()]
+        global_attributes = set.intersection(*all_attributes) if all_attributes else set()
+        prefixes = {attr for attrs in all_attributes for attr in attrs if attr.endswith("-")}
+
+        shared = {}
+        attributes = []
+        for info, attrs in tags_attributes.values():
+            specific = frozenset(attrs - global_attributes - prefixes)
+            attributes.append(shared.setdefault(specific, specific))
+
+        return cls(list(tags_attributes), [info.get("description", "") for info, _ in tags_attributes.values()],
+                   bytes(bool(info["void"]) for info, _ in tags_attributes.values()), attributes,
+                   frozenset(global_attributes - prefixes), tuple(sorted(prefixes | set(GLOBAL_ATTRIBUTE_PREFIXES))),
+                   version)
+
+    @classmethod
+    def from_compiled(cls, data, version=""):
+        # Schema file written by schema_builder: attribute sets are listed once and referenced by index
+        attribute_sets = [frozenset(map(sys.intern, attributes)) for attributes in data["attribute_sets"]]
+        tags = data["tags"]
+        void = set(data["void"])
+        return cls(list(tags), [info["description"] for info in tags.values()],
+                   bytes(tag in void for tag in tags), [attribute_sets[info["attributes"]] for info in tags.values()],
+                   frozenset(data["global_attributes"]), tuple(data["attribute_prefixes"]), version)
+
+    @classmethod
+    def from_json(cls, data, version=""):
+        # Compiled schema, or tags information in the format of the former scraper
+        if "format" in data:
+            if data["format"] != SCHEMA_FORMAT:
+                raise ValueError(f"Unsupported schema format {data['format']}")
+            return cls.from_compiled(data, version)
+        return cls.from_tags_info(data, version)
+
+    def to_bytes(self):
+        # Identical attribute sets are stored once and referenced by index
+        unique = list({id(attrs): attrs for attrs in self.attributes}.values())
+        index = {id(attrs): i for i, attrs in enumerate(unique)}
+        payload = (self.tag_names, self.descriptions, bytes(self.void), unique,
+                   [index[id(attrs)] for attrs in self.attributes], self.global_attributes, self.attribute_prefixes)
+        return CACHE_MAGIC + bytes([CACHE_VERSION]) + bytes.fromhex(self.version) + marshal.dumps(payload)
+
+    @classmethod
+    def from_bytes(cls, data, version):
+        # Returns None unless ``data`` was written by this cache version for this tags information
+        header = CACHE_MAGIC + bytes([CACHE_VERSION]) + bytes.fromhex(version)
+        if not data.startswith(header):
+            return None
+        try:
+            tag_names, descriptions, void, unique, index, global_attributes, prefixes = marshal.loads(
+                data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            return None
+        return cls(tag_names, descriptions, void, [unique[i] for i in index], global_attributes, prefixes, version)
+
+    def tag_id(self, tag_name):
+        tag_id = self.tag_ids.get(tag_name)
+        if tag_id is None:
+            tag_id = self.tag_ids.get(tag_name.lower())
+        return tag_id
+
+    def allows_attribute(self, tag_id, attribute):
+        return (attribute in self.global_attributes or attribute in self.attributes[tag_id]
+                or attribute.startswith(self.attribute_prefixes))
+
+
+def load_schema(path=SCHEMA_PATH, cache_path=CACHE_PATH):
+    # Load the compiled schema from its binary cache, rebuilding the cache when the JSON content changed
+    with open(path, "rb") as info_file:
+        content = info_file.read()
+    version = hashlib.sha256(content).hexdigest()
+
+    if cache_path:
+        try:
+            with open(cache_path, "rb") as cache_file:
+                schema = Schema.from_bytes(cache_file.read(), version)
+            if schema is not None:
+                return schema
+        except OSError:
+            pass
+
+    schema = Schema.from_json(json.loads(content), version)
+
+    if cache_path:
+        # Write to a temporary file first so concurrent processes never read a partial cache
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(schema.to_bytes())
+            os.replace(temporary_path, cache_path)
+        except OSError:
+            pass
+    return schema
+
+
+_schema = None
+
+
+def get_schema():
+    # The default schema is loaded on first use, see preload_schema
+    global _schema
+    if _schema is None:
+        _schema = load_schema()
+    return _schema
+
+
+def preload_schema():
+    # Called before starting worker processes: loaded before forking, the schema is shared by every worker
+    # instead of being loaded again in each of them
+    get_schema()
@@ -0,0 +1,309 @@
+"""Build the compiled tags schema from locally saved source snapshots.
+
+Sources are read from files, never from the network, so a build is reproducible offline:
+
+- HTML pages with a table of tags or elements (w3schools tag reference, WHATWG index of elements). A table is
+  recognised by its header: a "Tag" or "Element" column, with optional "Children" (void elements are the
+  ones with "empty" children) and "Attributes" columns.
+- HTML pages with a table of attributes (MDN attribute reference, WHATWG index of attributes): an "Attribute"
+  column followed by the elements it applies to, "Global attribute" or "HTML elements" marking globals.
+- JSON tags information in the format of the former scraper: {tag: {"description", "void", "attributes"}}.
+
+The output lists every attribute set once and global attributes separately, with sorted keys and lists so that
+the same sources always give the same file and version hash.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from html.parser import HTMLParser
+
+from schema import SCHEMA_PATH, SCHEMA_FORMAT, GLOBAL_ATTRIBUTE_PREFIXES, TAG_NAME_RE, normalize_name
+
+SOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_sources")
+SOURCE_EXTENSIONS = (".html", ".htm", ".json")
+
+# Element lists that mark an attribute as global in attribute tables
+GLOBAL_MARKERS = ("global attribute", "html elements")
+
+
+def normalize_tag(name):
+    # Tag cells may read "<a>", "a" or "!doctype>\xa0": only plain names are tags
+    name = name.strip("<> \xa0\n\t").lower()
+    return name if TAG_NAME_RE.fullmatch(name) else None
+
+
+class TableParser(HTMLParser):
+    # Collects every table of a page as rows of (text, [text of each <code>]) cells
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        self.rows = None
+        self.cell = None
+        self.code = None
+        self.depth = 0  # Nested tables are flattened into the outermost one
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.depth += 1
+            if self.depth == 1:
+                self.rows = []
+        elif self.rows is None:
+            return
+        elif tag == "tr":
+            self.rows.append([])
+        elif tag in ("td", "th") and self.rows:
+            self.cell = ([], [])
+            self.rows[-1].append(self.cell)
+        elif tag == "code" and self.cell is not None:
+            self.code = []
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self.depth:
+            self.depth -= 1
+            if not self.depth:
+                self.tables.append([[("".join(text).strip(), codes) for text, codes in row]
+                                    for row in self.rows if row])
+                self.rows = None
+        elif tag in ("td", "th"):
+            self.cell = None
+        elif tag == "code" and self.code is not None:
+            if self.cell is not None:
+                self.cell[1].append("".join(self.code).strip())
+            self.code = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell[0].append(data)
+            if self.code is not None:
+                self.code.append(data)
+
+
+def find_column(header, *names):
+    for index, (text, _) in enumerate(header):
+        if text.lower().rstrip("*†").strip() in names:
+            return index
+    return None
+
+
+class SchemaSources:
+    """Tags, attributes and void elements gathered from any number of sources."""
+
+    def __init__(self):
+        self.tags = set()
+        self.descriptions = {}
+        self.attributes = {}  # tag -> set of attribute names, "-" suffixed names being prefixes
+        self.global_attributes = set()
+        self.void = set()
+
+    def add_tag(self, tag, description=""):
+        self.tags.add(tag)
+        self.attributes.setdefault(tag, set())
+        if description and not self.descriptions.get(tag):
+            self.descriptions[tag] = " ".join(description.split())
+
+    def add_attributes(self, tag, names):
+        attributes = self.attributes.setdefault(tag, set())
+        for name in names:
+            name = normalize_name(name)
+            if name:
+                attributes.add(name)
+
+    def read_tags_info(self, tags_info):
+        # JSON of the former scraper, which copied the global attributes into every tag
+        tags = []
+        for name, info in tags_info.items():
+            tag = normalize_tag(name)
+            if tag is None:
+                continue
+            tags.append(tag)
+            self.add_tag(tag, info.get("description", ""))
+            self.add_attributes(tag, info.get("attributes", []))
+            if info.get("void"):
+                self.void.add(tag)
+        if tags:
+            self.global_attributes |= set.intersection(*(self.attributes[tag] for tag in tags))
+
+    def read_tables(self, html):
+        parser = TableParser()
+        parser.feed(html)
+        parser.close()
+        for table in parser.tables:
+            if len(table) < 2:
+                continue
+            header, rows = table[0], table[1:]
+            tag_column = find_column(header, "tag", "element")
+            attribute_column = find_column(header, "attribute", "attribute name", "name")
+            if tag_column is not None:
+                self.read_tags_table(header, rows, tag_column)
+            elif attribute_column is not None:
+                self.read_attributes_table(header, rows, attribute_column)
+
+    def read_tags_table(self, header, rows, tag_column):
+        description_column = find_column(header, "description")
+        children_column = find_column(header, "children")
+        attributes_column = find_column(header, "attributes")
+        for row in rows:
+            if len(row) <= tag_column:
+                continue
+            text, codes = row[tag_column]
+            # A WHATWG row may cover several elements ("h1, h2, h3, h4, h5, h6")
+            tags = [tag for tag in map(normalize_tag, codes or text.split(",")) if tag]
+            for tag in tags:
+                self.add_tag(tag, row[description_column][0] if description_column is not None
+                             and description_column < len(row) else "")
+                if children_column is not None and children_column < len(row) and (
+                        row[children_column][0].lower() == "empty"):
+                    self.void.add(tag)
+                if attributes_column is not None and attributes_column < len(row):
+                    names = [name.strip() for name in row[attributes_column][0].split(";")]
+                    if "globals" in names:
+                        names.remove("globals")
+                    self.add_attributes(tag, names)
+
+    def read_attributes_table(self, header, rows, attribute_column):
+        elements_column = attribute_column + 1
+        for row in rows:
+            if len(row) <= elements_column:
+                continue
+            name = normalize_name(row[attribute_column][0])
+            if not name:
+                continue
+            text, codes = row[elements_column]
+            if any(marker in text.lower() for marker in GLOBAL_MARKERS):
+                self.global_attributes.add(name)
+                continue
+            for code in codes or text.split(";"):
+                tag = normalize_tag(code)
+                if tag:
+                    self.attributes.setdefault(tag, set()).add(name)
+
+    def read_path(self, path):
+        with open(path, encoding="utf-8") as file:
+            content = file.read()
+        if path.endswith(".json"):
+            self.read_tags_info(json.loads(content))
+        else:
+            self.read_tables(content)
+
+    def compile(self):
+        # Tables of attributes may name elements that no table of tags lists, such as SVG ones: drop them
+        tags = sorted(self.tags)
+        prefixes = {name for name in self.global_attributes if name.endswith("-")}
+        prefixes.update(GLOBAL_ATTRIBUTE_PREFIXES)
+        global_attributes = self.global_attributes - prefixes
+
+        specific = {tag: tuple(sorted(self.attributes[tag] - global_attributes - prefixes)) for tag in tags}
+        attribute_sets = sorted(set(specific.values()))
+        index = {attributes: i for i, attributes in enumerate(attribute_sets)}
+
+        data = {
+            "format": SCHEMA_FORMAT,
+            "global_attributes": sorted(global_attributes),
+            "attribute_prefixes": sorted(prefixes),
+            "attribute_sets": [list(attributes) for attributes in attribute_sets],
+            "void": sorted(self.void & self.tags),
+            "tags": {tag: {"description": self.descriptions.get(tag, ""), "attributes": index[specific[tag]]}
+                     for tag in tags},
+        }
+        data["version"] = content_hash(data)
+        return data
+
+
+def content_hash(data):
+    content = {key: value for key, value in data.items() if key != "version"}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def dumps(data):
+    return json.dumps(data, sort_keys=True, indent=1, ensure_ascii=False) + "\n"
+
+
+def expand(data):
+    # Per tag attribute sets, globals, prefixes and void elements of a compiled schema, for comparisons
+    if not data:
+        return {}, set(), set(), set()
+    sets = [set(attributes) for attributes in data["attribute_sets"]]
+    tags = {tag: sets[info["attributes"]] for tag, info in data["tags"].items()}
+    return tags, set(data["global_attributes"]), set(data["attribute_prefixes"]), set(data["void"])
+
+
+def diff_schemas(old, new):
+    """Return the differences between two compiled schemas as lines of text."""
+    old_tags, old_globals, old_prefixes, old_void = expand(old)
+    new_tags, new_globals, new_prefixes, new_void = expand(new)
+    lines = []
+
+    def changes(label, before, after):
+        added, removed = sorted(after - before), sorted(before - after)
+        if added or removed:
+            lines.append(f"{label}: " + " ".join([f"+{name}" for name in added] + [f"-{name}" for name in removed]))
+
+    changes("tags", set(old_tags), set(new_tags))
+    changes("global attributes", old_globals, new_globals)
+    changes("attribute prefixes", old_prefixes, new_prefixes)
+    changes("void elements", old_void, new_void)
+    for tag in sorted(set(old_tags) & set(new_tags)):
+        changes(f"<{tag}> attributes", old_tags[tag], new_tags[tag])
+    return lines
+
+
+def source_paths(paths):
+    # Directories are expanded into the source files they contain, in a stable order
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(SOURCE_EXTENSIONS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def build(paths):
+    sources = SchemaSources()
+    for path in source_paths(paths):
+        sources.read_path(path)
+    return sources.compile()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the tags schema from saved source pages.")
+    parser.add_argument("sources", nargs="*", default=[SOURCES_DIR],
+                        help="source files or directories (default: schema_sources)")
+    parser.add_argument("-o", "--output", default=SCHEMA_PATH, help="schema file to write")
+    parser.add_argument("--check", action="store_true",
+                        help="only compare with the current schema, exit with 1 if it would change")
+    args = parser.parse_args(argv)
+
+    data = build(args.sources)
+    if not data["tags"]:
+        print("No tags found in the sources.", file=sys.stderr)
+        return 1
+
+    try:
+        with open(args.output, encoding="utf-8") as file:
+            previous = json.load(file)
+        if previous.get("format") != SCHEMA_FORMAT:
+            previous = None
+    except (OSError, ValueError):
+        previous = None
+
+    if previous is not None and previous.get("version") == data["version"]:
+        print(f"Schema unchanged ({data['version'][:12]}).")
+        return 0
+    for line in diff_schemas(previous, data) if previous is not None else ["(no previous schema)"]:
+        print(line)
+    if args.check:
+        return 1
+
+    temporary_path = f"{args.output}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8", newline="\n") as file:
+        file.write(dumps(data))
+    os.replace(temporary_path, args.output)
+    print(f"Wrote {len(data['tags'])} tags to {args.output} ({data['version'][:12]}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
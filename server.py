@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from main import validate_html
+from schema import get_schema, preload_schema
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# Single documents up to this size are validated in the event loop, sending them to a worker costs more than
+# that. Parts of a batch always go to the workers, so a request blocks the loop for one small document at most.
+INLINE_SIZE = 4 * 1024
+# Largest request head (request line and headers)
+MAX_HEAD_SIZE = 64 * 1024
+# Seconds an idle keep-alive connection is kept open
+KEEP_ALIVE_TIMEOUT = 15
+# Seconds a client has to send the body of a request once its head is read
+BODY_TIMEOUT = 30
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+
+
+def validate_document(data):
+    # Runs in the worker processes: bytes in, JSON-ready result out, so that no object crosses the pipe twice
+    return validate_html(data.decode("utf-8-sig", "replace")).to_dict()
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.responses = {}  # Status -> count
+        self.documents = 0
+        self.inline_documents = 0
+        self.rejected = 0  # Requests turned away because too many documents were pending
+        self.bytes_received = 0
+        self.validation_seconds = 0.0
+        self.in_flight = 0
+
+    def to_dict(self):
+        return {
+            "uptime": time.time() - self.started,
+            "requests": self.requests,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "documents": self.documents,
+            "inline_documents": self.inline_documents,
+            "rejected": self.rejected,
+            "bytes_received": self.bytes_received,
+            "validation_seconds": self.validation_seconds,
+            "in_flight": self.in_flight,
+        }
+
+
+class ValidationServer:
+    """HTTP/1.1 validation service on asyncio.
+
+    ``POST /validate`` takes an HTML body, or a multipart/form-data batch with one document per part, and
+    answers with the errors as JSON. ``GET /health`` and ``GET /metrics`` report the state of the service.
+    Documents are validated by a pool of ``jobs`` processes. At most ``max_pending`` of them may wait for a
+    worker: beyond that requests are answered 503 right away instead of queueing without bound. A batch takes
+    the slots for all its parts, up to ``max_pending``, before any of them is sent to the pool.
+    """
+
+    def __init__(self, jobs=None, max_pending=None, max_body_size=MAX_BODY_SIZE, inline_size=INLINE_SIZE):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_pending = max_pending or self.jobs * 4
+        self.max_body_size = max_body_size
+        self.inline_size = inline_size
+        self.metrics = Metrics()
+        self.pending = 0
+        self.executor = None
+
+    def start_pool(self):
+        preload_schema()
+        self.executor = ProcessPoolExecutor(self.jobs)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def reserve(self, count):
+        # Take ``count`` of the pending slots, release them by subtracting from ``pending``
+        if self.pending + count > self.max_pending:
+            self.metrics.rejected += 1
+            raise HTTPError(503, "Too many documents are being validated, retry later.", [("Retry-After", "1")])
+        self.pending += count
+
+    async def run_in_pool(self, data):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, validate_document, data)
+
+    async def validate(self, data):
+        metrics = self.metrics
+        metrics.documents += 1
+        if len(data) <= self.inline_size:
+            metrics.inline_documents += 1
+            return validate_document(data)
+
+        self.reserve(1)
+        try:
+            return await self.run_in_pool(data)
+        finally:
+            self.pending -= 1
+
+    async def validate_batch(self, content_type, body):
+        # Every part of a multipart/form-data body is one document, named after its field or file name
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+        if not message.is_multipart():
+            raise HTTPError(400, "Malformed multipart body.")
+
+        names = []
+        documents = []
+        for index, part in enumerate(message.iter_parts()):
+            names.append(part.get_filename() or part.get_param("name", header="content-disposition") or str(index))
+            documents.append(part.get_payload(decode=True) or b"")
+
+        # Parts always go to the workers, see INLINE_SIZE. The batch is refused before any part runs, or its parts
+        # share the slots it holds until they are all done.
+        slots = min(len(documents), self.max_pending)
+        self.reserve(slots)
+        self.metrics.documents += len(documents)
+        semaphore = asyncio.Semaphore(slots)
+
+        async def validate_part(data):
+            async with semaphore:
+                return await self.run_in_pool(data)
+
+        try:
+            results = await asyncio.gather(*map(validate_part, documents))
+        finally:
+            self.pending -= slots
+        return {"results": [dict(result, name=name) for name, result in zip(names, results)]}
+
+    async def dispatch(self, method, path, headers, body):
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "Use GET.", [("Allow", "GET")])
+            return {"status": "ok", "schema": get_schema().version}
+        if path == "/metrics":
+            if method != "GET":
+                raise HTTPError(405, "Use GET.", [("Allow", "GET")])
+            return dict(self.metrics.to_dict(), pending=self.pending, max_pending=self.max_pending, jobs=self.jobs)
+        if path == "/validate":
+            if method != "POST":
+                raise HTTPError(405, "Use POST.", [("Allow", "POST")])
+            # Any other body is one document
+            content_type = headers.get("content-type", "")
+            if content_type.startswith("multipart/form-data"):
+                return await self.validate_batch(content_type, body)
+            return await self.validate(body)
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def read_request(self, reader):
+        # Returns (method, path, version, headers, body), or None when the client closed the connection
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "Incomplete request.")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "Request head too large.")
+        except asyncio.TimeoutError:
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ")
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", ""):
+            raise HTTPError(411, "Chunked bodies are not supported, send a Content-Length.")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > self.max_body_size:
+            raise HTTPError(413, f"Request body larger than {self.max_body_size} bytes.")
+        if length < 0:
+            raise HTTPError(400, "Invalid Content-Length.")
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b""
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "Request body not received in time.")
+        self.metrics.bytes_received += length
+        return method, path, version, headers, body
+
+    async def handle_connection(self, reader, writer):
+        metrics = self.metrics
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, version, headers, body = request
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                    metrics.requests += 1
+                    metrics.in_flight += 1
+                    start = time.perf_counter()
+                    try:
+                        status, payload, extra = 200, await self.dispatch(method, path, headers, body), ()
+                    finally:
+                        metrics.in_flight -= 1
+                        if path.startswith("/validate"):
+                            metrics.validation_seconds += time.perf_counter() - start
+                except HTTPError as e:
+                    status, payload, extra = e.status, {"error": e.message}, e.headers
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload, extra = 500, {"error": f"{type(e).__name__}: {e}"}, ()
+
+                metrics.responses[status] = metrics.responses.get(status, 0) + 1
+                data = json.dumps(payload).encode("utf-8")
+                response = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                            "Content-Type: application/json",
+                            f"Content-Length: {len(data)}",
+                            "Connection: " + ("keep-alive" if keep_alive else "close")]
+                response.extend(f"{name}: {value}" for name, value in extra)
+                writer.write("\r\n".join(response).encode("latin-1") + b"\r\n\r\n" + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        self.start_pool()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEAD_SIZE,
+                                            reuse_address=True)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="validator serve", description="Serve HTML validation over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="documents that may wait for a worker before requests are refused (default: 4 per job)")
+    parser.add_argument("--max-body-size", type=int, default=MAX_BODY_SIZE, help="largest request body in bytes")
+    parser.add_argument("--inline-size", type=int, default=INLINE_SIZE,
+                        help="documents up to this size in bytes are validated without a worker")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = ValidationServer(args.jobs, args.max_pending, args.max_body_size, args.inline_size)
+
+    def ready(listener):
+        addresses = ", ".join(str(socket.getsockname()[:2]) for socket in listener.sockets)
+        print(f"Serving on {addresses}", file=sys.stderr)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import pytest
+
+from attributes import ATTRIBUTE_RE
+from main import validate_html, validate_tokens
+from tokenizer import tokenize
+
+PAGE = "<!DOCTYPE html>\n<html><head><title>t</title>{head}</head>\n<body>{body}</body></html>"
+
+
+def errors(body="", head=""):
+    html = PAGE.format(head=head, body=body)
+    result = validate_html(html)
+    found = [(error.code, error.args) for error in result]
+    # The scan and the token path check attributes with the same code
+    assert found == [(error.code, error.args) for error in validate_tokens(tokenize(html))]
+    return found
+
+
+@pytest.mark.parametrize("body, code, args", [
+    ("<input type=bogus>", "invalid-attribute-value", ("input", "type", "bogus")),
+    ("<table><tr><td colspan=0>x</td></tr></table>", "invalid-attribute-value", ("td", "colspan", "0")),
+    ("<img src=a.png alt='' width=-1>", "invalid-attribute-value", ("img", "width", "-1")),
+    ("<a href='x y'>link</a>", "invalid-attribute-value", ("a", "href", "x y")),
+    ("<p class=a class=b>x</p>", "duplicate-attribute", ("p", "class")),
+    ("<p http-equiv=refresh>x</p>", "invalid-attribute", ("p", "http-equiv")),
+])
+def test_invalid_attributes(body, code, args):
+    [(found_code, found_args)] = errors(body)
+    assert found_code == code
+    assert found_args[:len(args)] == args
+
+
+def test_attribute_value_expectations():
+    assert errors("<table><tr><td colspan=0>x</td></tr></table>")[0][1][3] == "expected an integer of at least 1"
+    assert errors("<a href='x y'>link</a>")[0][1][3] == "expected a URL without spaces"
+
+
+def test_meta_http_equiv():
+    assert errors(head="<meta http-equiv=\"refresh\" content=\"5\">") == []
+
+
+def test_valid_attributes():
+    assert errors("<input type=TEXT size=3 disabled><img src='a.png' alt=\"\" width=0>") == []
+
+
+@pytest.mark.parametrize("source, value", [
+    ('type="bogus value"', "bogus value"),
+    ("type='bogus value'", "bogus value"),
+    ("type=bogus", "bogus"),
+    ('type = "a>b"', "a>b"),
+])
+def test_attribute_re_value_forms(source, value):
+    match = ATTRIBUTE_RE.match(source)
+    assert match.group(1) == "type"
+    assert next(group for group in match.groups()[1:] if group is not None) == value
+    assert match.end() == len(source)
+    [(code, args)] = errors(f"<input {source}>")
+    assert code == "invalid-attribute-value" and args[:3] == ("input", "type", value)
+
+
+def test_attribute_re_without_value():
+    match = ATTRIBUTE_RE.match("disabled type=text")
+    assert match.group(1) == "disabled"
+    assert match.groups()[1:] == (None, None, None)
@@ -0,0 +1,19 @@
+import pytest
+
+from bench import generate_document
+from main import validate_html
+
+
+@pytest.mark.parametrize("attribute_density", [0.5, 1.0, 4.0])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_generated_documents_are_valid_without_errors(attribute_density, seed):
+    html = generate_document(100_000, attribute_density=attribute_density, seed=seed)
+    assert validate_html(html).passed
+
+
+def test_generated_documents_are_deterministic():
+    assert generate_document(20_000, seed=3) == generate_document(20_000, seed=3)
+
+
+def test_injected_errors_are_found():
+    assert len(validate_html(generate_document(100_000, error_rate=0.05))) > 0
@@ -0,0 +1,76 @@
+import os
+
+from cache import Manifest, ResultCache, validate_changed_path
+from cli import iter_results
+from main import validate_html
+from reports import error_rows
+from rules import select_rules
+
+INVALID = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><p id=a><p id=a><blink></body></html>"
+
+
+def run(paths, cache_dir, rules):
+    return [(path, rows) for path, rows, _ in iter_results(paths, jobs=1, cache_dir=cache_dir, rules=rules)]
+
+
+def test_result_cache_hits():
+    cache = ResultCache(max_entries=2)
+    first = cache.validate(INVALID)
+    assert cache.validate(INVALID) == first == validate_html(INVALID)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_result_cache_on_disk(tmp_path):
+    ResultCache(directory=tmp_path).validate(INVALID)
+    cache = ResultCache(directory=tmp_path)
+    assert cache.validate(INVALID) == validate_html(INVALID)
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_validate_changed_path(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text(INVALID, encoding="utf-8")
+    content_hash, result = validate_changed_path(path)
+    assert result == validate_html(INVALID)
+    assert validate_changed_path(path, content_hash) == (content_hash, None)
+
+    empty = tmp_path / "empty.html"
+    empty.write_bytes(b"")
+    empty_hash, result = validate_changed_path(empty)
+    assert result == validate_html("")
+    assert validate_changed_path(empty, empty_hash) == (empty_hash, None)
+
+
+def test_manifest_reuses_results(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_text(INVALID, encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+    expected = [(str(page), error_rows(validate_html(INVALID).errors))]
+    assert run([str(page)], cache_dir, None) == expected
+
+    with Manifest(cache_dir) as manifest:
+        rows, _ = manifest.lookup(str(page), os.stat(page))
+        assert rows == expected[0][1]
+    assert run([str(page)], cache_dir, None) == expected
+
+    # A changed file is validated again
+    page.write_text("<p>", encoding="utf-8")
+    os.utime(page, ns=(0, 0))
+    assert run([str(page)], cache_dir, None) == [(str(page), error_rows(validate_html("<p>").errors))]
+
+
+def test_manifest_entries_per_rules(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_text(INVALID, encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+    structure = select_rules("structure")
+    full = run([str(page)], cache_dir, None)
+    partial = run([str(page)], cache_dir, structure)
+    assert full != partial
+    assert partial == [(str(page), error_rows(validate_html(INVALID, rules=structure).errors))]
+
+    # Both runs find their entry
+    for rules, expected in ((None, full), (structure, partial)):
+        with Manifest(cache_dir, rules) as manifest:
+            rows, _ = manifest.lookup(str(page), os.stat(page))
+        assert rows == expected[0][1]
@@ -0,0 +1,37 @@
+import os
+
+from cli import find_files, iter_results, main
+
+VALID = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><p>text</p></body></html>\n"
+INVALID = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><blink></body></html>\n"
+
+
+def write_pages(directory):
+    (directory / "sub").mkdir()
+    paths = [directory / "b.html", directory / "a.htm", directory / "sub" / "c.html"]
+    for path, html in zip(paths, (VALID, INVALID, VALID)):
+        path.write_text(html, encoding="utf-8")
+    (directory / "notes.txt").write_text("<blink>", encoding="utf-8")
+    return [str(path) for path in paths]
+
+
+def test_find_files(tmp_path):
+    b, a, c = write_pages(tmp_path)
+    assert list(find_files([str(tmp_path)])) == [a, b, c]
+    assert list(find_files([os.path.join(str(tmp_path), "**", "*.html")])) == [b, c]
+    assert list(find_files(["missing.html"])) == ["missing.html"]
+
+
+def test_workers_match_serial(tmp_path):
+    paths = write_pages(tmp_path) * 5
+    assert list(iter_results(paths, jobs=2, chunksize=2)) == list(iter_results(paths, jobs=1))
+
+
+def test_exit_codes(tmp_path, capsys):
+    b, a, c = write_pages(tmp_path)
+    assert main([b, c, "-j", "1"]) == 0
+    assert capsys.readouterr().err == "2 file(s) checked, 0 with errors.\n"
+    assert main([str(tmp_path), "-j", "2", "-q"]) == 1
+    out, err = capsys.readouterr()
+    assert out and all(line.startswith(a) for line in out.splitlines())
+    assert err == ""
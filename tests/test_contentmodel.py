@@ -0,0 +1,28 @@
+from main import validate_html
+
+HEAD = "<!DOCTYPE html>\n<html><head><title>Page</title></head>\n"
+
+
+def codes(html):
+    return [error.code for error in validate_html(html)]
+
+
+def test_foreign_content_is_not_checked():
+    html = HEAD + "<body><svg><title>Icon</title><a><title>Link</title></a></svg></body></html>"
+    assert codes(html) == []
+    assert codes(HEAD + "<body><p><title>Not here</title></p></body></html>") == ["disallowed-child"]
+
+
+def test_template_content_is_not_checked():
+    assert codes(HEAD + "<body><template><li>item</li><tr><td>cell</td></tr></template></body></html>") == []
+    assert codes(HEAD + "<body><li>item</li></body></html>") == ["disallowed-child"]
+
+
+def test_body_closes_the_head():
+    html = "<!DOCTYPE html>\n<html><head><title>Page</title>\n<body><p>text</p></body></html>"
+    assert codes(html) == []
+
+
+def test_nothing_is_checked_at_the_top_level():
+    # The root of the content model allows any child and text
+    assert codes("text <li>item</li>") == ["missing-doctype", "missing-tag"]
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import incremental
+from incremental import IncrementalValidator, ValidationCancelled, merge_edits
+from main import validate_html
+
+PIECES = ["<div>", "</div>", "<p>", "</p>", "\n", "text ", "<li>", "<ul>", "</ul>", "<!--", "-->", "<", ">",
+          "<a href='x' id=q>", "</a>", "<span>", "</span>", "<!DOCTYPE html>", "<html>", "</html>", "<body>",
+          "</body>", "<head>", "</head>", "<table>", "<tr>", "<td>", "</table>", "<p id=q>", '"', "'", "<!x>",
+          "<input id=z>", "<svg><title>", "</svg>", "<template>", "</template>", "<script>", "</script>", "<style>",
+          "</STYLE>", "</scr", "ipt>", "a < b && c > d"]
+
+
+def error_tuples(result):
+    return [(error.code, error.line, error.column, error.args, error.offset) for error in result]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_edits_match_whole_text(seed, monkeypatch):
+    # Checkpoints every other line, so that edits resume from and resynchronize on them
+    monkeypatch.setattr(incremental, "CHECKPOINT_LINES", 2)
+    rng = random.Random(seed)
+    for _ in range(100):
+        html = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 60)))
+        validator = IncrementalValidator(html)
+        for _ in range(10):
+            position = rng.randint(0, len(html))
+            removed = rng.randint(0, min(8, len(html) - position))
+            text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 3)))
+            validator.replace(position, removed, text)
+            html = html[:position] + text + html[position + removed:]
+            assert error_tuples(validator.result()) == error_tuples(validate_html(html)), html
+
+
+def test_edit_of_raw_text_end_tag(monkeypatch):
+    # A checkpoint on every line, the end tag of the script included if it could be one
+    monkeypatch.setattr(incremental, "CHECKPOINT_LINES", 1)
+    html = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body>\n<script>a < b\n</script>\n"
+    html += "<p>a</p>\n" * 20 + "</body></html>"
+    validator = IncrementalValidator(html)
+    end_tag = html.index("</script>")
+    for position, removed, text in ((end_tag + 8, 0, "x"), (end_tag, 0, "</script>")):
+        html = html[:position] + text + html[position + removed:]
+        validator.replace(position, removed, text)
+        assert error_tuples(validator.result()) == error_tuples(validate_html(html))
+
+
+def test_cancelled_update_leaves_validator_unchanged():
+    html = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body>\n" + "<p>a</p>\n" * 5000 + "</body></html>"
+    validator = IncrementalValidator(html)
+    with pytest.raises(ValidationCancelled):
+        validator.update("<div>" + html, 0, 0, 5, cancelled=lambda: True)
+    assert validator.html == html
+    assert error_tuples(validator.result()) == error_tuples(validate_html(html))
+
+
+def test_merge_edits():
+    assert merge_edits([]) is None
+    text = "abcdefgh"
+    edits = [(2, 3, 1), (0, 1, 4), (6, 0, 2)]
+    edited = text
+    for position, removed, added in edits:
+        edited = edited[:position] + "x" * added + edited[position + removed:]
+    position, removed, added = merge_edits(edits)
+    assert text[:position] + edited[position:position + added] + text[position + removed:] == edited
@@ -0,0 +1,91 @@
+import io
+import json
+import random
+
+from lsp import Document, LanguageServer
+from prescan import LSP_LINE_BREAK_RE, LineIndex
+
+URI = "file:///page.html"
+BOGUS = "<bogus>x</bogus>"
+PAGE = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><p>\U0001F600<b>x</b></p></body></html>"
+
+
+def frame(message):
+    data = json.dumps(dict(message, jsonrpc="2.0")).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(data) + data
+
+
+def read_frames(data):
+    stream = io.BytesIO(data)
+    server = LanguageServer(stream)
+    messages = []
+    while (message := server.read_message()) is not None:
+        messages.append(message)
+    return messages
+
+
+def replace(line, start, end, text):
+    return {"range": {"start": {"line": line, "character": start}, "end": {"line": line, "character": end}},
+            "text": text}
+
+
+def test_session():
+    # The emoji is two UTF-16 code units: "<b>" starts at character 11 of line 2, not 10
+    messages = [
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {"method": "initialized", "params": {}},
+        {"method": "textDocument/didOpen", "params": {"textDocument": {"uri": URI, "version": 1, "text": PAGE}}},
+        {"method": "textDocument/didChange", "params": {"textDocument": {"uri": URI, "version": 2},
+                                                        "contentChanges": [replace(2, 11, 19, BOGUS)]}},
+        {"id": 2, "method": "shutdown"},
+        {"method": "exit"},
+    ]
+    output = io.BytesIO()
+    server = LanguageServer(io.BytesIO(b"".join(map(frame, messages))), output)
+    assert server.run() == 0
+
+    initialized, opened, changed, shut_down = read_frames(output.getvalue())
+    assert initialized["id"] == 1
+    assert initialized["result"]["capabilities"]["textDocumentSync"]["change"] == 2
+    assert opened["params"] == {"uri": URI, "diagnostics": [], "version": 1}
+    assert changed["params"]["version"] == 2
+    diagnostics = changed["params"]["diagnostics"]
+    assert [diagnostic["code"] for diagnostic in diagnostics] == ["unknown-tag", "unknown-tag"]
+    assert diagnostics[0]["range"]["start"] == {"line": 2, "character": 11}
+    assert shut_down == {"jsonrpc": "2.0", "id": 2, "result": None}
+    assert server.documents[URI].text == PAGE.replace("<b>x</b>", BOGUS)
+
+
+def test_exit_without_shutdown():
+    server = LanguageServer(io.BytesIO(frame({"method": "exit"})), io.BytesIO())
+    assert server.run() == 1
+
+
+def test_utf32_positions():
+    document = Document(PAGE)
+    document.apply(replace(2, 10, 18, BOGUS), utf16=False)
+    assert document.text == PAGE.replace("<b>x</b>", BOGUS)
+    assert document.diagnostics(utf16=False)[0]["range"]["start"] == {"line": 2, "character": 10}
+
+
+def test_lone_carriage_returns():
+    text = PAGE.replace("\n", "\r")
+    document = Document(text)
+    document.apply(replace(2, 11, 19, BOGUS))
+    assert document.text == text.replace("<b>x</b>", BOGUS)
+    assert document.diagnostics()[0]["range"]["start"] == {"line": 2, "character": 11}
+    # Past the end of a line is the end of that line, before its line break
+    assert document.offset({"line": 0, "character": 99}) == text.index("\r")
+
+
+def test_apply_keeps_line_starts():
+    rng = random.Random(0)
+    pieces = ["a", "\U0001F600", "\n", "\r", "\r\n", "<p>"]
+    document = Document("")
+    for _ in range(500):
+        lines = len(document.lines.starts)
+        start, end = sorted((rng.randrange(lines + 1), rng.randrange(4)) for _ in range(2))
+        inserted = "".join(rng.choice(pieces) for _ in range(rng.randrange(4)))
+        document.apply({"range": {"start": {"line": start[0], "character": start[1]},
+                                  "end": {"line": end[0], "character": end[1]}}, "text": inserted})
+        assert document.lines.starts == LineIndex(document.text, LSP_LINE_BREAK_RE).starts
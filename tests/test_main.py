@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from main import HTMLValidator, validate_html, validate_tokens
+from results import ValidationError
+from rules import Rule, RuleSet, register_rule, select_rules, unregister_rule
+from tokenizer import tokenize, TEXT
+
+PIECES = ["<div>", "</div>", "<p>", "</p>", "\n", "text é ", "<li>", "<ul>", "</ul>", "<!--", "-->", "<", ">",
+          "<a href='x>y' id=q>", "</a>", "<!DOCTYPE html>", "<!doctype HTML>", "<html>", "</html>", "<body>",
+          "</body>", "<head>", "</head>", "<title>", "</title>", '"', "'", "<!x>", "<!-- c -->",
+          "<input value=\"a<b\" type=bogus>", "<b\nclass=x>", "<td colspan=x>", "<table>", "<tr>", "<p id=q>",
+          "<img src='a b' width=3 width=4>", "<blink>", "</BLINK>", "<DIV>", "<![if x]>", "</p x=y>", "<br/>",
+          "<span id=q>", "<script>", "</script>", "<style>", "</STYLE>", "<textarea>", "</textarea >",
+          "a < b && c > d", "p > a{}"]
+
+
+def error_tuples(result):
+    return [(error.code, error.line, error.column, error.tag, error.args, error.offset) for error in result]
+
+
+@pytest.mark.parametrize("preset", [None, "markup", "structure"])
+def test_scan_matches_token_path(preset):
+    # validate_html scans the text in one loop, validate_tokens feeds the tokens to the rule handlers
+    rules = select_rules(preset=preset)
+    rng = random.Random(preset)
+    for _ in range(500):
+        html = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 50)))
+        assert error_tuples(validate_html(html, rules=rules)) == error_tuples(
+            validate_tokens(tokenize(html), rules=rules)), html
+
+
+def test_lines_and_columns():
+    html = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body>\n  <blink>\n<p id=a>\n<p id=a></body></html>"
+    result = validate_html(html)
+    assert [(error.code, error.line, error.column) for error in result] == [
+        ("unknown-tag", 4, 3), ("duplicate-id", 6, 1)]
+    assert result.with_codes("duplicate-id")[0].args == ("a", 5)
+
+
+def test_raw_text_is_not_markup():
+    html = ("<!DOCTYPE html>\n<html><head><title>a <b> c</title>\n<script>if (a < b && c > d) { el.innerHTML = "
+            "\"<div>\"; }</script>\n<style>ul > li{}</style></head>\n<body><ul><li><textarea><blink></textarea>"
+            "</ul></body></html>")
+    assert validate_html(html).passed
+    assert validate_tokens(tokenize(html)).passed
+
+
+def check_shouting(validator, token, tag_id):
+    if token.text.isupper():
+        validator.errors.append(ValidationError("shouting", token.line, token.column, offset=token.start))
+
+
+@pytest.fixture
+def shouting_rule():
+    yield register_rule(Rule("shouting", ("shouting",), (TEXT,), check_shouting, messages={"shouting": "Shouting."}))
+    unregister_rule("shouting")
+
+
+def test_custom_rules_use_the_token_path(shouting_rule):
+    rules = RuleSet(["balance", "shouting"])
+    assert not HTMLValidator(rules).scans
+    assert [(error.code, error.line) for error in validate_html("<p>\nLOUD</p> >", rules=rules)] == [
+        ("shouting", 1), ("unexpected-gt", 2)]
+    # Registered rules are in the default selection
+    assert "shouting" in select_rules()
+    assert not HTMLValidator().scans
+
+
+def test_builtin_rules_scan():
+    assert HTMLValidator().scans
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from prescan import LineIndex, TextIndex, LSP_LINE_BREAK_RE, NEWLINE_RE, line_ends
+
+
+def test_line_ends():
+    assert line_ends("a\nbc\n\n") == [2, 5, 6]
+    assert line_ends("a\nbc\n", base=1) == [3, 6]
+    assert line_ends("a\r\nb\rc\n", LSP_LINE_BREAK_RE) == [3, 5, 7]
+    assert line_ends("a\nb\nc", end=2) == [2]
+
+
+def test_positions():
+    index = TextIndex("<p>\n  <b>x</b>\n")
+    assert index.starts == [0, 4, 15]
+    assert [index.position(offset) for offset in (0, 3, 4, 6, 15)] == [(1, 1), (1, 4), (2, 1), (2, 3), (3, 1)]
+    assert index.line(5) == 2
+
+
+@pytest.mark.parametrize("text, balanced", [("", True), ("text", True), ("<a><b>x</b></a>", True), ("<<>>", True),
+                                            ("><", False), ("<a", False), ("a>", False), ("<a>>", False)])
+def test_balanced(text, balanced):
+    assert TextIndex(text).balanced() is balanced
+
+
+@pytest.mark.parametrize("breaks", [NEWLINE_RE, LSP_LINE_BREAK_RE])
+def test_replace_matches_rebuild(breaks):
+    rng = random.Random(0)
+    pieces = ["a", "\r", "\n", "\r\n", "bc"]
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        index = LineIndex(text, breaks)
+        for _ in range(4):
+            start = rng.randint(0, len(text))
+            end = rng.randint(start, len(text))
+            added = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+            text = text[:start] + added + text[end:]
+            index.replace(text, start, end, len(added))
+            assert index.starts == LineIndex(text, breaks).starts, text
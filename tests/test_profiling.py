@@ -0,0 +1,27 @@
+from collections import Counter
+
+from main import validate_html
+from profiling import PHASES, Profile
+
+PAGE = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><ul><li><blink>x</li></ul></body></html>"
+
+
+def test_profiled_run_finds_the_same_errors():
+    plain = validate_html(PAGE)
+    result = validate_html(PAGE, profile=True)
+    assert result == plain
+    profile = result.profile
+    assert profile.documents == 1
+    assert profile.errors == Counter(error.code for error in plain)
+    assert profile.max_stack_depth >= 4
+    assert set(profile.times) == set(PHASES)
+
+
+def test_profiles_merge():
+    profile = Profile()
+    validate_html(PAGE, profile=profile)
+    validate_html("<p>", profile=profile)
+    assert profile.documents == 2
+    merged = Profile().merge(profile).merge(profile)
+    assert merged.documents == 4 and merged.errors == profile.errors + profile.errors
+    assert merged.to_dict()["documents"] == 4
@@ -0,0 +1,58 @@
+import io
+import random
+
+import pytest
+
+import results
+from main import validate_html
+from repair import repair_html, repair_stream
+from rules import select_rules
+
+PIECES = ["<div>", "</div>", "<p>", "</p>", "\n", "text ", "<li>", "<ul>", "</ul>", "<!--", "-->", "<", ">",
+          "<a href='x' id=q>", "</a>", "<span>", "</span>", "<!DOCTYPE html>", "<html>", "</html>", "<body>",
+          "</body>", "<head>", "</head>", "<title>", "</title>", "<table>", "<tr>", "<td>", "</table>", "<!x>",
+          "<b", "<i class=x", "<meta charset=utf-8>", "<xyz>", "</xyz>", "<script>", "</script>", "<style>", "</style>",
+          "a < b > c", "<textarea>", "</textarea>"]
+
+# The rules a repair fixes
+REPAIRED = select_rules(disable=["content-model", "attributes", "attribute-values", "duplicate-ids",
+                                 "unknown-tags"])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_repaired_documents_pass(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        html = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30)))
+        repaired, _ = repair_html(html)
+        assert validate_html(repaired, rules=REPAIRED).passed, (html, repaired)
+        # Repairing is idempotent, and streams are repaired as whole texts
+        assert repair_html(repaired)[0] == repaired
+        output = io.StringIO()
+        repair_stream(io.BytesIO(html.encode()), output, chunk_size=rng.randint(1, 9))
+        assert output.getvalue() == repaired, html
+
+
+def test_malformed_comments_rewritten():
+    repaired, fixes = repair_html("<!DOCTYPE html><html><head><title>t</title></head><body><!x><!-- y ></body></html>")
+    assert repaired == ("<!DOCTYPE html><html><head><title>t</title></head><body><!--x--><!-- y --></body>"
+                        "</html>")
+    assert fixes[results.MALFORMED_COMMENT] == 2
+
+
+def test_script_and_style_contents_unchanged():
+    script = 'if (a < b && c > d) { el.innerHTML = "<div>"; }\n// </p> <!-- >'
+    style = "p > a{} ul>li{}"
+    html = f"<script>{script}</script><style>{style}</style><p>text<textarea><b></div></textarea>"
+    for repaired in (repair_html(html)[0], repair_html(html.replace("<p>", "<body><p>"))[0]):
+        assert f"<script>{script}</script><style>{style}</style>" in repaired
+        assert "<textarea><b></div></textarea>" in repaired
+        assert repaired.count("<body>") == 1
+        assert validate_html(repaired, rules=REPAIRED).passed
+
+
+def test_valid_document_unchanged():
+    html = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><ul><li>a<li>b</ul><!-- c --></body></html>\n"
+    repaired, fixes = repair_html(html)
+    assert repaired == html
+    assert not fixes
@@ -0,0 +1,38 @@
+import io
+import json
+
+from main import validate_html
+from reports import create_report, error_rows
+from results import PASSED_MESSAGE, UNREADABLE_FILE, ValidationError
+
+INVALID = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><p id=a><p id=a></body></html>"
+
+
+def write(format, files):
+    output = io.StringIO()
+    report = create_report(format, output)
+    report.start()
+    for path, rows in files:
+        report.add(path, rows)
+    report.finish()
+    return output.getvalue()
+
+
+def test_text_report_of_passing_files():
+    assert write("text", [("a.html", []), ("b.html", [])]) == PASSED_MESSAGE + "\n"
+
+
+def test_text_report_lists_errors():
+    rows = error_rows(validate_html(INVALID).errors)
+    text = write("text", [("a.html", []), ("b.html", rows)])
+    assert text.splitlines() == [f"b.html: {message}" for message in validate_html(INVALID).messages()]
+
+
+def test_sarif_rule_descriptions():
+    unreadable = error_rows([ValidationError(UNREADABLE_FILE, args=("Permission denied",))])
+    log = json.loads(write("sarif", [("a.html", unreadable), ("b.html", error_rows(validate_html(INVALID).errors))]))
+    run = log["runs"][0]
+    assert [result["ruleId"] for result in run["results"]][0] == UNREADABLE_FILE
+    descriptions = {rule["id"]: rule["shortDescription"]["text"] for rule in run["tool"]["driver"]["rules"]}
+    assert "{" not in descriptions[UNREADABLE_FILE]
+    assert run["results"][0]["message"]["text"] == "Cannot read file: Permission denied."
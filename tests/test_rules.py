@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from rules import PRESETS, RULES, load_config, select_rules
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_json_config(tmp_path):
+    path = write(tmp_path, "validator.json", json.dumps({"preset": "structure", "enable": ["doctype"]}))
+    assert load_config(path) == {"preset": "structure", "enable": ["doctype"]}
+    assert select_rules(config=path).names == set(PRESETS["structure"]) | {"doctype"}
+
+
+def test_toml_config(tmp_path):
+    path = write(tmp_path, "pyproject.toml", '[project]\nname = "site"\n\n[tool.validator]\npreset = "markup"\n'
+                                             'disable = ["comments"]\n')
+    assert load_config(path) == {"preset": "markup", "disable": ["comments"]}
+    assert select_rules(config=path).names == set(PRESETS["markup"]) - {"comments"}
+
+
+def test_toml_config_without_tool_table(tmp_path):
+    path = write(tmp_path, "validator.toml", 'preset = "structure"\n')
+    assert load_config(path) == {"preset": "structure"}
+
+
+@pytest.mark.parametrize("content", ["[]", '"markup"', "null"])
+def test_config_must_be_an_object(tmp_path, content):
+    path = write(tmp_path, "validator.json", content)
+    with pytest.raises(ValueError, match="object"):
+        load_config(path)
+    with pytest.raises(ValueError):
+        select_rules(config=path)
+
+
+def test_layering():
+    config = {"preset": "structure", "enable": ["doctype", "attributes"], "disable": ["balance"]}
+    # Preset, then the lists of the configuration, then the arguments
+    assert select_rules(config=config).names == set(PRESETS["structure"]) - {"balance"} | {"doctype", "attributes"}
+    rules = select_rules(enable=["balance", "duplicate-ids"], disable=["doctype"], config=config)
+    assert rules.names == set(PRESETS["structure"]) | {"attributes", "duplicate-ids"}
+    # The preset argument replaces the preset of the configuration, its lists still apply
+    assert select_rules(preset="full", config=config).names == set(RULES) - {"balance"}
+    # Rules stay in registry order whatever the order they were enabled in
+    assert [rule.name for rule in rules] == [name for name in RULES if name in rules]
+
+
+def test_unknown_names():
+    with pytest.raises(ValueError, match="Unknown rule"):
+        select_rules(config={"enable": ["no-such-rule"]})
+    with pytest.raises(ValueError, match="Unknown preset"):
+        select_rules(preset="strict")
@@ -0,0 +1,61 @@
+import json
+
+from schema import Schema, load_schema
+
+TAGS_INFO = {
+    "p": {"description": "Paragraph", "void": False, "attributes": ["class", "id", "data-*", "align \nDeprecated"]},
+    "hr": {"description": "Thematic break", "void": True, "attributes": ["class", "id", "data-*"]},
+    "br": {"description": "Line break", "void": True, "attributes": ["class", "id", "data-*"]},
+    "!--...--": {"description": "Comment", "void": False, "attributes": []},
+}
+
+
+def fields(schema):
+    return (schema.tag_names, schema.descriptions, bytes(schema.void), schema.attributes, schema.global_attributes,
+            schema.attribute_prefixes, schema.version)
+
+
+def test_compile():
+    schema = Schema.from_tags_info(TAGS_INFO)
+    assert schema.tag_names == ["p", "hr", "br"]
+    p, hr, br = map(schema.tag_id, ("p", "HR", "br"))
+    assert schema.tag_id("!--...--") is None
+    assert schema.global_attributes == {"class", "id"}
+    assert schema.attribute_prefixes == ("aria-", "data-")
+    assert list(schema.void) == [0, 1, 1]
+    assert schema.attributes[p] == {"align"}
+    # Tags with the same attributes share one set
+    assert schema.attributes[hr] is schema.attributes[br]
+
+
+def test_allows_attribute():
+    schema = Schema.from_tags_info(TAGS_INFO)
+    p, hr = schema.tag_id("p"), schema.tag_id("hr")
+    assert schema.allows_attribute(p, "align") and schema.allows_attribute(p, "class")
+    assert schema.allows_attribute(hr, "data-x") and schema.allows_attribute(hr, "aria-label")
+    assert not schema.allows_attribute(hr, "align")
+
+
+def test_cache_bytes():
+    version = "ab" * 32
+    schema = Schema.from_tags_info(TAGS_INFO, version)
+    data = schema.to_bytes()
+    copy = Schema.from_bytes(data, version)
+    assert fields(copy) == fields(schema)
+    assert copy.attributes[copy.tag_id("hr")] is copy.attributes[copy.tag_id("br")]
+    # Caches of other tags information, or truncated ones, are not used
+    assert Schema.from_bytes(data, "cd" * 32) is None
+    assert Schema.from_bytes(data[:-4], version) is None
+
+
+def test_load_schema_writes_and_reads_the_cache(tmp_path):
+    path, cache_path = tmp_path / "tags.json", tmp_path / "tags.cache"
+    path.write_text(json.dumps(TAGS_INFO), encoding="utf-8")
+    schema = load_schema(path, cache_path)
+    assert cache_path.exists()
+    assert fields(load_schema(path, cache_path)) == fields(schema)
+
+    # The cache is rebuilt when the tags information changes
+    path.write_text(json.dumps(dict(TAGS_INFO, a={"void": False, "attributes": ["href"]})), encoding="utf-8")
+    assert load_schema(path, cache_path).tag_names == ["p", "hr", "br", "a"]
+    assert load_schema(path, cache_path).version != schema.version
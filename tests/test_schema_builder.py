@@ -0,0 +1,123 @@
+import json
+
+from schema_builder import SchemaSources, diff_schemas, dumps, main
+
+TAGS_PAGE = """<html><body>
+<table>
+<tr><th>Tag</th><th>Description</th></tr>
+<tr><td>&lt;a&gt;</td><td>Defines a  hyperlink</td></tr>
+<tr><td>&lt;br&gt;</td><td>Defines a line break</td></tr>
+<tr><td>&lt;!DOCTYPE&gt;</td><td>Defines the document type</td></tr>
+</table>
+<table>
+<tr><th>Element</th><th>Description</th><th>Children</th><th>Attributes</th></tr>
+<tr><td><code>h1</code>, <code>h2</code></td><td>Heading</td><td>phrasing</td><td>globals</td></tr>
+<tr><td><code>img</code></td><td>Image</td><td>empty</td><td>globals; alt; src</td></tr>
+</table>
+</body></html>"""
+
+ATTRIBUTES_PAGE = """<table>
+<tr><th>Attribute Name</th><th>Elements</th></tr>
+<tr><td>href</td><td><code>&lt;a&gt;</code>, <code>&lt;area&gt;</code></td></tr>
+<tr><td>id</td><td>Global attribute</td></tr>
+<tr><td>data-*</td><td>Global attribute</td></tr>
+</table>"""
+
+TAGS_INFO = {
+    "<p>": {"description": "Paragraph", "void": False, "attributes": ["class", "id", "align"]},
+    "<hr>": {"description": "Thematic break", "void": True, "attributes": ["class", "id"]},
+}
+
+
+def fixture_sources():
+    sources = SchemaSources()
+    sources.read_tables(TAGS_PAGE)
+    sources.read_tables(ATTRIBUTES_PAGE)
+    sources.read_tags_info(TAGS_INFO)
+    return sources
+
+
+def test_read_tables():
+    sources = SchemaSources()
+    sources.read_tables(TAGS_PAGE)
+    assert sources.tags == {"a", "br", "h1", "h2", "img"}
+    assert sources.descriptions["a"] == "Defines a hyperlink"
+    assert sources.void == {"img"}
+    assert sources.attributes["img"] == {"alt", "src"}
+
+    sources.read_tables(ATTRIBUTES_PAGE)
+    assert sources.global_attributes == {"id", "data-"}
+    assert sources.attributes["a"] == {"href"}
+    # Elements only named by attribute tables are not tags
+    assert "area" not in sources.tags
+
+
+def test_read_tags_info():
+    sources = SchemaSources()
+    sources.read_tags_info(TAGS_INFO)
+    assert sources.tags == {"p", "hr"}
+    assert sources.void == {"hr"}
+    assert sources.global_attributes == {"class", "id"}
+    assert sources.attributes["p"] == {"class", "id", "align"}
+
+
+def test_compile():
+    data = fixture_sources().compile()
+    assert sorted(data["tags"]) == ["a", "br", "h1", "h2", "hr", "img", "p"]
+    assert data["global_attributes"] == ["class", "id"]
+    assert data["attribute_prefixes"] == ["aria-", "data-"]
+    assert data["void"] == ["hr", "img"]
+    sets = data["attribute_sets"]
+    assert sets[data["tags"]["img"]["attributes"]] == ["alt", "src"]
+    assert sets[data["tags"]["p"]["attributes"]] == ["align"]
+    # Tags with the same attributes share one set
+    assert data["tags"]["br"]["attributes"] == data["tags"]["h1"]["attributes"] == data["tags"]["hr"]["attributes"]
+    assert len(sets) == len(set(map(tuple, sets)))
+
+
+def test_rebuild_gives_the_same_version():
+    first, second = fixture_sources().compile(), fixture_sources().compile()
+    assert first["version"] == second["version"]
+    assert dumps(first) == dumps(second)
+
+
+def test_diff_schemas():
+    old = fixture_sources().compile()
+    sources = fixture_sources()
+    sources.add_tag("nav")
+    sources.global_attributes.discard("class")
+    sources.void.discard("hr")
+    sources.add_attributes("a", ["target"])
+    assert diff_schemas(old, sources.compile()) == [
+        "tags: +nav",
+        "global attributes: -class",
+        "void elements: -hr",
+        "<a> attributes: +target",
+        "<hr> attributes: +class",
+        "<p> attributes: +class",
+    ]
+    assert diff_schemas(old, old) == []
+
+
+def test_check_exit_codes(tmp_path, capsys):
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    (sources / "tags.html").write_text(TAGS_PAGE, encoding="utf-8")
+    (sources / "info.json").write_text(json.dumps(TAGS_INFO), encoding="utf-8")
+    schema = tmp_path / "schema.json"
+    args = [str(sources), "-o", str(schema)]
+    assert main(args) == 0
+    written = schema.read_text(encoding="utf-8")
+    capsys.readouterr()
+
+    assert main(args + ["--check"]) == 0
+    assert capsys.readouterr().out.startswith("Schema unchanged")
+
+    (sources / "attributes.html").write_text(ATTRIBUTES_PAGE, encoding="utf-8")
+    assert main(args + ["--check"]) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "attribute prefixes: +data-",
+        "<a> attributes: +href",
+    ]
+    # --check never writes the schema
+    assert schema.read_text(encoding="utf-8") == written
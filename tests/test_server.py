@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import server
+from server import HTTPError, ValidationServer
+
+BOUNDARY = "XyZ"
+BATCH = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart(*documents):
+    parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="doc{index}"\r\n\r\n{document}\r\n'
+             for index, document in enumerate(documents)]
+    return ("".join(parts) + f"--{BOUNDARY}--\r\n").encode()
+
+
+def test_only_single_documents_are_validated_inline():
+    # The default executor stands in for the process pool
+    service = ValidationServer(jobs=1)
+    single = asyncio.run(service.validate(b"<p>text</p>"))
+    assert service.metrics.inline_documents == 1 and not single["passed"]
+
+    body = multipart(*["<p>small</p>"] * 50)
+    results = asyncio.run(service.validate_batch(BATCH, body))["results"]
+    assert [result["name"] for result in results] == [f"doc{index}" for index in range(50)]
+    assert service.metrics.inline_documents == 1
+    assert service.metrics.documents == 51
+
+
+def test_batch_larger_than_max_pending():
+    service = ValidationServer(jobs=1)
+    assert service.max_pending == 4
+    body = multipart(*["<p>small</p>"] * 6)
+    results = asyncio.run(service.validate_batch(BATCH, body))["results"]
+    assert [result["name"] for result in results] == [f"doc{index}" for index in range(6)]
+    assert service.pending == 0 and service.metrics.rejected == 0
+
+
+def test_batch_refused_before_any_part_runs(monkeypatch):
+    sent = []
+
+    async def run_in_pool(data):
+        sent.append(data)
+        return {"passed": True}
+
+    service = ValidationServer(jobs=1)
+    monkeypatch.setattr(service, "run_in_pool", run_in_pool)
+    service.pending = 2
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(service.validate_batch(BATCH, multipart("<p>", "<p>", "<p>")))
+    assert error.value.status == 503
+    assert sent == [] and service.pending == 2
+    # What fits runs
+    assert len(asyncio.run(service.validate_batch(BATCH, multipart("<p>", "<p>")))["results"]) == 2
+    assert service.pending == 2
+
+
+def test_body_timeout(monkeypatch):
+    monkeypatch.setattr(server, "BODY_TIMEOUT", 0.05)
+
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"POST /validate HTTP/1.1\r\nContent-Length: 100\r\n\r\n<p>")
+        return await ValidationServer(jobs=1).read_request(reader)
+
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(read())
+    assert error.value.status == 408
@@ -0,0 +1,52 @@
+import io
+import random
+
+import pytest
+
+from main import validate_html, validate_stream, validate_path
+from tokenizer import MAX_HELD
+
+PIECES = ["<div>", "</div>", "<p>", "</p>", "\n", "text é ", "<li>", "<ul>", "</ul>", "<table>", "<tr>", "<!--",
+          "-->", "<", ">", "<a href='x>y' id=q>", "</a>", "<!DOCTYPE html>", "<html>", "</html>", "<body>", '"',
+          "'", "<!x>", "<!-- c -->", "€", "<input value=\"a<b\">", "<b\nclass=x>", "<p id=q>", "<script>",
+          "</script>", "<style>", "</STYLE>", "<title>", "</title >", "a < b && c > d"]
+
+
+def error_tuples(result):
+    return [(error.code, error.line, error.column, error.args, error.offset) for error in result]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_stream_matches_whole_text(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        html = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 40)))
+        chunk_size = rng.randint(1, 20)
+        assert error_tuples(validate_stream(io.BytesIO(html.encode()), chunk_size)) == error_tuples(
+            validate_html(html)), (chunk_size, html)
+
+
+def test_disallowed_text_reported_once_per_run():
+    html = "<ul>\n" + "word " * 200 + "\n</ul>"
+    expected = error_tuples(validate_html(html))
+    assert [error[0] for error in expected].count("disallowed-text") == 1
+    for chunk_size in (1, 7, 64):
+        assert error_tuples(validate_stream(io.BytesIO(html.encode()), chunk_size)) == expected
+
+
+def test_text_longer_than_max_held_reported_once():
+    # Streams split such text into several tokens
+    html = "<table>" + " " * MAX_HELD + "x" * MAX_HELD + "</table>"
+    expected = error_tuples(validate_html(html))
+    assert error_tuples(validate_stream(io.BytesIO(html.encode()), 1 << 16)) == expected
+    assert [error[0] for error in expected].count("disallowed-text") == 1
+
+
+def test_validate_path(tmp_path):
+    html = "<!DOCTYPE html>\n<html><head><title>t</title></head>\n<body><ul>text</ul><p id=a><p id=a></body>"
+    path = tmp_path / "page.html"
+    path.write_text(html, encoding="utf-8")
+    assert validate_path(path, chunk_size=8) == validate_html(html)
+    empty = tmp_path / "empty.html"
+    empty.write_bytes(b"")
+    assert validate_path(empty) == validate_html("")
@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from main import validate_html, validate_stream
+from tokenizer import (scan, tokenize, tokenize_stream, ChunkReader, MAX_HELD, COMMENT, UNCLOSED_LT, TEXT, START_TAG,
+                       END_TAG, STRAY_GT)
+
+
+def token_spans(tokens):
+    return [(token.kind, token.start, token.end, token.line, token.column, token.text) for token in tokens]
+
+
+DOCUMENTS = [
+    "<!DOCTYPE html>\n<html><body><p class=x>text</p>\n<!-- comment -->\n</body></html>\n",
+    "<ul>\ntext <li>item\n<!-- a\ncomment --> after</ul>",
+    "<p>a < b > c</p><a href='x>y'>link</a><!x>",
+    "<body>\n<!-- never closed\n<p>text</p>\n<!-- again <div>\n",
+    "<!-->-->\n<!--->\n<!-- -- > <p>",
+    "<script>if (a < b && c > d) {\n x = '<div>'; }</script><STYLE>p > a{}</style ><title>a<b</TITLE>",
+    "<textarea><p>\n</textarea\n><p>after</p><script>never closed <div>",
+]
+
+
+@pytest.mark.parametrize("html", DOCUMENTS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+def test_stream_tokens_match_whole_text(html, chunk_size):
+    expected = token_spans(tokenize(html))
+    assert token_spans(tokenize_stream(io.BytesIO(html.encode()), chunk_size)) == expected
+
+
+def test_unterminated_comment():
+    html = "<p>one</p>\n<!-- never closed\n<p>two</p>\n<!-- again\n<p>three</p>"
+    kinds = [token.kind for token in tokenize(html)]
+    # No "-->" follows: each "<!--" is a "<" that no ">" closes
+    assert kinds.count(UNCLOSED_LT) == 2 and COMMENT not in kinds
+    assert validate_stream(io.BytesIO(html.encode()), 5) == validate_html(html)
+
+
+def test_raw_text():
+    html = "<script type=x>if (a < b) { s = '</p>'; }</SCRIPT><p>a > b</p><style></style><title></titlex></title>"
+    assert [(token.kind, token.text) for token in tokenize(html)] == [
+        (START_TAG, "<script type=x>"), (TEXT, "if (a < b) { s = '</p>'; }"), (END_TAG, "</SCRIPT>"),
+        (START_TAG, "<p>"), (TEXT, "a "), (STRAY_GT, ">"), (TEXT, " b"), (END_TAG, "</p>"), (START_TAG, "<style>"),
+        (END_TAG, "</style>"), (START_TAG, "<title>"), (TEXT, "</titlex>"), (END_TAG, "</title>")]
+
+
+def test_raw_text_longer_than_max_held():
+    html = "<script>" + "a<b>c " * (MAX_HELD // 3) + "</script><p>"
+    tokens = list(tokenize_stream(io.BytesIO(html.encode()), 1 << 14))
+    assert {token.kind for token in tokens[1:-2]} == {TEXT}
+    assert [token.text for token in tokens[-2:]] == ["</script>", "<p>"]
+    assert "".join(token.text for token in tokens) == html
+
+
+def scan_to_end(reader):
+    # Offset and raw text element scan() returns once its tokens are exhausted
+    tokens = scan(reader.text, 0, reader.line, reader.line_start, reader.base, reader.final, reader.raw)
+    while True:
+        try:
+            next(tokens)
+        except StopIteration as stop:
+            return stop.value
+
+
+def test_unterminated_comment_holds_back_bounded_text():
+    # A "<!--" that no "-->" follows must not make the reader keep, and rescan, the rest of the stream
+    html = "<body>\n<!-- never closed\n" + "<p>some text</p>\n" * (2 * MAX_HELD // 16)
+    chunk_size = 1 << 12
+    reader = ChunkReader(io.BytesIO(html.encode()), chunk_size)
+    scanned = longest = 0
+    while reader.read():
+        scanned += len(reader.text)
+        longest = max(longest, len(reader.text))
+        reader.consume(*scan_to_end(reader))
+    assert longest <= MAX_HELD + chunk_size
+    assert scanned < 2 * len(html)
+    assert validate_stream(io.BytesIO(html.encode()), chunk_size) == validate_html(html)
+
+
+def test_long_text_is_split_past_max_held():
+    html = "<p>" + "x" * (2 * MAX_HELD) + "</p>"
+    tokens = list(tokenize_stream(io.BytesIO(html.encode()), 1 << 14))
+    assert [token.kind for token in tokens].count(TEXT) > 1
+    assert "".join(token.text for token in tokens) == html
@@ -0,0 +1,261 @@
+import codecs
+import re
+from collections import namedtuple
+
+# Token kinds
+TEXT = "text"
+START_TAG = "start_tag"
+END_TAG = "end_tag"
+COMMENT = "comment"
+DOCTYPE = "doctype"
+MALFORMED_COMMENT = "malformed_comment"
+STRAY_GT = "stray_gt"  # ">" outside of any markup
+UNCLOSED_LT = "unclosed_lt"  # "<" that is never closed by a ">"
+TOKEN_KINDS = (TEXT, START_TAG, END_TAG, COMMENT, DOCTYPE, MALFORMED_COMMENT, STRAY_GT, UNCLOSED_LT)
+
+
+class Token(namedtuple("Token", ["kind", "start", "end", "line", "column", "source", "base", "name_start",
+                                 "name_end"])):
+    """A token as offsets into the text it was scanned from, so that scanning copies no text.
+
+    ``start`` and ``end`` are offsets in the document, ``source[start - base:end - base]`` is the token text.
+    ``name_start`` and ``name_end`` index ``source`` around the name of a tag or doctype, the attributes of a
+    tag being what lies between ``name_end`` and the end of the token. ``text`` and ``name`` copy them out.
+    """
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return self.source[self.start - self.base:self.end - self.base]
+
+    @property
+    def name(self):
+        return self.source[self.name_start:self.name_end]
+
+
+# One alternation matches every token back to back, so the whole scan runs inside the regex engine.
+# Apart from comments, no alternative can look past the next "<" (quoted values included):
+# a token only ever depends on the text up to the following token.
+TOKEN_RE = re.compile(r'''
+    ([^<>]+)                                                    # 1: text
+  | (<!--.*?-->)                                                # 2: comment
+  | (<![^<>]*>)                                                 # 3: doctype, conditional or malformed comment
+  | (<(/?)(\w+)(\s(?:"[^"<]*"|'[^'<]*'|[^'"<>])*)?/?>)         # 4: tag (5: closing slash, 6: name, 7: attributes)
+  | (<[^<>]*>)                                                  # 8: bogus markup, kept as text
+  | (<)                                                         # 9: "<" never closed
+  | (>)                                                         # 10: stray ">"
+''', re.DOTALL | re.VERBOSE)
+# The same alternation once a "<!--" is known to have no "-->" after it: no later "<!--" can start a comment
+# either, so the rest of the text is not searched for one again at each of them
+UNTERMINATED_RE = re.compile(TOKEN_RE.pattern.replace(r"(<!--.*?-->)", "((?!))", 1), re.DOTALL | re.VERBOSE)
+DOCTYPE_RE = re.compile(r'<!doctype(?:\s+([^\s<>]+))?', re.IGNORECASE)
+CONDITIONAL_RE = re.compile(r'<!-{0,2}\s*\[')
+# Elements whose content is text up to their end tag, "<" and ">" included, by lowercase name: the end tag
+# ending each of them
+RAW_TEXT_END = {name: re.compile(rf'</{name}[\s/>]', re.IGNORECASE)
+                for name in ("script", "style", "textarea", "title")}
+
+# Bytes read at a time by tokenize_stream
+CHUNK_SIZE = 1 << 16
+# Characters a stream scan holds back at most while waiting for the end of a token. Past that, a "<!--" with
+# no "-->" yet is scanned as if the stream had none, and text is split into several TEXT tokens.
+MAX_HELD = 1 << 20
+
+
+def scan_end(text, final):
+    # Offset up to which ``text`` can be scanned: text after the last "<" or ">" may go on in the next chunk
+    if final:
+        return len(text)
+    end = max(text.rfind("<"), text.rfind(">")) + 1
+    return end if len(text) - end < MAX_HELD else len(text)
+
+
+def holds_back(text, start, group, last_lt):
+    """Whether the token of TOKEN_RE ``group`` at ``start`` may still change once more text is appended.
+
+    Only groups 3, 8 and 9 can: a "<" is only settled once the next "<" is known, and an unterminated "<!--"
+    once "-->" is. ``last_lt`` is the offset of the last "<" of ``text``.
+    """
+    if len(text) - start >= MAX_HELD:
+        return False
+    return (group == 8 or group == 9) and start >= last_lt or group != 8 and text.startswith("<!--", start)
+
+
+def raw_text_end(text, pos, raw, final):
+    """Where the content of the raw text element ``raw`` that starts at ``pos`` ends, and whether it ends there.
+
+    The content goes up to the end tag of the element, or to the end of the document when it has none. Unless
+    ``final``, None is returned while the end tag may still come, and content longer than MAX_HELD is cut
+    before the characters that could start it.
+    """
+    match = RAW_TEXT_END[raw].search(text, pos)
+    if match:
+        return match.start(), True
+    if final:
+        return len(text), True
+    if len(text) - pos < MAX_HELD:
+        return None
+    return len(text) - len(raw) - 2, False
+
+
+def scan(text, pos, line, line_start, base, final, raw=None):
+    """Yield the tokens of ``text`` from ``pos`` on, with offsets shifted by ``base``.
+
+    Unless ``final``, scanning stops before the first token that more text appended to ``text`` could still
+    change, see scan_end and holds_back. ``raw`` is the name of the raw text element (see RAW_TEXT_END) whose
+    content starts at ``pos``, if any. Returns the offset in ``text`` to resume from and the raw text element
+    scanning stopped in.
+    """
+    count = text.count
+    last = pos
+    stop = scan_end(text, final)
+    last_lt = text.rfind("<", 0, stop)
+    regex = TOKEN_RE
+
+    while True:
+        if raw is not None:
+            # The content of <script>, <style>... is a single TEXT token, whatever markup it looks like
+            content = raw_text_end(text, pos, raw, final)
+            if content is None:
+                return pos, raw
+            end, ended = content
+            if end > pos:
+                newlines = count("\n", last, pos)
+                if newlines:
+                    line += newlines
+                    line_start = text.rfind("\n", last, pos) + 1
+                last = pos
+                yield Token(TEXT, base + pos, base + end, line, pos - line_start + 1, text, base, pos, pos)
+                pos = end
+            if not ended:
+                return pos, raw
+            raw = None
+
+        for match in regex.finditer(text, pos, stop):
+            start, end = match.span()
+            group = match.lastindex
+            if not final and (group == 3 or group == 8 or group == 9) and holds_back(text, start, group,
+                                                                                       last_lt):
+                return pos, None
+            pos = end
+
+            # Line numbers are advanced incrementally, so the whole scan counts every newline once
+            newlines = count("\n", last, start)
+            if newlines:
+                line += newlines
+                line_start = text.rfind("\n", last, start) + 1
+            last = start
+            column = start - line_start + 1
+
+            if group == 1 or group == 8:
+                yield Token(TEXT, base + start, base + end, line, column, text, base, start, start)
+            elif group == 4:
+                name_start, name_end = match.span(6)
+                kind = END_TAG if name_start - start == 2 else START_TAG
+                yield Token(kind, base + start, base + end, line, column, text, base, name_start, name_end)
+                if kind == START_TAG and name_end - name_start <= 8:
+                    raw = text[name_start:name_end].lower()
+                    if raw in RAW_TEXT_END:
+                        break
+                    raw = None
+            elif group == 2:
+                yield Token(COMMENT, base + start, base + end, line, column, text, base, start, start)
+            elif group == 3:
+                doctype = DOCTYPE_RE.match(text, start, end)
+                if doctype:
+                    name_start, name_end = doctype.span(1) if doctype.group(1) else (end, end)
+                    yield Token(DOCTYPE, base + start, base + end, line, column, text, base, name_start, name_end)
+                elif CONDITIONAL_RE.match(text, start, end):
+                    yield Token(COMMENT, base + start, base + end, line, column, text, base, start, start)
+                else:
+                    yield Token(MALFORMED_COMMENT, base + start, base + end, line, column, text, base, start,
+                                start)
+            elif group == 9:
+                yield Token(UNCLOSED_LT, base + start, base + end, line, column, text, base, start, start)
+            else:
+                yield Token(STRAY_GT, base + start, base + end, line, column, text, base, start, start)
+
+            if (group == 3 or group == 9) and regex is TOKEN_RE and text.startswith("<!--", start):
+                regex = UNTERMINATED_RE
+                break
+        else:
+            return pos, None
+
+
+def tokenize(html, pos=0, line=1):
+    """Yield the tokens of ``html`` in one left-to-right scan.
+
+    ``pos`` and ``line`` allow resuming the scan from the start of any previously emitted token.
+    """
+    yield from scan(html, pos, line, html.rfind("\n", 0, pos) + 1, 0, True)
+
+
+class ChunkReader:
+    """The text of a binary stream (file, mmap...), read and decoded ``chunk_size`` bytes at a time.
+
+    ``text`` is what was read and not consumed yet, from offset ``base`` of the document on. ``line`` is the
+    line number at ``base``, ``line_start`` the offset in ``text`` that line starts at (negative when before).
+    ``raw`` is the raw text element whose content ``text`` starts in, if any, see tokenizer.scan. read()
+    appends chunks until there is something new to scan, consume() drops the text scanned.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE, encoding="utf-8-sig"):
+        self.read_chunk = stream.read
+        self.chunk_size = chunk_size
+        self.decode = codecs.getincrementaldecoder(encoding)(errors="replace").decode
+        self.text = ""
+        self.base = 0
+        self.line = 1
+        self.line_start = 0
+        self.raw = None
+        self.final = False
+
+    def read(self):
+        # False once the whole stream was read. Chunks that cannot settle the token held back at the start of
+        # the text are appended without scanning it again: only the new text is searched for the end of the
+        # held token (the end tag of a raw text element, "-->" for a comment, "<" or ">" otherwise).
+        if self.final:
+            return False
+        raw = self.raw
+        comment = raw is None and self.text.startswith("<!--")
+        searched = len(self.text)
+        while True:
+            data = self.read_chunk(self.chunk_size)
+            self.final = not data
+            self.text += self.decode(data, self.final)
+            text = self.text
+            if self.final or len(text) >= MAX_HELD:
+                return True
+            if raw is not None:
+                if RAW_TEXT_END[raw].search(text, max(searched - len(raw) - 2, 0)):
+                    return True
+            elif comment:
+                if text.find("-->", max(searched - 2, 4)) >= 0:
+                    return True
+            elif text.find("<", searched) >= 0 or text.find(">", searched) >= 0:
+                return True
+            searched = len(text)
+
+    def consume(self, pos, raw=None):
+        # Drop the text before ``pos``, the content of the raw text element ``raw`` starting there
+        self.raw = raw
+        text = self.text
+        newlines = text.count("\n", 0, pos)
+        if newlines:
+            self.line += newlines
+            self.line_start = text.rfind("\n", 0, pos) + 1
+        self.line_start -= pos
+        self.base += pos
+        self.text = text[pos:]
+
+
+def tokenize_stream(stream, chunk_size=CHUNK_SIZE, encoding="utf-8-sig"):
+    """Yield the tokens of a binary stream (file, mmap...) read and decoded ``chunk_size`` bytes at a time.
+
+    Only the text of a token that the next chunk could change is carried over, up to MAX_HELD characters, so
+    memory use does not grow with the size of the document and the tokens are those of the whole text.
+    """
+    reader = ChunkReader(stream, chunk_size, encoding)
+    while reader.read():
+        reader.consume(*(yield from scan(reader.text, 0, reader.line, reader.line_start, reader.base,
+                                         reader.final, reader.raw)))
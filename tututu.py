@@ -12,4 +12,41 @@ def depiler(P):
 
 
 def est_vide(P):
-    return P == []
+    return not P
+
+
+class ElementStack:
+    """Open elements, with the number of open elements of each tag ID.
+
+    ``entries`` holds the (line, column, tag ID, offset) of every open element, ``counts[tag_id]`` how many of
+    them have that tag ID, so whether a tag is open anywhere is known without scanning the stack. The
+    validator pushes and pops inline on both, truncate and is_open are for everything off its hot path.
+    """
+
+    __slots__ = ("entries", "counts")
+
+    def __init__(self, tag_count, entries=()):
+        self.entries = list(entries)
+        self.counts = counts = [0] * tag_count
+        for entry in self.entries:
+            counts[entry[2]] += 1
+
+    def truncate(self, index):
+        # Pop every element from ``index`` up
+        entries = self.entries
+        counts = self.counts
+        for entry in entries[index:]:
+            counts[entry[2]] -= 1
+        del entries[index:]
+
+    def is_open(self, tag_id):
+        return self.counts[tag_id] > 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
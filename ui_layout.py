@@ -1,6 +1,52 @@
+from collections import Counter
+
 from PyQt5 import QtCore, QtWidgets, QtGui
 from PyQt5.QtCore import Qt
 
+from results import PASSED_MESSAGE
+
+# Width in pixels of the error markers drawn in the line number area
+MARKER_WIDTH = 6
+# Half height in pixels of the custom cursor marker
+CURSOR_MARKER_HALF_HEIGHT = 10
+
+
+# List model of the errors of a ValidationResult, rows are only formatted when a view asks for them
+class ErrorListModel(QtCore.QAbstractListModel):
+    LineRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.errors = []
+        self.passed = False
+        self.error_lines = Counter()  # Line number -> number of errors on that line
+
+    def setResult(self, result):
+        self.beginResetModel()
+        self.errors = result.errors
+        self.passed = result.passed
+        self.error_lines = Counter(error.line for error in result.errors if error.line is not None)
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.errors) or int(self.passed)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if not self.errors:
+            return PASSED_MESSAGE if role == Qt.DisplayRole else None
+        error = self.errors[index.row()]
+        if role == Qt.DisplayRole:
+            return str(error)
+        if role == Qt.ToolTipRole:
+            return error.message
+        if role == self.LineRole:
+            return error.line
+        return None
+
 
 # Custom widget to display line numbers
 class LineNumberArea(QtWidgets.QWidget):
@@ -20,6 +66,17 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
     def __init__(self, *args):
         super().__init__(*args)
         self.lineNumberArea = LineNumberArea(self)
+        self.error_lines = Counter()  # Line number -> number of errors, see setErrorLines
+
+        # Extra selections are cached and only rebuilt when the current line, the errors or the scroll change
+        self.current_line_selection = None
+        self.current_line_number = None
+        self.error_selections = []
+        self.error_selections_key = None  # (first visible block, visible block count, error index)
+
+        self.cursor_marker = False
+        self.cursor_marker_rect = QtCore.QRect()  # Where the marker was last painted
+
         self.blockCountChanged.connect(self.updateLineNumberAreaWidth)
         self.updateRequest.connect(self.updateLineNumberArea)
         self.cursorPositionChanged.connect(self.highlightCurrentLine)
@@ -33,15 +90,31 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         while max_value >= 10:
             max_value //= 10
             digits += 1
-        space = 3 + self.fontMetrics().width('9') * digits
+        space = 3 + MARKER_WIDTH + self.fontMetrics().width('9') * digits
         return space
 
+    def setErrorLines(self, error_lines):
+        # Lines to mark in the line number area and to highlight, as a Counter keyed by line number
+        self.error_lines = error_lines
+        self.lineNumberArea.update()
+        self.updateErrorSelections()
+
+    def goToLine(self, line):
+        block = self.document().findBlockByNumber(line - 1)
+        if block.isValid():
+            cursor = self.textCursor()
+            cursor.setPosition(block.position())
+            self.setTextCursor(cursor)
+            self.centerCursor()
+            self.setFocus()
+
     def updateLineNumberAreaWidth(self, _):
         self.setViewportMargins(self.lineNumberAreaWidth(), 0, 0, 0)
 
     def updateLineNumberArea(self, rect, dy):
         if dy:
             self.lineNumberArea.scroll(0, dy)
+            self.updateErrorSelections()
         else:
             self.lineNumberArea.update(0, rect.y(), self.lineNumberArea.width(), rect.height())
         if rect.contains(self.viewport().rect()):
@@ -51,6 +124,7 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         super().resizeEvent(event)
         cr = self.contentsRect()
         self.lineNumberArea.setGeometry(QtCore.QRect(cr.left(), cr.top(), self.lineNumberAreaWidth(), cr.height()))
+        self.updateErrorSelections()
 
     def lineNumberAreaPaintEvent(self, event):
         painter = QtGui.QPainter(self.lineNumberArea)
@@ -60,12 +134,17 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         block_number = block.blockNumber()
         top = int(self.blockBoundingGeometry(block).translated(self.contentOffset()).top())
         bottom = top + int(self.blockBoundingRect(block).height())
+        error_lines = self.error_lines
+        line_height = self.fontMetrics().height()
 
+        # Only the visible blocks are visited, each looks its line up in the error index
         while block.isValid() and top <= event.rect().bottom():
             if block.isVisible() and bottom >= event.rect().top():
                 number = str(block_number + 1)
+                if block_number + 1 in error_lines:
+                    painter.fillRect(1, top + 1, MARKER_WIDTH - 2, line_height - 2, QtGui.QColor("#D9534F"))
                 painter.setPen(QtCore.Qt.black)
-                painter.drawText(0, top, self.lineNumberArea.width(), self.fontMetrics().height(),
+                painter.drawText(0, top, self.lineNumberArea.width(), line_height,
                                  QtCore.Qt.AlignRight, number)
             block = block.next()
             top = bottom
@@ -73,39 +152,92 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
             block_number += 1
 
     def highlightCurrentLine(self):
-        extra_selections = []
-
-        if not self.isReadOnly():
+        # Moving within a line keeps the cached selection, it follows edits by itself
+        line_number = self.textCursor().blockNumber()
+        if line_number == self.current_line_number and self.current_line_selection is not None:
+            return
+        self.current_line_number = line_number
+
+        if self.isReadOnly():
+            self.current_line_selection = None
+        else:
             selection = QtWidgets.QTextEdit.ExtraSelection()
             line_color = QtGui.QColor(QtCore.Qt.yellow).lighter(160)
             selection.format.setBackground(line_color)
             selection.format.setProperty(QtGui.QTextFormat.FullWidthSelection, True)
             selection.cursor = self.textCursor()
             selection.cursor.clearSelection()
-            extra_selections.append(selection)
+            self.current_line_selection = selection
+        self.applyExtraSelections()
 
-        self.setExtraSelections(extra_selections)
+    def updateErrorSelections(self):
+        # Error lines are only highlighted in the visible blocks, so the selection count stays small
+        block = self.firstVisibleBlock()
+        height = self.viewport().height()
+        offset = self.contentOffset()
+        first = block.blockNumber()
+        error_lines = self.error_lines
+
+        selections = []
+        count = 0
+        while block.isValid() and self.blockBoundingGeometry(block).translated(offset).top() <= height:
+            if block.blockNumber() + 1 in error_lines:
+                selection = QtWidgets.QTextEdit.ExtraSelection()
+                selection.format.setBackground(QtGui.QColor("#FBE3E4"))
+                selection.format.setProperty(QtGui.QTextFormat.FullWidthSelection, True)
+                selection.cursor = QtGui.QTextCursor(block)
+                selections.append(selection)
+            block = block.next()
+            count += 1
+
+        key = (first, count, id(error_lines))
+        if key == self.error_selections_key:
+            return
+        self.error_selections_key = key
+        self.error_selections = selections
+        self.applyExtraSelections()
+
+    def applyExtraSelections(self):
+        # Errors first, so the current line highlight is drawn over them
+        selections = list(self.error_selections)
+        if self.current_line_selection is not None:
+            selections.append(self.current_line_selection)
+        self.setExtraSelections(selections)
 
     def setCustomCursor(self):
-        cursor = self.textCursor()
-        fmt = cursor.charFormat()
-        fmt.setBackground(QtGui.QColor(QtCore.Qt.transparent))
-        cursor.setCharFormat(fmt)
-        self.setTextCursor(cursor)
+        # The text cursor is replaced by a marker drawn in paintEvent
+        self.cursor_marker = True
+        self.setCursorWidth(0)
         self.cursorPositionChanged.connect(self.updateCursorMarker)
+        self.updateCursorMarker()
+
+    def cursorMarkerRect(self):
+        center = self.cursorRect().center()
+        return QtCore.QRect(center.x() - 2, center.y() - CURSOR_MARKER_HALF_HEIGHT - 2,
+                            5, 2 * CURSOR_MARKER_HALF_HEIGHT + 5)
 
     def updateCursorMarker(self):
-        cursor = self.textCursor()
-        fmt = cursor.charFormat()
-        fmt.setBackground(QtGui.QColor(QtCore.Qt.transparent))
-        cursor.setCharFormat(fmt)
-        self.setTextCursor(cursor)
-
-        # Draw the custom cursor marker
-        cursor_position = self.cursorRect(cursor).center()
+        # Only the area of the old and the new marker is repainted
+        viewport = self.viewport()
+        viewport.update(self.cursor_marker_rect)
+        self.cursor_marker_rect = self.cursorMarkerRect()
+        viewport.update(self.cursor_marker_rect)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.cursor_marker:
+            return
+
+        # The viewport may have scrolled since the last cursor move
+        self.cursor_marker_rect = self.cursorMarkerRect()
+        if not event.rect().intersects(self.cursor_marker_rect):
+            return
+        cursor_position = self.cursorRect().center()
         painter = QtGui.QPainter(self.viewport())
         painter.setPen(QtGui.QPen(QtGui.QColor("red"), 2))
-        painter.drawLine(cursor_position.x(), cursor_position.y() - 10, cursor_position.x(), cursor_position.y() + 10)
+        painter.drawLine(cursor_position.x(), cursor_position.y() - CURSOR_MARKER_HALF_HEIGHT,
+                         cursor_position.x(), cursor_position.y() + CURSOR_MARKER_HALF_HEIGHT)
+        painter.end()
 
 
 # Main window layout class
@@ -260,7 +392,12 @@ class UiMainWindow(object):
         self.errorScrollArea.setWidgetResizable(True)
         self.errorScrollArea.setObjectName("errorScrollArea")
 
-        self.errorContent = QtWidgets.QTextBrowser(self.centralwidget)
+        # Errors are shown through a model, so only the visible rows are laid out
+        self.errorModel = ErrorListModel(self.centralwidget)
+        self.errorContent = QtWidgets.QListView(self.centralwidget)
+        self.errorContent.setModel(self.errorModel)
+        self.errorContent.setUniformItemSizes(True)
+        self.errorContent.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.errorScrollArea.setWidget(self.errorContent)
         self.errorContent.setStyleSheet(
             "font-size: 10pt; background-color: #fff; border: 1px solid #aaa; border-radius: 4px; color: #000;")
@@ -1,13 +1,9 @@
+from prescan import TextIndex
+
+
 def vp(s):
-    bn = 0
-    for i in s:
-        if i == "<":
-            bn += 1
-        elif i == ">":
-            bn -= 1
-        if bn < 0:
-            return False
-    return bn == 0
+    # The brackets are found in bulk, then only they are counted
+    return TextIndex(s).balanced()
 
 
 # with open("index.html", "r") as index: